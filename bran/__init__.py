@@ -12,29 +12,51 @@ For much the same reason, DER-encoded ASN.1 is useful in other contexts.
 __author__ = 'Jens Finkhaeuser'
 __copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
 __license__ = 'MIT +no-false-attribs'
-__all__ = ('hash')
+__all__ = ('hash', 'DERTranscoder', 'ASN1Transcoder', 'default_transcoder',
+    'dumps', 'loads', 'digest', 'validate')
 __version__ = '0.4.0'
 
+import threading
+
 
 class DERTranscoder(object):
   """
   DER-encode Python builtin (and extended) types.
 
-  The class first uses ASN1Transcoder to encode valuesin ASN.1 classes, then
-  DER-encodes the result.
+  The class uses the tags and options of an ASN1Transcoder, and produces the
+  same result as DER-encoding the ASN.1 classes it creates. Encoding and
+  decoding is delegated to a backend from bran.backend; by default, the
+  fastest available one. With the native backend, the builtin types are
+  encoded and decoded directly by bran.codec; only values from the
+  transcoder's registry pass through pyasn1.
+
+  Transcoders keep no per-call state, so a single instance can be shared
+  between threads, as long as its options are not modified.
   """
 
-  def __init__(self, inner = None):
+  def __init__(self, inner = None, threshold = 1024, backend = None):
     """
     Initialize DERTranscoder.
 
-    The sole parameter is a reference to an inner decoder. If not specified,
+    The first parameter is a reference to an inner decoder. If not specified,
     this defaults to an ASN1Transcoder instance with default options.
 
     :param object inner: [optional] Inner transcoder
+    :param int threshold: [optional] The minimum size of byte payloads that
+        encode_buffers() passes by reference rather than copying; defaults to
+        1024.
+    :param mixed backend: [optional] The name of a backend, or a
+        bran.backend.Backend subclass; defaults to the fastest available
+        backend.
     """
     self.inner = inner or ASN1Transcoder()
 
+    from .backend import get_backend
+    if backend is None or isinstance(backend, str):
+      backend = get_backend(backend)
+    self.backend = backend(self.inner, threshold)
+    self.__validator = None
+
   def encode(self, value):
     """
     DER-encode the given value.
@@ -44,8 +66,59 @@ class DERTranscoder(object):
     :param mixed value: The value to encode.
     :return: An DER-encoded ASN.1 value, i.e. a byte sequence.
     """
-    from pyasn1.codec.der import encoder
-    return encoder.encode(self.inner.encode(value))
+    return b''.join(self.__read_blobs(self.backend.encode_buffers(value)))
+
+  def __read_blobs(self, buffers):
+    # Replace blob references by their content
+    from .blob import BlobRef
+    for idx, chunk in enumerate(buffers):
+      if isinstance(chunk, BlobRef):
+        buffers[idx] = chunk.read()
+    return buffers
+
+  def encode_buffers(self, value):
+    """
+    DER-encode the given value into a list of buffers.
+
+    The concatenation of the buffers is the same as the result of encode().
+    Byte payloads (bytes, bytearray or memoryview) that are at least as large
+    as the threshold passed to the constructor are not copied; the list
+    references the original objects instead. All other output is coalesced
+    into few small chunks.
+
+    The result can be passed to e.g. socket.sendmsg() or os.writev() as is.
+    bran.blob.BlobRef values are read into memory; use encode_into() to
+    stream them instead.
+
+    :param mixed value: The value to encode.
+    :return: A list of bytes-like objects.
+    """
+    return self.__read_blobs(self.backend.encode_buffers(value))
+
+  def encode_into(self, value, write):
+    """
+    DER-encode the given value, and pass each buffer to a write function.
+
+    This is encode_buffers() for sinks that accept one buffer at a time, such
+    as file objects or hash functions. The content of bran.blob.BlobRef
+    values is read and written in chunks, so it is never held in memory as a
+    whole.
+
+    :param mixed value: The value to encode.
+    :param callable write: Called with each buffer in turn, e.g. the write()
+        method of a file object or the update() method of a hash function.
+    :return: The total number of Bytes written.
+    """
+    from .blob import BlobRef
+    total = 0
+    for chunk in self.backend.encode_buffers(value):
+      if isinstance(chunk, BlobRef):
+        for data in chunk.chunks():
+          write(data)
+      else:
+        write(chunk)
+      total += len(chunk)
+    return total
 
   def decode(self, value):
     """
@@ -55,9 +128,41 @@ class DERTranscoder(object):
     :return: A Python value, the result of passing the parameter through DER
         decoding and ASN.1 decoding.
     """
-    from pyasn1.codec.der import decoder
-    decoded = decoder.decode(value)
-    return self.inner.decode(decoded[0])
+    return self.backend.decode(value)
+
+  def decode_all(self, data):
+    """
+    DER-decode all consecutive values in the given byte sequence.
+
+    This is useful for files or messages holding several encoded records
+    back to back.
+
+    :param bytes data: The values to decode.
+    :return: A generator yielding the decoded Python values in order.
+    """
+    return self.backend.decode_all(data)
+
+  def validate(self, data):
+    """
+    Check that the given byte sequence is a canonical encoding of one value.
+
+    This is much cheaper than decoding, and rejects anything that decode()
+    would not accept, or that encode() would not produce: malformed or
+    non-minimal DER, tags unknown to the transcoder, mapping keys or set
+    elements that are not in the transcoder's sort order, and input beyond
+    the max_size, max_depth, max_items or max_length limits.
+
+    :param bytes data: The value to validate.
+    :raises: bran.validator.ValidationError at the first violation; its
+        offset attribute holds the byte offset of the violation.
+    """
+    # The validator is built on first use. Threads racing here build
+    # equivalent instances, so either one may be kept.
+    validator = self.__validator
+    if validator is None:
+      from .validator import Validator
+      validator = self.__validator = Validator(self.inner)
+    validator.validate(data)
 
 
 class ASN1Transcoder(object):
@@ -95,10 +200,45 @@ class ASN1Transcoder(object):
         Python types (not names/strings, but the type objects), or ASN.1 tags
         (stringified, e.g. "[0:0:6]"). The value must be a callable that
         converts from objects of the Python type to an ASN.1 object or from an
-        ASN.1 object matching the stringified tag to a Python object.
+        ASN.1 object matching the stringified tag to a Python object. Tag
+        entries are compiled into the decoding dispatch table when the
+        transcoder is constructed, so later changes to the registry are not
+        picked up for decoding.
+    :param bool frozen: If True, decode mappings, lists and sets as the
+        immutable and hashable types bran.frozen.FrozenDict,
+        bran.frozen.FrozenList and frozenset. The default is False.
+    :param bool stdlib_types: If True, encode and decode datetime, date, UUID
+        and Decimal values without the registry. Timezone aware datetimes are
+        encoded as UTC GeneralizedTime, and decode as datetimes in UTC;
+        naive datetimes cannot be encoded. Dates are encoded by their
+        proleptic Gregorian ordinal as an INTEGER tagged [8], UUIDs as their
+        16 Bytes in an OCTET STRING tagged [6], and finite Decimals as the
+        INTEGER coefficient and exponent of their canonical form, i.e.
+        without trailing zeroes, in a SEQUENCE tagged [7]. Registry entries
+        for these types are not used. The default is False.
+
+    The following options limit the resources DERTranscoder may use for
+    decoding untrusted input. They are checked on the header of each value,
+    before its content is decoded; exceeding them raises
+    bran.codec.LimitExceeded. All default to None, i.e. no limit.
+
+    :param int max_size: The maximum size of the input in Bytes.
+    :param int max_depth: The maximum nesting depth of tuples, lists,
+        mappings, sets and complex values.
+    :param int max_items: The maximum number of elements of a container.
+    :param int max_length: The maximum length of a str or bytes value, in
+        encoded Bytes.
+    :param int max_total: The maximum total size in Bytes of all values in
+        a decoded value, counting the encoded content of each leaf value.
     """
     self.options = kwargs
 
+    if kwargs.get('frozen', False):
+      from .frozen import FrozenDict, FrozenList
+      self.__containers = (FrozenList, FrozenDict, frozenset)
+    else:
+      self.__containers = (list, dict, set)
+
     from pyasn1.type import univ, tag
 
     # Tags for complex
@@ -130,17 +270,47 @@ class ASN1Transcoder(object):
         tag.Tag(tag.tagClassContext, tag.tagFormatConstructed, 0x05)
       )
     )
+    # Tags for the standard library types; see the stdlib_types option.
+    self.UUID = univ.OctetString(
+      tagSet = univ.OctetString.tagSet.tagExplicitly(
+        tag.Tag(tag.tagClassContext, tag.tagFormatConstructed, 0x06)
+      )
+    )
+    self.DECIMAL = univ.Sequence(
+      tagSet = univ.Sequence.tagSet.tagExplicitly(
+        tag.Tag(tag.tagClassContext, tag.tagFormatConstructed, 0x07)
+      )
+    )
+    self.DATE = univ.Integer(
+      tagSet = univ.Integer.tagSet.tagExplicitly(
+        tag.Tag(tag.tagClassContext, tag.tagFormatConstructed, 0x08)
+      )
+    )
+    self.__stdlib_types = ()
+    if kwargs.get('stdlib_types', False):
+      import datetime
+      import decimal
+      import uuid
+      self.__stdlib_types = (datetime.date, uuid.UUID, decimal.Decimal)
+
+    # Decoding dispatch tables
+    self.__decoders, self.__tagsets = self.__build_decoders()
 
   def encode(self, value):
     """
     Encode the given Python value.
 
     Nested values (for Sequence, Set and Mapping) are recursively encoded.
+    Iterators, and bran.spool.SpooledSequence values, are encoded as lists
+    (or tuples).
 
     :param mixed value: The value to encode.
     :return: An ASN.1 class encapsulating the value.
     """
-    import six, collections
+    import six
+    from .util import Mapping, Set, Sequence, Iterator
+    from .blob import BlobRef
+    from .spool import SpooledSequence
     from pyasn1.type import univ, char
 
     if value is None:
@@ -153,26 +323,38 @@ class ASN1Transcoder(object):
       return univ.Integer(value)
 
     elif isinstance(value, float):
-      return univ.Real(value)
+      return self.__encode_real(value)
 
     elif isinstance(value, complex):
       return self.__encode_complex(value)
 
-    elif isinstance(value, (bytes, bytearray, six.binary_type)):
+    elif isinstance(value, (bytes, bytearray, six.binary_type, memoryview)):
       return univ.OctetString(bytearray(value))
 
     elif isinstance(value, six.text_type):
       return char.UTF8String(value.encode('utf8'))
 
-    elif isinstance(value, collections.Mapping):
+    elif isinstance(value, BlobRef):
+      return univ.OctetString(value.read())
+
+    elif isinstance(value, self.__stdlib_types):
+      return self.__encode_stdlib(value)
+
+    elif isinstance(value, Mapping):
       return self.__encode_mapping(value)
 
-    elif isinstance(value, collections.Set):
+    elif isinstance(value, Set):
       return self.__encode_set(value)
 
-    elif isinstance(value, collections.Sequence):
+    elif isinstance(value, Sequence):
       return self.__encode_sequence(value)
 
+    elif isinstance(value, (SpooledSequence, Iterator)) and \
+        type(value) not in self.options.get('registry', {}):
+      # Iterators are collected in memory here; DERTranscoder spools them.
+      kind = getattr(value, 'kind', list)
+      return self.__encode_sequence(kind(value))
+
     else:
       return self.__encode_from_registry(value)
 
@@ -193,6 +375,39 @@ class ASN1Transcoder(object):
     # First call is for encoding
     return encoder(value)
 
+  def __encode_real(self, value):
+    # Finite values are passed to univ.Real in base 10 form, which is much
+    # cheaper than letting it convert the float.
+    import math
+    from pyasn1.type import univ
+    if not value or math.isinf(value):
+      return univ.Real(value)
+
+    from .codec import real_base10
+    mantissa, exponent = real_base10(value)
+    return univ.Real((int(mantissa), 10, exponent))
+
+  def __encode_stdlib(self, value):
+    # See the stdlib_types option
+    import datetime
+    import uuid
+    from pyasn1.type import univ, useful
+    from .codec import encode_time, decimal_parts
+    if isinstance(value, datetime.datetime):
+      # pyasn1's DER encoder re-formats the fraction of GeneralizedTime
+      # values and drops zeroes from it; as octets, the text is kept as is.
+      return univ.OctetString(encode_time(value),
+          tagSet = useful.GeneralizedTime.tagSet)
+    if isinstance(value, datetime.date):
+      return self.DATE.clone(value.toordinal())
+    if isinstance(value, uuid.UUID):
+      return self.UUID.clone(value.bytes)
+
+    val = self.DECIMAL.clone()
+    for idx, part in enumerate(decimal_parts(value)):
+      val[idx] = univ.Integer(part)
+    return val
+
   def __encode_complex(self, value):
     # Encode complex() values
     val = self.COMPLEX.clone()
@@ -204,8 +419,9 @@ class ASN1Transcoder(object):
 
   def __encode_sequence(self, value):
     # Everything except for lists get coerced to a tuple
+    from .frozen import FrozenList
     base = self.TUPLE
-    if isinstance(value, list):
+    if isinstance(value, (list, FrozenList)):
       base = self.LIST
     val = base.clone()
 
@@ -252,87 +468,209 @@ class ASN1Transcoder(object):
 
     Nested values (for Sequence, Set and Mapping) are recursively decoded.
 
+    The decoder is looked up by the value's tag set in a dispatch table that
+    is built when the transcoder is constructed.
+
     :param mixed value: The value to decode.
     :return: An Python value.
     """
-    # import six, collections
-    from pyasn1.type import univ, char
+    try:
+      decoder = self.__tagsets[value.tagSet]
+    except KeyError:
+      decoder = self.__resolve_decoder(value)
+    return decoder(value)
 
-    if isinstance(value, univ.Null):
-      return None
+  def __build_decoders(self):
+    # The dispatch table is keyed by the identifier octets of the tag set,
+    # outermost tag first. Registry entries for stringified tag sets are
+    # compiled into the same table; builtin types take precedence.
+    import six
+    from pyasn1.type import univ, char, useful
+    from .util import identifier_octets
+
+    builtins = (
+      (univ.Null.tagSet, lambda value: None),
+      (univ.Boolean.tagSet, bool),
+      (univ.Integer.tagSet, int),
+      (univ.Real.tagSet, float),
+      (char.UTF8String.tagSet, six.text_type),
+      (univ.OctetString.tagSet, six.binary_type),
+      (self.COMPLEX.tagSet, self.__decode_complex),
+      (self.TUPLE.tagSet, self.__decode_tuple),
+      (self.LIST.tagSet, self.__decode_list),
+      (self.MAPPING.tagSet, self.__decode_mapping),
+      (self.SET.tagSet, self.__decode_set),
+    )
 
-    elif isinstance(value, univ.Boolean):
-      return bool(value)
+    decoders = {}
+    registry = self.options.get('registry', {})
+    for key, decoder in registry.items():
+      if isinstance(key, six.string_types):
+        decoders[identifier_octets(key)] = self.__registry_decoder(key,
+            decoder)
+
+    if self.options.get('stdlib_types', False):
+      builtins += (
+        (useful.GeneralizedTime.tagSet, self.__decode_time),
+        (self.UUID.tagSet, self.__decode_uuid),
+        (self.DECIMAL.tagSet, self.__decode_decimal),
+        (self.DATE.tagSet, self.__decode_date),
+      )
 
-    elif isinstance(value, univ.Integer):
-      return int(value)
+    tagsets = {}
+    for tagset, decoder in builtins:
+      decoders[identifier_octets(tagset)] = decoder
+      tagsets[tagset] = decoder
 
-    elif isinstance(value, univ.Real):
-      return float(value)
+    return decoders, tagsets
 
-    elif isinstance(value, char.UTF8String):
-      from six import text_type
-      return text_type(value)
+  def __registry_decoder(self, tagset, decoder):
+    # Wrap non-callable registry entries so that they fail only when used.
+    if callable(decoder):
+      return decoder
 
-    elif isinstance(value, univ.OctetString):
-      from six import binary_type
-      return binary_type(value)
+    def bad_entry(value):
+      raise ValueError('Bad registry entry "%s" for tag set "%s"; expect a '
+          'callable!' % (decoder, tagset))
+    return bad_entry
+
+  def __resolve_decoder(self, value):
+    # Slow path for tag sets not seen before; look up the identifier octets
+    # in the dispatch table, and remember the result for the tag set.
+    from .util import identifier_octets
+    decoder = self.__decoders.get(identifier_octets(value.tagSet), None)
+    if decoder is not None:
+      self.__tagsets[value.tagSet] = decoder
+      return decoder
+
+    # Subtypes of the universal types we know about, e.g. from custom
+    # registry encoders, decode as their base type.
+    from pyasn1.type import univ, char
+    for base in (univ.Null, univ.Boolean, univ.Integer, univ.Real,
+                 char.UTF8String, univ.OctetString):
+      if isinstance(value, base):
+        return self.__tagsets[base.tagSet]
 
-    elif isinstance(value, (univ.Sequence, univ.SequenceOf)):
-      # Look for sub type tags
-      if value.isSameTypeWith(self.COMPLEX):
-        return complex(
-            self.decode(value[0]),
-            self.decode(value[1])
-        )
+    if isinstance(value, (univ.Set, univ.SetOf)):
+      return self.__decode_set
 
-      if value.isSameTypeWith(self.TUPLE):
-        return tuple(self.__sequence_iter(value))
+    from .util import stringify
+    raise TypeError('Cannot decode value tag set "%s"!' % (
+        stringify(value.tagSet),))
 
-      if value.isSameTypeWith(self.LIST):
-        return list(self.__sequence_iter(value))
+  def __decode_complex(self, value):
+    return complex(self.decode(value[0]), self.decode(value[1]))
 
-      if value.isSameTypeWith(self.MAPPING):
-        ret = {}
-        for key, value in self.__sequence_iter(value):
-          ret[key] = value
-        return ret
+  def __decode_tuple(self, value):
+    return tuple(self.__sequence_iter(value))
 
-    elif isinstance(value, (univ.Set, univ.SetOf)):
-      ret = set()
-      for item in self.__sequence_iter(value):
-        ret.add(item)
-      return ret
+  def __decode_list(self, value):
+    return self.__containers[0](self.__sequence_iter(value))
 
-    else:
-      return self.__decode_from_registry(value)
+  def __decode_mapping(self, value):
+    return self.__containers[1](self.__sequence_iter(value))
 
-  def __decode_from_registry(self, value):
-    registry = self.options.get('registry', {})
+  def __decode_set(self, value):
+    return self.__containers[2](self.__sequence_iter(value))
 
-    # If we find the value tagset in the registry, we can use that to create
-    # a custom ASN.1 type.
-    from .util import stringify
-    tagset = stringify(value.tagSet)
-    decoder = registry.get(tagset, None)
-    if decoder is None:
-      raise TypeError('Cannot decode value tag set "%s"!' % (tagset,))
+  def __decode_time(self, value):
+    from .codec import decode_time
+    return decode_time(value.asOctets())
 
-    if not callable(decoder):
-      raise ValueError('Bad registry entry "%s" for tag set "%s"; expect a '
-          'callable!' % (decoder, tagset))
+  def __decode_uuid(self, value):
+    import uuid
+    return uuid.UUID(bytes = value.asOctets())
 
-    # First call is for encoding
-    return decoder(value)
+  def __decode_decimal(self, value):
+    from .codec import decode_decimal
+    return decode_decimal(*(int(item) for item in value))
+
+  def __decode_date(self, value):
+    import datetime
+    return datetime.date.fromordinal(int(value))
 
   def __sequence_iter(self, seq):
     # Iterate through a univ.Sequence, decode and yield each item
+    decode = self.decode
     idx = 0
     while True:
       try:
-        item = self.decode(seq[idx])
-        yield item
-        idx += 1
+        item = seq[idx]
       except IndexError:
         break
-    raise StopIteration
+      yield decode(item)
+      idx += 1
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_transcoder():
+  """
+  Return the shared DERTranscoder with default options.
+
+  The instance is created on first use, and can safely be shared between
+  threads.
+
+  :return: A DERTranscoder instance.
+  """
+  global _default
+  if _default is None:
+    with _default_lock:
+      if _default is None:
+        _default = DERTranscoder()
+  return _default
+
+
+def dumps(value, transcoder = None):
+  """
+  DER-encode the given value.
+
+  :param mixed value: The value to encode.
+  :param DERTranscoder transcoder: [optional] The transcoder to use; defaults
+      to the shared default_transcoder().
+  :return: The encoded value as bytes.
+  """
+  return (transcoder or default_transcoder()).encode(value)
+
+
+def loads(data, transcoder = None):
+  """
+  Decode the given DER-encoded byte sequence.
+
+  :param bytes data: The value to decode.
+  :param DERTranscoder transcoder: [optional] The transcoder to use; defaults
+      to the shared default_transcoder().
+  :return: The decoded Python value.
+  """
+  return (transcoder or default_transcoder()).decode(data)
+
+
+def validate(data, transcoder = None):
+  """
+  Check that the given byte sequence is a canonical encoding of one value.
+
+  :param bytes data: The value to validate.
+  :param DERTranscoder transcoder: [optional] The transcoder to use; defaults
+      to the shared default_transcoder().
+  :raises: bran.validator.ValidationError at the first violation.
+  """
+  (transcoder or default_transcoder()).validate(data)
+
+
+def digest(value, hashfunc = None, transcoder = None):
+  """
+  Return the hash digest of the given value's DER encoding.
+
+  :param mixed value: The value to hash.
+  :param callable hashfunc: [optional] One of hashlib's constructor functions;
+      defaults to hashlib.sha512
+  :param DERTranscoder transcoder: [optional] The transcoder to use; defaults
+      to the shared default_transcoder().
+  :return: The digest as bytes.
+  """
+  from .hash import BranHasher
+  hasher = BranHasher(hashfunc = hashfunc, transcoder = transcoder)
+  hasher.update(value)
+  return hasher.digest()
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""Run the bran command line interface with python -m bran."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import sys
+
+from .cli import main
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Codec backends for DERTranscoder.
+
+A backend turns Python values into DER buffers and back, using the tags and
+options of an ASN1Transcoder. All backends must produce byte-identical
+encodings and equal decoded values; they differ only in speed. Two backends
+are built in:
+
+- native: the pure-Python codec in bran.codec. This is the default.
+- pyasn1: ASN1Transcoder and pyasn1's DER codec. It is much slower, but
+  serves as the reference the other backends are checked against. The
+  decoding limits are checked on the headers before pyasn1 sees the data.
+
+Further backends, e.g. compiled extensions, can be added with register(), or
+by installing a package that declares a Backend subclass in the
+``bran.backends`` entry point group. Without an explicit choice, DERTranscoder
+uses the fastest available backend.
+
+The test suite runs its conformance and differential tests against every
+available backend, including installed ones.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('Backend', 'NativeBackend', 'PyASN1Backend', 'register',
+    'backends', 'get_backend')
+
+import threading
+
+
+class Backend(object):
+  """
+  The interface of codec backends.
+
+  Subclasses set a unique name and a speed rank, and implement the encode
+  and decode methods. Backends keep no per-call state, so that a single
+  instance can be shared between threads.
+  """
+
+  #: The name by which the backend can be chosen.
+  name = None
+
+  #: The speed rank; higher is faster. The default backend is the available
+  #: one with the highest rank.
+  speed = 0
+
+  @classmethod
+  def available(cls):
+    """
+    Return whether the backend can be used, e.g. if its extension is built.
+
+    :return: True or False.
+    """
+    return True
+
+  def __init__(self, transcoder, threshold = 1024):
+    """
+    Initialize the backend.
+
+    :param ASN1Transcoder transcoder: The transcoder whose tags and options
+        to use.
+    :param int threshold: [optional] The minimum size of byte payloads that
+        should be returned by reference rather than copied.
+    """
+    self.transcoder = transcoder
+    self.threshold = threshold
+
+  def encode_buffers(self, value):
+    """
+    DER-encode the given value into a list of buffers.
+
+    :param mixed value: The value to encode.
+    :return: A list of bytes-like objects and bran.blob.BlobRef instances,
+        which stand for their content.
+    """
+    raise NotImplementedError
+
+  def decode(self, data):
+    """
+    Decode the first value in the given buffer; trailing data is ignored.
+
+    :param bytes data: A bytes-like object.
+    :return: The decoded Python value.
+    """
+    raise NotImplementedError
+
+  def decode_all(self, data):
+    """
+    Decode all consecutive values in the given buffer.
+
+    :param bytes data: A bytes-like object.
+    :return: A generator yielding the decoded Python values in order.
+    """
+    raise NotImplementedError
+
+
+class NativeBackend(Backend):
+  """The pure-Python codec from bran.codec."""
+
+  name = 'native'
+  speed = 10
+
+  def __init__(self, transcoder, threshold = 1024):
+    Backend.__init__(self, transcoder, threshold)
+    from .codec import BufferEncoder, Decoder
+    self.__encoder = BufferEncoder(transcoder, threshold)
+    self.__decoder = Decoder(transcoder)
+
+  def encode_buffers(self, value):
+    return self.__encoder.encode(value)
+
+  def decode(self, data):
+    return self.__decoder.decode(data)
+
+  def decode_all(self, data):
+    return self.__decoder.decode_all(data)
+
+
+def _pyasn1_decode():
+  # pyasn1's DER decode function. Since pyasn1 0.5, decoding an empty SEQUENCE
+  # or SET without a schema yields None instead of an empty value, so the
+  # payload decoders for both are replaced with ones that fix that up.
+  from pyasn1.codec.der import decoder
+  try:
+    from pyasn1.codec.ber import decoder as ber
+    ber.ConstructedPayloadDecoderBase._decodeComponentsSchemaless
+  except AttributeError:  # pragma: no cover
+    return decoder.decode
+
+  from pyasn1.type import univ, tag
+
+  def fixed(base):
+    class Fixed(base):
+      def _decodeComponentsSchemaless(self, substrate, tagSet = None,
+          **options):
+        for component in base._decodeComponentsSchemaless(self, substrate,
+            tagSet = tagSet, **options):
+          if component is None:
+            proto = self.protoSequenceComponent
+            component = proto.clone(tagSet = tag.TagSet(proto.tagSet.baseTag,
+                *tagSet.superTags))
+          yield component
+    return Fixed()
+
+  tag_map = dict(decoder.TAG_MAP)
+  tag_map[univ.Sequence.tagSet] = fixed(
+      ber.SequenceOrSequenceOfPayloadDecoder)
+  tag_map[univ.Set.tagSet] = fixed(ber.SetOrSetOfPayloadDecoder)
+
+  class SingleItemDecoder(decoder.SingleItemDecoder):
+    TAG_MAP = tag_map
+
+  class StreamingDecoder(decoder.StreamingDecoder):
+    SINGLE_ITEM_DECODER = SingleItemDecoder
+
+  class Decoder(decoder.Decoder):
+    STREAMING_DECODER = StreamingDecoder
+
+  return Decoder()
+
+
+class PyASN1Backend(Backend):
+  """ASN1Transcoder and pyasn1's DER codec."""
+
+  name = 'pyasn1'
+  speed = 0
+
+  def __init__(self, transcoder, threshold = 1024):
+    Backend.__init__(self, transcoder, threshold)
+    self.__decode = _pyasn1_decode()
+
+    # pyasn1 has no limits of its own; the native decoder checks the input.
+    from .codec import Decoder
+    self.__check = None
+    if any(transcoder.options.get(limit, None) is not None for limit in (
+        'max_size', 'max_depth', 'max_items', 'max_length', 'max_total')):
+      self.__check = Decoder(transcoder).check_limits
+
+  def encode_buffers(self, value):
+    from pyasn1.codec.der import encoder
+    return [encoder.encode(self.transcoder.encode(value))]
+
+  def decode(self, data):
+    data = bytes(data)
+    if self.__check is not None:
+      self.__check(data)
+    return self.transcoder.decode(self.__decode(data)[0])
+
+  def decode_all(self, data):
+    data = bytes(data)
+    offset = 0
+    while offset < len(data):
+      if self.__check is not None:
+        self.__check(data, offset)
+      value, rest = self.__decode(data[offset:])
+      offset = len(data) - len(rest)
+      yield self.transcoder.decode(value)
+
+
+_registry = {}
+_lock = threading.Lock()
+_discovered = False
+
+
+def register(backend):
+  """
+  Register a backend class, replacing any backend of the same name.
+
+  :param type backend: A Backend subclass.
+  :return: The class, so this can be used as a decorator.
+  """
+  if not (isinstance(backend, type) and issubclass(backend, Backend)) \
+      or not backend.name:
+    raise TypeError('Backends must be named subclasses of Backend, got %r!'
+        % (backend,))
+  with _lock:
+    _registry[backend.name] = backend
+  return backend
+
+
+register(NativeBackend)
+register(PyASN1Backend)
+
+
+def _discover():
+  # Load backends from installed packages, once.
+  global _discovered
+  if _discovered:
+    return
+  _discovered = True
+
+  try:
+    from importlib import metadata
+  except ImportError:  # pragma: no cover
+    return
+  try:
+    entries = metadata.entry_points(group = 'bran.backends')
+  except TypeError:  # pragma: no cover
+    entries = metadata.entry_points().get('bran.backends', ())
+  for entry in entries:
+    try:
+      register(entry.load())
+    except Exception:  # pragma: no cover
+      # A broken plugin must not break bran.
+      pass
+
+
+def backends():
+  """
+  Return the available backends.
+
+  :return: A list of Backend subclasses, fastest first.
+  """
+  _discover()
+  with _lock:
+    found = [backend for backend in _registry.values() if backend.available()]
+  return sorted(found, key = lambda backend: -backend.speed)
+
+
+def get_backend(name = None):
+  """
+  Return a backend class by name, or the fastest available one.
+
+  :param str name: [optional] The name of the backend.
+  :return: A Backend subclass.
+  :raises: ValueError if no available backend has the given name.
+  """
+  available = backends()
+  if name is None:
+    return available[0]
+  for backend in available:
+    if backend.name == name:
+      return backend
+  raise ValueError('No available backend named "%s"; choose one of: %s'
+      % (name, ', '.join(backend.name for backend in available)))
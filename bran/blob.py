@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+References to binary data in files, encoded without reading them into memory.
+
+A BlobRef can be used in place of a bytes value. It is encoded as an OCTET
+STRING; the header is written from the known length, and the content is read
+and passed on in chunks by DERTranscoder.encode_into() and BranHasher, so
+memory use does not depend on the size of the blob. The result is the same
+as for the bytes the blob refers to.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('BlobRef',)
+
+
+class BlobRef(object):
+  """
+  A reference to binary data in a file.
+
+  The source is either a path, which is opened whenever the blob is read, or
+  a binary file object. For seekable file objects, the position at
+  construction is remembered, and every read starts from there; unseekable
+  streams can only be read once.
+  """
+
+  def __init__(self, source, length = None, chunk_size = 1 << 16):
+    """
+    Initialize the reference.
+
+    :param mixed source: A path, or a binary file object.
+    :param int length: [optional] The number of Bytes to read. Defaults to
+        the size of the file, or for file objects, to the remainder from the
+        current position; unseekable streams require a length.
+    :param int chunk_size: [optional] The size of reads in Bytes; defaults to
+        64 KiB.
+    """
+    import six
+    self.__path = None
+    self.__fileobj = None
+    self.__start = None
+    if isinstance(source, six.string_types):
+      self.__path = source
+      if length is None:
+        import os
+        length = os.path.getsize(source)
+    else:
+      self.__fileobj = source
+      seekable = getattr(source, 'seekable', None)
+      if seekable is not None and seekable():
+        self.__start = source.tell()
+        if length is None:
+          import io
+          length = source.seek(0, io.SEEK_END) - self.__start
+          source.seek(self.__start)
+      elif length is None:
+        raise ValueError('The length of unseekable streams must be given!')
+
+    self.length = length
+    self.chunk_size = chunk_size
+
+  def __len__(self):
+    return self.length
+
+  def __repr__(self):
+    return '%s(%r, %d)' % (type(self).__name__,
+        self.__path or self.__fileobj, self.length)
+
+  def chunks(self):
+    """
+    Read the blob in chunks.
+
+    :return: A generator yielding bytes objects of at most chunk_size Bytes.
+    :raises: ValueError if the source holds less than length Bytes.
+    """
+    if self.__path is not None:
+      fileobj = open(self.__path, 'rb')
+    else:
+      fileobj = self.__fileobj
+      if self.__start is not None:
+        fileobj.seek(self.__start)
+
+    try:
+      remaining = self.length
+      while remaining:
+        data = fileobj.read(min(self.chunk_size, remaining))
+        if not data:
+          raise ValueError('%r ends %d Bytes early!' % (self, remaining))
+        remaining -= len(data)
+        yield data
+    finally:
+      if self.__path is not None:
+        fileobj.close()
+
+  def read(self):
+    """
+    Read the whole blob.
+
+    :return: The content as bytes.
+    """
+    return b''.join(self.chunks())
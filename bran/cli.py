@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Command line interface for bulk conversion and hashing of records.
+
+Records are read from JSON-lines files, i.e. one JSON value per line, or from
+DER record files, i.e. bran encodings back to back. Input is streamed in
+batches; with --jobs, batches are processed in a pool of worker processes,
+and the results are written in input order.
+
+The subcommands are:
+
+- encode: convert JSON-lines to a DER record file.
+- decode: convert a DER record file to JSON-lines. Values that JSON does not
+  know are converted: bytes to base64 strings, sets to sorted arrays and
+  complex numbers to [real, imag] arrays. If a mapping has keys that are not
+  strings or numbers, or that cannot be sorted, all its keys are converted
+  to strings: bytes to base64, and other keys to their JSON text, e.g.
+  "[1, 2]" for the tuple (1, 2).
+- hash: write the hex digest of each record, one per line.
+- verify: compare the digests of records with a file written by hash.
+
+JSON input is transcoded to DER directly, without building Python values.
+Digests of DER records are computed over the records as they are, which is
+the same as hashing the decoded values if the input is bran's own output.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('main',)
+
+import sys
+
+
+def read_json_lines(fileobj):
+  """
+  Yield the non-empty lines of a JSON-lines file.
+
+  :param file fileobj: A binary file object.
+  :return: A generator yielding the lines as bytes.
+  """
+  for line in fileobj:
+    if line.strip():
+      yield line
+
+
+def read_der_records(fileobj, chunk_size = 1 << 20):
+  """
+  Yield the records of a DER record file.
+
+  The file is read in chunks, so this works on pipes, too. Only the headers
+  of records are parsed.
+
+  :param file fileobj: A binary file object.
+  :param int chunk_size: [optional] The size of reads in Bytes.
+  :return: A generator yielding the encoded records as bytes.
+  :raises: ValueError if the last record is truncated.
+  """
+  from pyasn1.error import SubstrateUnderrunError
+  from .codec import read_header
+
+  buf = bytearray()
+  offset = 0
+  eof = False
+  while True:
+    if offset < len(buf):
+      try:
+        stop = read_header(buf, offset, len(buf))[2]
+        yield bytes(buf[offset:stop])
+        offset = stop
+        continue
+      except SubstrateUnderrunError:
+        pass
+
+    if eof:
+      if offset < len(buf):
+        raise ValueError('Truncated record at the end of the input!')
+      return
+
+    del buf[:offset]
+    offset = 0
+    chunk = fileobj.read(chunk_size)
+    eof = not chunk
+    buf.extend(chunk)
+
+
+def _jsonable(value):
+  # Convert values JSON does not know
+  if isinstance(value, bytes):
+    import base64
+    return base64.b64encode(value).decode('ascii')
+  if isinstance(value, (set, frozenset)):
+    try:
+      return sorted(value)
+    except TypeError:
+      return list(value)
+  if isinstance(value, complex):
+    return [value.real, value.imag]
+  raise TypeError('Cannot convert value of type "%s" to JSON!'
+      % (type(value),))
+
+
+def _json_key(key):
+  # Convert a mapping key to a string
+  import json
+  if isinstance(key, str):
+    return key
+  if isinstance(key, bytes):
+    import base64
+    return base64.b64encode(key).decode('ascii')
+  return json.dumps(key, sort_keys = True, default = _jsonable)
+
+
+def _json_keys(value):
+  # Convert the keys of all mappings in the value to strings
+  if isinstance(value, dict):
+    return dict((_json_key(key), _json_keys(item))
+                for key, item in value.items())
+  if isinstance(value, (list, tuple)):
+    return [_json_keys(item) for item in value]
+  return value
+
+
+def _dumps(value):
+  # Serialize a decoded value as JSON; mapping keys are converted only if
+  # JSON cannot handle them as they are.
+  import json
+  try:
+    return json.dumps(value, sort_keys = True, default = _jsonable)
+  except TypeError:
+    return json.dumps(_json_keys(value), sort_keys = True,
+                      default = _jsonable)
+
+
+def _encode_batch(records):
+  from .jsonstream import encode_json
+  return [encode_json(record) for record in records]
+
+
+def _decode_batch(records):
+  import bran
+  return [_dumps(bran.loads(record)).encode('utf8') + b'\n'
+          for record in records]
+
+
+def _hash_batch(records, input_format, hash_name):
+  import hashlib
+  import functools
+  hashfunc = functools.partial(hashlib.new, hash_name)
+  if input_format == 'der':
+    return [hashfunc(record).hexdigest() for record in records]
+
+  from .jsonstream import digest_json
+  return [digest_json(record, hashfunc).hex() for record in records]
+
+
+def _batches(records, size, stats):
+  # Group records into lists, counting them as they pass.
+  import itertools
+  records = iter(records)
+  while True:
+    batch = list(itertools.islice(records, size))
+    if not batch:
+      return
+    stats[0] += len(batch)
+    stats[1] += sum(len(record) for record in batch)
+    yield batch
+
+
+def _open(path, mode):
+  # Open a path, or return stdin or stdout for '-'
+  if path == '-':
+    stream = 'r' in mode and sys.stdin or sys.stdout
+    return getattr(stream, 'buffer', stream), False
+  return open(path, mode), True
+
+
+def _positive_int(text):
+  # argparse type for counts of at least one
+  import argparse
+  try:
+    value = int(text)
+  except ValueError:
+    value = 0
+  if value < 1:
+    raise argparse.ArgumentTypeError('expected a positive integer, got %r'
+        % (text,))
+  return value
+
+
+def _parser():
+  import argparse
+  import hashlib
+
+  parser = argparse.ArgumentParser(prog = 'bran', description = 'Convert '
+      'and hash records with bran\'s DER encoding.')
+  commands = parser.add_subparsers(dest = 'command', metavar = 'command')
+  commands.required = True
+
+  def add(name, help_text, input_format):
+    command = commands.add_parser(name, help = help_text,
+        description = help_text)
+    command.add_argument('input', nargs = '?', default = '-',
+        help = 'The input file; defaults to stdin.')
+    if name == 'verify':
+      command.add_argument('digests',
+          help = 'A file with one hex digest per line, as written by hash.')
+    else:
+      command.add_argument('-o', '--output', default = '-',
+          help = 'The output file; defaults to stdout.')
+    if input_format is None:
+      command.add_argument('-f', '--format', choices = ('der', 'json'),
+          default = 'der', help = 'The input format; defaults to der.')
+      command.add_argument('--hash', default = 'sha512',
+          choices = sorted(name for name in hashlib.algorithms_available
+                           if not name.startswith('shake')),
+          metavar = 'NAME', help = 'The hash function; defaults to sha512.')
+    command.add_argument('-j', '--jobs', type = _positive_int, default = 1,
+        help = 'The number of worker processes; defaults to 1.')
+    command.add_argument('--batch', type = _positive_int, default = 1000,
+        help = 'The number of records per batch; defaults to 1000.')
+    command.add_argument('-q', '--quiet', action = 'store_true',
+        help = 'Do not print throughput statistics.')
+    command.set_defaults(input_format = input_format)
+
+  add('encode', 'Encode JSON-lines to DER records.', 'json')
+  add('decode', 'Decode DER records to JSON-lines.', 'der')
+  add('hash', 'Write the hex digest of each record.', None)
+  add('verify', 'Compare the digests of records with a digest file.', None)
+  return parser
+
+
+def main(argv = None):
+  """
+  Run the command line interface.
+
+  :param list argv: [optional] The arguments; defaults to sys.argv[1:].
+  :return: The exit status; 1 if verify found mismatches, else 0.
+  """
+  import time
+  from .parallel import _run
+
+  args = _parser().parse_args(argv)
+  input_format = args.input_format or args.format
+  start = time.time()
+  stats = [0, 0]
+
+  infile, close_in = _open(args.input, 'rb')
+  try:
+    if input_format == 'json':
+      records = read_json_lines(infile)
+    else:
+      records = read_der_records(infile)
+    batches = _batches(records, args.batch, stats)
+
+    if args.command == 'encode':
+      tasks = ((_encode_batch, (batch,)) for batch in batches)
+    elif args.command == 'decode':
+      tasks = ((_decode_batch, (batch,)) for batch in batches)
+    else:
+      tasks = ((_hash_batch, (batch, input_format, args.hash))
+               for batch in batches)
+    results = _run(tasks, args.jobs)
+
+    if args.command == 'verify':
+      status = _verify(results, args.digests)
+    else:
+      status = _write(results, args.command, args.output)
+  finally:
+    if close_in:
+      infile.close()
+
+  if not args.quiet:
+    elapsed = max(time.time() - start, 1e-9)
+    sys.stderr.write('%d records, %.1f MB in %.2fs: %.0f records/s, '
+        '%.1f MB/s\n' % (stats[0], stats[1] / 1e6, elapsed,
+          stats[0] / elapsed, stats[1] / 1e6 / elapsed))
+  return status
+
+
+def _write(results, command, path):
+  outfile, close_out = _open(path, 'wb')
+  try:
+    for batch in results:
+      if command == 'hash':
+        batch = [digest.encode('ascii') + b'\n' for digest in batch]
+      outfile.write(b''.join(batch))
+    outfile.flush()
+  finally:
+    if close_out:
+      outfile.close()
+  return 0
+
+
+def _verify(results, path):
+  import itertools
+  mismatches = 0
+  with open(path, 'r') as digests:
+    expected = (line.strip() for line in digests if line.strip())
+    computed = (digest for batch in results for digest in batch)
+    for index, (wanted, digest) in enumerate(itertools.zip_longest(expected,
+        computed)):
+      if wanted is None or digest is None:
+        sys.stderr.write('Record count differs from the digest file at record '
+            '%d\n' % (index,))
+        return 1
+      if wanted.lower() != digest:
+        sys.stderr.write('Record %d: digest mismatch\n' % (index,))
+        mismatches += 1
+  return mismatches and 1 or 0
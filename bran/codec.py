@@ -0,0 +1,1061 @@
+# -*- coding: utf-8 -*-
+"""
+Pure-Python DER codec for the values bran understands.
+
+The encoder in this module produces the same bytes as passing a value through
+ASN1Transcoder and pyasn1's DER encoder, but works on Python values directly.
+Its output is a list of buffers rather than a single byte string, so that
+large byte payloads can be passed on by reference instead of being copied.
+
+Similarly, the decoder produces the same values as pyasn1's DER decoder
+followed by ASN1Transcoder, but parses the DER encoding itself.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('DecodeError', 'LimitExceeded', 'UnknownTag')
+
+import six
+from pyasn1 import error as _error
+
+from .util import Mapping, Set, Sequence, Iterator
+from .frozen import FrozenList
+from .blob import BlobRef
+from .spool import SpooledSequence
+
+
+class DecodeError(_error.PyAsn1Error):
+  """
+  Raised when the decoder rejects its input before decoding it.
+
+  The offset attribute holds the byte offset of the offending value.
+  """
+
+  def __init__(self, message, offset):
+    message = '%s at offset %d' % (message, offset)
+    _error.PyAsn1Error.__init__(self, message)
+    self.args = (message,)
+    self.offset = offset
+
+
+class LimitExceeded(DecodeError):
+  """Raised when decoding input exceeds one of the transcoder's limits."""
+  pass
+
+
+class UnknownTag(DecodeError):
+  """
+  Raised for values whose tags are neither bran's nor in the registry.
+  """
+  pass
+
+
+class _Budget(object):
+  # Resources used by a single decode() call.
+  __slots__ = ('depth', 'total')
+
+  def __init__(self):
+    self.depth = 0
+    self.total = 0
+
+
+def encode_length(length):
+  """
+  Return the DER encoding of a content length.
+
+  :param int length: The length of the content octets.
+  :return: The length octets as bytes.
+  """
+  if length < 0x80:
+    return bytes((length,))
+  octets = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+  return bytes((0x80 | len(octets),)) + octets
+
+
+def encode_integer(value):
+  """
+  Return the two's complement content octets of an integer.
+
+  The length matches pyasn1's encoder, which sizes negative values by their
+  absolute value. That is one octet more than necessary for negative powers
+  of 256, e.g. -128 is encoded as 0xff80, but changing it would change the
+  encoding of existing values.
+
+  :param int value: The integer to encode.
+  :return: The content octets as bytes.
+  """
+  length = abs(value).bit_length() // 8 + 1
+  return value.to_bytes(length, 'big', signed = True)
+
+
+def real_base10(value):
+  """
+  Return the base 10 mantissa and exponent of a finite, non-zero float.
+
+  This reproduces pyasn1's conversion of floats to REAL values, which scales
+  the value by ten until it is integral, and then strips trailing zeroes from
+  the mantissa. The result is not always the shortest decimal representation
+  of the float, but it determines the existing encoding of REAL values.
+
+  :param float value: The value to convert.
+  :return: A tuple of mantissa and exponent as strings of decimal digits.
+  :raises: ValueError if the value is NaN.
+  """
+  exponent = 0
+  if not value.is_integer():
+    while int(value) != value:
+      value *= 10
+      exponent -= 1
+
+  digits = '%d' % value
+  mantissa = digits.rstrip('0')
+  exponent += len(digits) - len(mantissa)
+  return mantissa, exponent
+
+
+def encode_real(value):
+  """
+  Return the DER content octets of a float.
+
+  Finite values are encoded in the ISO 6093 NR3 character form, infinities as
+  the special real values. Positive and negative zero have empty content.
+
+  :param float value: The float to encode.
+  :return: The content octets as bytes.
+  :raises: ValueError if the value is NaN.
+  """
+  if value != value:
+    raise ValueError('cannot convert float NaN to integer')
+  if not value:
+    return b''
+  if value == _INF:
+    return b'\x40'
+  if value == -_INF:
+    return b'\x41'
+  mantissa, exponent = real_base10(value)
+  return ('\x03%sE%s%d' % (mantissa, exponent == 0 and '+' or '',
+      exponent)).encode('ascii')
+
+
+def decode_real(content):
+  """
+  Return the float encoded in the given REAL content octets.
+
+  The result is the same as that of pyasn1's decoder, which converts decimal
+  values to float and back to base 10 before producing a float.
+
+  :param bytes content: The content octets.
+  :return: The decoded float.
+  :raises: PyAsn1Error if the content is not a valid REAL encoding.
+  """
+  from pyasn1 import error
+
+  if not content:
+    return 0.0
+
+  head = content[0]
+  if head & 0x80:
+    # Binary encoding
+    import math
+    size = (head & 0x03) + 1
+    start = 1
+    if size == 4:
+      if len(content) < 2:
+        raise error.PyAsn1Error('Incomplete floating-point value')
+      size = content[1]
+      start = 2
+    exponent_octets = content[start:start + size]
+    mantissa_octets = content[start + size:]
+    if not exponent_octets or not mantissa_octets:
+      raise error.PyAsn1Error('Real exponent screwed')
+
+    exponent = int.from_bytes(exponent_octets, 'big', signed = True)
+    base = head >> 4 & 0x03
+    if base > 2:
+      raise error.PyAsn1Error('Illegal Real base')
+    exponent *= (1, 3, 4)[base]
+
+    mantissa = int.from_bytes(mantissa_octets, 'big')
+    if head & 0x40:
+      mantissa = -mantissa
+    mantissa <<= head >> 2 & 0x03
+    try:
+      return math.ldexp(float(mantissa), exponent)
+    except OverflowError:
+      raise error.PyAsn1Error('Real value out of range')
+
+  if head & 0x40:
+    # Special values
+    return head & 0x01 and -_INF or _INF
+
+  # Character encoding
+  form = head & 0x03
+  try:
+    if form == 1:
+      return float(int(bytes(content[1:])))
+    if form in (2, 3):
+      value = float(bytes(content[1:]))
+    else:
+      raise error.SubstrateUnderrunError('Unknown NR (tag %s)' % head)
+  except ValueError:
+    raise error.SubstrateUnderrunError('Bad character Real syntax')
+  except OverflowError:
+    raise error.PyAsn1Error('Real value out of range')
+
+  # pyasn1 converts the float to base 10 again
+  if not value:
+    return 0.0
+  if value in (_INF, -_INF):
+    return value
+  mantissa, exponent = real_base10(value)
+  return float(int(mantissa) * pow(10, exponent))
+
+
+_INF = float('inf')
+
+
+def encode_time(value):
+  """
+  Return the DER content octets of a GeneralizedTime for a datetime.
+
+  The time is converted to UTC, and encoded with a 'Z' suffix; fractions of
+  seconds are given only if non-zero, without trailing zeroes.
+
+  :param datetime value: A timezone aware datetime.
+  :return: The content octets as bytes.
+  :raises: ValueError for naive datetimes, which have no defined UTC time.
+  """
+  if value.utcoffset() is None:
+    raise ValueError('Cannot encode naive datetime %r; add a tzinfo!'
+        % (value,))
+  import datetime
+  value = value.astimezone(datetime.timezone.utc)
+  text = '%04d%02d%02d%02d%02d%02d' % (value.year, value.month, value.day,
+      value.hour, value.minute, value.second)
+  if value.microsecond:
+    text += ('.%06d' % value.microsecond).rstrip('0')
+  return (text + 'Z').encode('ascii')
+
+
+_TIME = None
+
+
+def decode_time(content):
+  """
+  Return the datetime encoded in the given GeneralizedTime content octets.
+
+  :param bytes content: The content octets, in the UTC form encode_time()
+      produces.
+  :return: A datetime in UTC.
+  :raises: PyAsn1Error if the content is not such a time.
+  """
+  global _TIME
+  import datetime
+  if _TIME is None:
+    import re
+    _TIME = re.compile(br'(\d{4})(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)'
+        br'(?:\.(\d{1,6}))?Z\Z')
+
+  match = _TIME.match(bytes(content))
+  try:
+    if match is None:
+      raise ValueError('Unsupported format')
+    fraction = match.group(7) or b''
+    return datetime.datetime(*[int(part) for part in match.groups()[:6]],
+        microsecond = int(fraction.ljust(6, b'0')),
+        tzinfo = datetime.timezone.utc)
+  except ValueError as ex:
+    from pyasn1 import error
+    raise error.PyAsn1Error('Bad GeneralizedTime %r: %s'
+        % (bytes(content), ex))
+
+
+def decimal_parts(value):
+  """
+  Return the canonical coefficient and exponent of a finite Decimal.
+
+  Trailing zeroes are moved from the coefficient to the exponent, and zero
+  is represented as (0, 0), so that equal values have equal parts, e.g.
+  Decimal('1.50') and Decimal('1.5') are both (15, -1).
+
+  :param Decimal value: The value to convert.
+  :return: A tuple of the signed integer coefficient and the exponent.
+  :raises: ValueError for infinities and NaN.
+  """
+  if not value.is_finite():
+    raise ValueError('Cannot encode non-finite Decimal %r!' % (value,))
+  import decimal
+  sign, digits, exponent = value.as_tuple()
+  count = len(digits)
+  while count and not digits[count - 1]:
+    count -= 1
+  if not count:
+    return 0, 0
+  # int() of a Decimal converts exactly; going through str would be
+  # limited to sys.get_int_max_str_digits() digits.
+  coefficient = int(decimal.Decimal((sign, digits[:count], 0)))
+  return coefficient, exponent + len(digits) - count
+
+
+def decode_decimal(coefficient, exponent):
+  """
+  Return the Decimal with the given coefficient and exponent, exactly.
+
+  :param int coefficient: The signed coefficient.
+  :param int exponent: The exponent.
+  :return: A Decimal.
+  :raises: PyAsn1Error if the exponent is outside of Decimal's range.
+  """
+  import decimal
+  # As in decimal_parts(), the digits are not converted through str.
+  digits = decimal.Decimal(abs(coefficient)).as_tuple().digits
+  try:
+    return decimal.Decimal((coefficient < 0 and 1 or 0, digits, exponent))
+  except ArithmeticError:
+    from pyasn1 import error
+    raise error.PyAsn1Error('Decimal exponent %d out of range' % (exponent,))
+
+
+def tag_key(tagset):
+  """
+  Return the key by which DER orders SET components with the given tag set.
+
+  :param TagSet tagset: A pyasn1 tag set.
+  :return: A sortable tuple.
+  """
+  return tuple((tag.tagClass, tag.tagId) for tag in tagset)
+
+
+class BufferEncoder(object):
+  """
+  Encode Python values to a list of DER buffers.
+
+  The encoder uses the tags and options of an ASN1Transcoder instance. Values
+  that it does not handle natively, such as registry types, are passed through
+  the transcoder and pyasn1's DER encoder.
+
+  Byte payloads of at least `threshold` Bytes are not copied; the returned
+  list contains references to the original bytes, bytearray or memoryview
+  objects. Everything else is coalesced into as few chunks as possible.
+  """
+
+  def __init__(self, transcoder, threshold = 1024):
+    """
+    Initialize the encoder.
+
+    :param ASN1Transcoder transcoder: The transcoder whose tags and options
+        to use.
+    :param int threshold: [optional] The minimum size of byte payloads that
+        are passed by reference; defaults to 1024.
+    """
+    from .util import identifier_octets
+
+    self.transcoder = transcoder
+    self.threshold = threshold
+    self.__sort = transcoder.options.get('sort', sorted)
+
+    def explicit(template):
+      tagset = template.tagSet
+      return (identifier_octets(tagset[-1]), identifier_octets(tagset[0]),
+              tag_key(tagset))
+
+    self.COMPLEX = explicit(transcoder.COMPLEX)
+    self.TUPLE = explicit(transcoder.TUPLE)
+    self.LIST = explicit(transcoder.LIST)
+    self.MAPPING = explicit(transcoder.MAPPING)
+    self.SET = explicit(transcoder.SET)
+    self.UUID = explicit(transcoder.UUID)
+    self.DECIMAL = explicit(transcoder.DECIMAL)
+    self.DATE = explicit(transcoder.DATE)
+
+    # Standard library types, if enabled
+    self.__stdlib_types = ()
+    if transcoder.options.get('stdlib_types', False):
+      import datetime
+      import decimal
+      import uuid
+      self.__stdlib_types = (datetime.date, uuid.UUID, decimal.Decimal)
+      self.__datetime = datetime.datetime
+
+  def encode(self, value):
+    """
+    Encode the given value into a list of buffers.
+
+    :param mixed value: The value to encode.
+    :return: A list of bytes-like objects and bran.blob.BlobRef instances,
+        which stand for their content; the concatenation is the DER encoding
+        of the value.
+    """
+    out = []
+    self.__encode(value, out)
+    return self.__coalesce(out)
+
+  def __coalesce(self, out):
+    # Join runs of small chunks; keep large payloads and blobs as references.
+    ret = []
+    pending = []
+    for chunk in out:
+      if len(chunk) < self.threshold and not isinstance(chunk, BlobRef):
+        pending.append(chunk)
+        continue
+      if pending:
+        ret.append(b''.join(pending))
+        pending = []
+      ret.append(chunk)
+    if pending:
+      ret.append(b''.join(pending))
+    return ret
+
+  def __encode(self, value, out):
+    # Append the value's encoding to out; return the number of Bytes appended
+    # and the key by which the value is ordered within a SET.
+    if value is None:
+      out.append(b'\x05\x00')
+      return 2, ((0, 5),)
+
+    elif isinstance(value, bool):
+      out.append(value and b'\x01\x01\xff' or b'\x01\x01\x00')
+      return 3, ((0, 1),)
+
+    elif isinstance(value, six.integer_types):
+      content = encode_integer(value)
+      chunk = b'\x02' + encode_length(len(content)) + content
+      out.append(chunk)
+      return len(chunk), ((0, 2),)
+
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+      if isinstance(value, memoryview) and \
+          (value.ndim != 1 or value.itemsize != 1):
+        value = value.cast('B')
+      header = b'\x04' + encode_length(len(value))
+      out.append(header)
+      out.append(value)
+      return len(header) + len(value), ((0, 4),)
+
+    elif isinstance(value, six.text_type):
+      content = value.encode('utf8')
+      chunk = b'\x0c' + encode_length(len(content)) + content
+      out.append(chunk)
+      return len(chunk), ((0, 12),)
+
+    elif isinstance(value, BlobRef):
+      # The blob itself stands in for its content; it is read by the caller.
+      header = b'\x04' + encode_length(len(value))
+      out.append(header)
+      out.append(value)
+      return len(header) + len(value), ((0, 4),)
+
+    elif isinstance(value, self.__stdlib_types):
+      return self.__encode_stdlib(value, out)
+
+    elif isinstance(value, float):
+      content = encode_real(value)
+      chunk = b'\x09' + encode_length(len(content)) + content
+      out.append(chunk)
+      return len(chunk), ((0, 9),)
+
+    elif isinstance(value, complex):
+      return self.__encode_explicit(self.COMPLEX, (value.real, value.imag),
+          out)
+
+    elif isinstance(value, Mapping):
+      return self.__encode_mapping(value, out)
+
+    elif isinstance(value, Set):
+      return self.__encode_set(value, out)
+
+    elif isinstance(value, Sequence):
+      tags = self.TUPLE
+      if isinstance(value, (list, FrozenList)):
+        tags = self.LIST
+      return self.__encode_explicit(tags, value, out)
+
+    elif isinstance(value, (SpooledSequence, Iterator)) and \
+        type(value) not in self.transcoder.options.get('registry', {}):
+      return self.__encode_spooled(value, out)
+
+    # Anything else goes through the ASN.1 transcoder.
+    from pyasn1.codec.der import encoder
+    asn1 = self.transcoder.encode(value)
+    chunk = encoder.encode(asn1)
+    out.append(chunk)
+    return len(chunk), tag_key(asn1.tagSet)
+
+  def __encode_stdlib(self, value, out):
+    # datetime as GeneralizedTime, date by its ordinal, UUID by its bytes and
+    # Decimal by its canonical coefficient and exponent.
+    date, uuid, _ = self.__stdlib_types
+    if isinstance(value, self.__datetime):
+      content = encode_time(value)
+      chunk = b'\x18' + encode_length(len(content)) + content
+      out.append(chunk)
+      return len(chunk), ((0, 24),)
+
+    if isinstance(value, date):
+      tags = self.DATE
+      content = encode_integer(value.toordinal())
+      inner = b'\x02' + encode_length(len(content)) + content
+    elif isinstance(value, uuid):
+      tags = self.UUID
+      inner = b'\x04\x10' + value.bytes
+    else:
+      return self.__encode_explicit(self.DECIMAL, decimal_parts(value), out)
+
+    outer, _, key = tags
+    chunk = outer + encode_length(len(inner)) + inner
+    out.append(chunk)
+    return len(chunk), key
+
+  def __encode_explicit(self, tags, items, out):
+    # Encode items into an explicitly tagged SEQUENCE. The headers are only
+    # known after the items are encoded, so reserve a slot for them.
+    outer, inner, key = tags
+    slot = len(out)
+    out.append(None)
+
+    length = 0
+    for item in items:
+      length += self.__encode(item, out)[0]
+
+    return self.__fill(out, slot, outer, inner, length), key
+
+  def __encode_spooled(self, value, out):
+    # Encode the items into a spooled file, which is then passed on as a blob
+    # after the headers.
+    import tempfile
+    if not isinstance(value, SpooledSequence):
+      value = SpooledSequence(value)
+    outer, inner, key = value.kind is tuple and self.TUPLE or self.LIST
+
+    spool = tempfile.SpooledTemporaryFile(max_size = value.max_memory)
+    length = 0
+    for item in value:
+      chunks = []
+      length += self.__encode(item, chunks)[0]
+      for chunk in chunks:
+        if isinstance(chunk, BlobRef):
+          for data in chunk.chunks():
+            spool.write(data)
+        else:
+          spool.write(chunk)
+    spool.seek(0)
+
+    slot = len(out)
+    out.append(None)
+    out.append(BlobRef(spool, length))
+    return self.__fill(out, slot, outer, inner, length), key
+
+  def __encode_mapping(self, value, out):
+    outer, inner, key = self.MAPPING
+    slot = len(out)
+    out.append(None)
+
+    keys = list(value.keys())
+    if self.__sort is not False:
+      keys = self.__sort(keys)
+
+    length = 0
+    for item in keys:
+      length += self.__encode_explicit(self.TUPLE, (item, value[item]),
+          out)[0]
+
+    return self.__fill(out, slot, outer, inner, length), key
+
+  def __encode_set(self, value, out):
+    outer, inner, key = self.SET
+    slot = len(out)
+    out.append(None)
+
+    items = value
+    if self.__sort is not False:
+      items = self.__sort(items)
+
+    # DER orders SET components by tag; the sort is stable, so items with the
+    # same tag keep the order of the sorting function.
+    encoded = []
+    for item in items:
+      chunks = []
+      size, item_key = self.__encode(item, chunks)
+      encoded.append((item_key, size, chunks))
+    encoded.sort(key = lambda entry: entry[0])
+
+    length = 0
+    for _, size, chunks in encoded:
+      out.extend(chunks)
+      length += size
+
+    return self.__fill(out, slot, outer, inner, length), key
+
+  def __fill(self, out, slot, outer, inner, length):
+    # Fill the reserved header slot; return the total encoded length.
+    inner_header = inner + encode_length(length)
+    length += len(inner_header)
+    outer_header = outer + encode_length(length)
+    out[slot] = outer_header + inner_header
+    return len(outer_header) + length
+
+
+class Decoder(object):
+  """
+  Decode DER-encoded values to Python values.
+
+  The decoder uses the tags of an ASN1Transcoder instance, and dispatches on
+  the identifier octets of each value. Values that it does not handle
+  natively, i.e. registry types, are decoded with pyasn1's DER decoder and
+  passed to the transcoder. Any other tags are rejected by their header.
+  """
+
+  def __init__(self, transcoder):
+    """
+    Initialize the decoder.
+
+    :param ASN1Transcoder transcoder: The transcoder whose tags to use.
+    """
+    from .util import identifier_octets
+
+    self.transcoder = transcoder
+
+    # Container types; lists are returned as built unless frozen.
+    if transcoder.options.get('frozen', False):
+      from .frozen import FrozenDict, FrozenList
+      self.__list, self.__mapping, self.__set = FrozenList, FrozenDict, \
+          frozenset
+    else:
+      self.__list, self.__mapping, self.__set = None, dict, set
+
+    # Resource limits; None means unlimited.
+    options = transcoder.options
+    self.__max_size = options.get('max_size', None)
+    self.__max_depth = options.get('max_depth', None)
+    self.__max_items = options.get('max_items', None)
+    self.__max_length = options.get('max_length', None)
+    self.__max_total = options.get('max_total', None)
+    self.__limited = any(limit is not None for limit in (self.__max_depth,
+        self.__max_items, self.__max_length, self.__max_total))
+
+    # Universal types are keyed by a single identifier octet, explicitly
+    # tagged types by the outer and inner identifier octets.
+    self.__decoders = {
+      b'\x05': self.__decode_null,
+      b'\x01': self.__decode_boolean,
+      b'\x02': self.__decode_integer,
+      b'\x09': self.__decode_real,
+      b'\x0c': self.__decode_text,
+      b'\x04': self.__decode_bytes,
+    }
+    tagset = transcoder.TUPLE.tagSet
+    self.__pair = (identifier_octets(tagset[-1]), identifier_octets(tagset[0]))
+    self.__mapping_tags = identifier_octets(transcoder.MAPPING.tagSet)
+    self.__explicit = {
+      identifier_octets(transcoder.COMPLEX.tagSet): self.__decode_complex,
+      identifier_octets(transcoder.TUPLE.tagSet): self.__decode_tuple,
+      identifier_octets(transcoder.LIST.tagSet): self.__decode_list,
+      identifier_octets(transcoder.MAPPING.tagSet): self.__decode_mapping,
+      identifier_octets(transcoder.SET.tagSet): self.__decode_set,
+    }
+    # Registry tag sets are decoded by pyasn1. They are identified by the
+    # identifier octets of their nested tags, so keep all prefixes, too.
+    self.__registry = set()
+    for key in options.get('registry', {}):
+      if isinstance(key, six.string_types):
+        self.__registry.add(identifier_octets(key))
+    self.__prefixes = set(octets[:idx] for octets in self.__registry
+        for idx in range(1, len(octets)))
+
+    if transcoder.options.get('stdlib_types', False):
+      self.__decoders[b'\x18'] = self.__decode_time
+      self.__explicit.update({
+        identifier_octets(transcoder.UUID.tagSet): self.__decode_uuid,
+        identifier_octets(transcoder.DECIMAL.tagSet): self.__decode_decimal,
+        identifier_octets(transcoder.DATE.tagSet): self.__decode_date,
+      })
+
+  def decode(self, data):
+    """
+    Decode the first value in the given buffer.
+
+    Like pyasn1's decoder, any data following the first value is ignored.
+
+    :param bytes data: A bytes-like object.
+    :return: The decoded Python value.
+    :raises: LimitExceeded if the data exceeds a resource limit, UnknownTag
+        for values that are neither builtin nor registry types.
+    """
+    if not isinstance(data, bytes):
+      data = memoryview(data).cast('B')
+    self.__check_size(data)
+    return self.decode_value(data, 0, len(data), self.__budget())[0]
+
+  def decode_all(self, data):
+    """
+    Decode all consecutive values in the given buffer.
+
+    The size limit applies to the whole buffer, all other limits to each
+    value.
+
+    :param bytes data: A bytes-like object.
+    :return: A generator yielding the decoded Python values in order.
+    :raises: LimitExceeded if the data exceeds a resource limit, UnknownTag
+        for values that are neither builtin nor registry types.
+    """
+    if not isinstance(data, bytes):
+      data = memoryview(data).cast('B')
+    self.__check_size(data)
+    offset, end = 0, len(data)
+    while offset < end:
+      value, offset = self.decode_value(data, offset, end, self.__budget())
+      yield value
+
+  def check_limits(self, data, offset = 0):
+    """
+    Check the value at the given offset against the limits without decoding
+    it.
+
+    The headers are read as decode() reads them, so that other decoders can
+    enforce the same limits before they are handed the data. The size limit
+    applies to the whole buffer.
+
+    :param bytes data: A bytes-like object.
+    :param int offset: [optional] The offset of the value.
+    :return: The offset following the value.
+    :raises: LimitExceeded if the value exceeds a resource limit.
+    """
+    if not isinstance(data, bytes):
+      data = memoryview(data).cast('B')
+    self.__check_size(data)
+    budget = self.__budget()
+    if budget is None:
+      return read_header(data, offset, len(data))[2]
+    return self.__scan(data, offset, len(data), budget)[1]
+
+  def __scan(self, data, offset, end, budget):
+    # Charge the value at offset as decode_value() does, and return None and
+    # the offset following it.
+    ident, start, stop = read_header(data, offset, end)
+    self.__charge(budget, ident, offset, start, stop)
+    if ident in self.__decoders:
+      return None, stop
+
+    if ident[0] & 0x20 and start < stop:
+      inner, inner_start, inner_stop = read_header(data, start, stop)
+      tags = ident + inner
+      if tags in self.__explicit and inner_stop == stop:
+        if tags == self.__mapping_tags:
+          self.__items(data, inner_start, stop, budget, self.__scan_entry)
+        elif inner[0] & 0x20:
+          self.__items(data, inner_start, stop, budget, self.__scan)
+        else:
+          # UUID and DATE
+          self.__charge_total(budget, inner_start, stop - inner_start)
+        return None, stop
+
+    try:
+      content = self.__registered(data, offset, ident, start, stop)
+    except UnknownTag:
+      # Left for the other decoder to reject
+      content = None
+      if ident[0] & 0x20:
+        content = start, stop
+    if ident[0] & 0x20:
+      self.__charge_total(budget, offset, stop - start)
+    if content is not None:
+      self.__check_structure(data, content[0], content[1], budget)
+    return None, stop
+
+  def __scan_entry(self, data, offset, end, budget):
+    # Charge a mapping entry as __decode_entry() does.
+    ident, start, stop = read_header(data, offset, end)
+    if ident == self.__pair[0] and start < stop:
+      inner, start, inner_stop = read_header(data, start, stop)
+      if inner == self.__pair[1] and inner_stop == stop and start < stop:
+        start = self.__scan(data, start, stop, budget)[1]
+        if start < stop:
+          start = self.__scan(data, start, stop, budget)[1]
+          if start == stop:
+            return None, stop
+    return self.__scan(data, offset, end, budget)
+
+  def __check_size(self, data):
+    if self.__max_size is not None and len(data) > self.__max_size:
+      raise LimitExceeded('Input size %d exceeds the limit of %d'
+          % (len(data), self.__max_size), 0)
+
+  def __budget(self):
+    if self.__limited:
+      return _Budget()
+    return None
+
+  def decode_value(self, data, offset, end, budget = None):
+    """
+    Decode the value starting at the given offset.
+
+    :param bytes data: A bytes object or a memoryview of unsigned bytes.
+    :param int offset: The offset of the value's identifier octets.
+    :param int end: The offset at which the enclosing data ends.
+    :param object budget: [optional] The resources used so far by the
+        decode() call, if the transcoder has limits.
+    :return: A tuple of the decoded Python value and the offset following it.
+    """
+    ident, start, stop = read_header(data, offset, end)
+    if budget is not None:
+      self.__charge(budget, ident, offset, start, stop)
+
+    decoder = self.__decoders.get(ident, None)
+    if decoder is not None:
+      return decoder(data, start, stop), stop
+
+    if ident[0] & 0x20 and start < stop:
+      inner, inner_start, inner_stop = read_header(data, start, stop)
+      decoder = self.__explicit.get(ident + inner, None)
+      if decoder is not None and inner_stop == stop:
+        return decoder(data, inner_start, inner_stop, budget), stop
+
+    # Registry tag sets go through pyasn1 and the ASN.1 transcoder, once
+    # their structure is checked against the limits. Their size counts
+    # towards the total as a whole.
+    content = self.__registered(data, offset, ident, start, stop)
+    if budget is not None:
+      if ident[0] & 0x20:
+        self.__charge_total(budget, offset, stop - start)
+      if content is not None:
+        self.__check_structure(data, content[0], content[1], budget)
+    from pyasn1.codec.der import decoder as der_decoder
+    value = der_decoder.decode(bytes(data[offset:stop]))[0]
+    return self.transcoder.decode(value), stop
+
+  def __registered(self, data, offset, ident, start, stop):
+    # Follow the nested tags of the value until they form a registry tag
+    # set; raise UnknownTag if they do not. Return the innermost content
+    # range if it is constructed, else None.
+    chain = ident
+    constructed = ident[0] & 0x20
+    while chain not in self.__registry:
+      if chain not in self.__prefixes or not constructed or start >= stop:
+        raise UnknownTag('Unknown tag set', offset)
+      inner, start, inner_stop = read_header(data, start, stop)
+      if inner_stop != stop:
+        raise UnknownTag('Unknown tag set', offset)
+      constructed = inner[0] & 0x20
+      chain += inner
+    if constructed:
+      return start, stop
+    return None
+
+  def __check_structure(self, data, start, end, budget):
+    # Check the nested values of a registry value against the depth, item
+    # and length limits, based on their headers alone.
+    budget.depth += 1
+    if self.__max_depth is not None and budget.depth > self.__max_depth:
+      raise LimitExceeded('Nesting depth exceeds the limit of %d'
+          % (self.__max_depth,), start)
+    count = 0
+    while start < end:
+      if self.__max_items is not None and count >= self.__max_items:
+        raise LimitExceeded('Number of elements exceeds the limit of %d'
+            % (self.__max_items,), start)
+      ident, content, stop = read_header(data, start, end)
+      if ident[0] & 0x20:
+        self.__check_structure(data, content, stop, budget)
+      elif self.__max_length is not None and stop - content \
+          > self.__max_length and ident in (b'\x0c', b'\x04'):
+        raise LimitExceeded('Length %d exceeds the limit of %d'
+            % (stop - content, self.__max_length), start)
+      count += 1
+      start = stop
+    budget.depth -= 1
+
+  def __charge(self, budget, ident, offset, start, stop):
+    # Check the limits on a value, based on its header alone. Only
+    # primitive values count towards the total, so that nested content is
+    # not counted repeatedly.
+    if ident[0] & 0x20:
+      return
+    length = stop - start
+    if self.__max_length is not None and length > self.__max_length \
+        and ident in (b'\x0c', b'\x04'):
+      raise LimitExceeded('Length %d exceeds the limit of %d'
+          % (length, self.__max_length), offset)
+    self.__charge_total(budget, offset, length)
+
+  def __charge_total(self, budget, offset, length):
+    budget.total += length
+    if self.__max_total is not None and budget.total > self.__max_total:
+      raise LimitExceeded('Total decoded size exceeds the limit of %d'
+          % (self.__max_total,), offset)
+
+  def __items(self, data, start, end, budget, decode = None):
+    # Decode the consecutive values in the range
+    decode = decode or self.decode_value
+    items = []
+    if budget is None:
+      while start < end:
+        item, start = decode(data, start, end)
+        items.append(item)
+      return items
+
+    budget.depth += 1
+    if self.__max_depth is not None and budget.depth > self.__max_depth:
+      raise LimitExceeded('Nesting depth exceeds the limit of %d'
+          % (self.__max_depth,), start)
+    max_items = self.__max_items
+    while start < end:
+      if max_items is not None and len(items) >= max_items:
+        raise LimitExceeded('Number of elements exceeds the limit of %d'
+            % (max_items,), start)
+      item, start = decode(data, start, end, budget)
+      items.append(item)
+    budget.depth -= 1
+    return items
+
+  def __decode_null(self, data, start, end):
+    if start != end:
+      from pyasn1 import error
+      raise error.PyAsn1Error('Unexpected %d-octet substrate for Null'
+          % (end - start))
+    return None
+
+  def __decode_boolean(self, data, start, end):
+    from pyasn1 import error
+    if end - start != 1:
+      raise error.PyAsn1Error('Not single-octet Boolean payload')
+    if data[start] == 0xff:
+      return True
+    if data[start] == 0x00:
+      return False
+    raise error.PyAsn1Error('Unexpected Boolean payload: %s' % data[start])
+
+  def __decode_integer(self, data, start, end):
+    return int.from_bytes(data[start:end], 'big', signed = True)
+
+  def __decode_real(self, data, start, end):
+    return decode_real(data[start:end])
+
+  def __decode_text(self, data, start, end):
+    return bytes(data[start:end]).decode('utf8')
+
+  def __decode_bytes(self, data, start, end):
+    return bytes(data[start:end])
+
+  def __decode_complex(self, data, start, end, budget):
+    items = self.__items(data, start, end, budget)
+    return complex(items[0], items[1])
+
+  def __decode_tuple(self, data, start, end, budget):
+    return tuple(self.__items(data, start, end, budget))
+
+  def __decode_list(self, data, start, end, budget):
+    items = self.__items(data, start, end, budget)
+    if self.__list is None:
+      return items
+    return self.__list(items)
+
+  def __decode_mapping(self, data, start, end, budget):
+    return self.__mapping(self.__items(data, start, end, budget,
+        self.__decode_entry))
+
+  def __decode_entry(self, data, offset, end, budget = None):
+    # Decode a mapping entry; the (key, value) pair is decoded directly, so
+    # that it does not count as a nesting level of its own.
+    ident, start, stop = read_header(data, offset, end)
+    if ident == self.__pair[0] and start < stop:
+      inner, start, inner_stop = read_header(data, start, stop)
+      if inner == self.__pair[1] and inner_stop == stop and start < stop:
+        key, start = self.decode_value(data, start, stop, budget)
+        if start < stop:
+          value, start = self.decode_value(data, start, stop, budget)
+          if start == stop:
+            return (key, value), stop
+
+    # Anything else is decoded as is; dict() rejects it.
+    return self.decode_value(data, offset, end, budget)
+
+  def __decode_set(self, data, start, end, budget):
+    return self.__set(self.__items(data, start, end, budget))
+
+  def __decode_time(self, data, start, end):
+    return decode_time(data[start:end])
+
+  def __decode_uuid(self, data, start, end, budget):
+    if end - start != 16:
+      from pyasn1 import error
+      raise error.PyAsn1Error('UUID must be 16 octets, not %d'
+          % (end - start,))
+    if budget is not None:
+      self.__charge_total(budget, start, end - start)
+    import uuid
+    return uuid.UUID(bytes = bytes(data[start:end]))
+
+  def __decode_decimal(self, data, start, end, budget):
+    items = self.__items(data, start, end, budget)
+    if len(items) != 2 or not all(type(item) is int for item in items):
+      from pyasn1 import error
+      raise error.PyAsn1Error('Decimal must hold two INTEGER values')
+    return decode_decimal(*items)
+
+  def __decode_date(self, data, start, end, budget):
+    if budget is not None:
+      self.__charge_total(budget, start, end - start)
+    import datetime
+    try:
+      return datetime.date.fromordinal(self.__decode_integer(data, start,
+          end))
+    except (ValueError, OverflowError) as ex:
+      from pyasn1 import error
+      raise error.PyAsn1Error('Bad date ordinal: %s' % (ex,))
+
+
+def read_header(data, offset, end):
+  """
+  Parse the identifier and length octets of the value at the given offset.
+
+  Only the definite length form is supported, as DER requires.
+
+  :param bytes data: A bytes object or a memoryview of unsigned bytes.
+  :param int offset: The offset of the value's identifier octets.
+  :param int end: The offset at which the enclosing data ends.
+  :return: A tuple of the identifier octets as bytes, and the start and end
+      offsets of the content octets.
+  :raises: SubstrateUnderrunError if the value exceeds the data, PyAsn1Error
+      for indefinite lengths.
+  """
+  from pyasn1 import error
+
+  if offset >= end:
+    raise error.SubstrateUnderrunError('No identifier octets at %d' % offset)
+  pos = offset + 1
+  if data[offset] & 0x1f == 0x1f:
+    # High tag number form
+    while True:
+      if pos >= end:
+        raise error.SubstrateUnderrunError('Short identifier octets at %d'
+            % offset)
+      pos += 1
+      if not data[pos - 1] & 0x80:
+        break
+    ident = bytes(data[offset:pos])
+  else:
+    ident = _OCTETS[data[offset]]
+
+  if pos >= end:
+    raise error.SubstrateUnderrunError('No length octets at %d' % pos)
+  length = data[pos]
+  pos += 1
+  if length & 0x80:
+    size = length & 0x7f
+    if not size:
+      raise error.PyAsn1Error('Indefinite length encoding not supported by '
+          'DER at %d' % (pos - 1))
+    if pos + size > end:
+      raise error.SubstrateUnderrunError('Short length octets at %d'
+          % (pos - 1))
+    length = int.from_bytes(data[pos:pos + size], 'big')
+    pos += size
+
+  if pos + length > end:
+    raise error.SubstrateUnderrunError('%d-octet content at %d exceeds the '
+        'available data' % (length, pos))
+  return ident, pos, pos + length
+
+
+_OCTETS = tuple(bytes((octet,)) for octet in range(256))
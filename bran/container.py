@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+Block-compressed container format for bran records.
+
+Records are DER-encoded and grouped into blocks, each of which is compressed
+on its own. A footer holds an index of the blocks, so archives support random
+access, and blocks can be decompressed in parallel.
+
+The layout of a container is:
+
+- The 8 Byte magic string MAGIC, followed by one Byte identifying the
+  compression: 0 for none, 1 for zlib and 2 for lzma.
+- Any number of blocks. Each block starts with a header of three big endian
+  unsigned integers: the compressed size (8 Bytes), the uncompressed size
+  (8 Bytes) and the number of records in the block (4 Bytes). The compressed
+  records follow.
+- An end marker, i.e. a block header with all fields set to zero.
+- The footer, which is the DER-encoded list of blocks ``[(offset, compressed
+  size, size, records), ...]``, where offset is the file offset of the block
+  header.
+- The size of the footer as an 8 Byte big endian unsigned integer, followed
+  by MAGIC again.
+
+Because blocks are preceded by their size, containers can also be read
+sequentially from unseekable streams.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('BlockWriter', 'BlockReader')
+
+import struct
+
+MAGIC = b'BRANBLK\x01'
+
+_BLOCK_HEADER = struct.Struct('>QQI')
+_TRAILER = struct.Struct('>Q')
+
+_COMPRESSIONS = ('none', 'zlib', 'lzma')
+
+
+def _compressors(name, level):
+  # Return compress and decompress functions for the named compression.
+  if name == 'zlib':
+    import zlib
+    if level is None:
+      level = zlib.Z_DEFAULT_COMPRESSION
+    return lambda data: zlib.compress(data, level), zlib.decompress
+  if name == 'lzma':
+    import lzma
+    return lambda data: lzma.compress(data, preset = level), lzma.decompress
+  if name == 'none':
+    return bytes, bytes
+  raise ValueError('Unknown compression "%s"!' % (name,))
+
+
+class BlockWriter(object):
+  """
+  Write bran records to a block-compressed container.
+
+  Records are buffered until the block size is reached; then the block is
+  compressed and written out. Records are never split across blocks, so
+  blocks may exceed the block size by up to one record.
+
+  Use the writer as a context manager, or call close() when done; the footer
+  is only written then.
+  """
+
+  def __init__(self, fileobj, block_size = 1 << 20, compression = 'zlib',
+      level = None, transcoder = None):
+    """
+    Initialize the writer, and write the container's magic string.
+
+    :param mixed fileobj: A binary file object opened for writing, or a path.
+        If a path is given, the file is closed when the writer is closed.
+    :param int block_size: [optional] The uncompressed size of blocks in
+        Bytes; defaults to 1 MiB.
+    :param str compression: [optional] One of 'zlib', 'lzma' or 'none';
+        defaults to 'zlib'.
+    :param int level: [optional] The compression level or preset.
+    :param DERTranscoder transcoder: [optional] The transcoder to use;
+        defaults to the shared bran.default_transcoder().
+    :raises: ValueError for unknown compressions, before a path is opened.
+    """
+    self.__compress = _compressors(compression, level)[0]
+
+    import six
+    self.__owned = isinstance(fileobj, six.string_types)
+    if self.__owned:
+      fileobj = open(fileobj, 'wb')
+    self.__file = fileobj
+
+    if transcoder is None:
+      from . import default_transcoder
+      transcoder = default_transcoder()
+    self.__transcoder = transcoder
+
+    self.block_size = block_size
+
+    self.__buffer = bytearray()
+    self.__count = 0
+    self.__blocks = []
+    self.__offset = 0
+    self.__write(MAGIC + bytes((_COMPRESSIONS.index(compression),)))
+
+  def __write(self, data):
+    self.__file.write(data)
+    self.__offset += len(data)
+
+  def write(self, value):
+    """
+    Encode and append a value.
+
+    :param mixed value: The value to write.
+    """
+    self.__transcoder.encode_into(value, self.__buffer.extend)
+    self.__count += 1
+    if len(self.__buffer) >= self.block_size:
+      self.flush()
+
+  def write_encoded(self, data):
+    """
+    Append a record that is already DER-encoded.
+
+    :param bytes data: The encoded record; it must be a single DER value.
+    """
+    self.__buffer.extend(data)
+    self.__count += 1
+    if len(self.__buffer) >= self.block_size:
+      self.flush()
+
+  def flush(self):
+    """Compress and write the current block, if it contains any records."""
+    if not self.__count:
+      return
+    compressed = self.__compress(bytes(self.__buffer))
+    entry = (self.__offset, len(compressed), len(self.__buffer),
+        self.__count)
+    self.__write(_BLOCK_HEADER.pack(*entry[1:]))
+    self.__write(compressed)
+    self.__blocks.append(entry)
+
+    self.__buffer = bytearray()
+    self.__count = 0
+
+  def close(self):
+    """Write the remaining records and the footer."""
+    if self.__file is None:
+      return
+    self.flush()
+    self.__write(_BLOCK_HEADER.pack(0, 0, 0))
+
+    from . import DERTranscoder
+    footer = DERTranscoder().encode(self.__blocks)
+    self.__write(footer)
+    self.__write(_TRAILER.pack(len(footer)) + MAGIC)
+
+    if self.__owned:
+      self.__file.close()
+    self.__file = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+
+class BlockReader(object):
+  """
+  Read bran records from a block-compressed container.
+
+  Iterating over the reader yields all records in order; blocks are read
+  sequentially, and decompressed ahead of time in a thread pool. Iterating
+  works on unseekable streams, too. Random access via records, read_block() and
+  indexing requires a seekable file.
+
+  Readers are not safe to use from several threads at once.
+  """
+
+  def __init__(self, fileobj, transcoder = None, workers = None):
+    """
+    Initialize the reader, and check the container's magic string.
+
+    :param mixed fileobj: A binary file object opened for reading, or a path.
+        If a path is given, the file is closed when the reader is closed.
+    :param DERTranscoder transcoder: [optional] The transcoder to use;
+        defaults to the shared bran.default_transcoder().
+    :param int workers: [optional] The number of decompression threads;
+        defaults to the number of CPUs.
+    """
+    import six
+    self.__owned = isinstance(fileobj, six.string_types)
+    if self.__owned:
+      fileobj = open(fileobj, 'rb')
+    self.__file = fileobj
+
+    if transcoder is None:
+      from . import default_transcoder
+      transcoder = default_transcoder()
+    self.__transcoder = transcoder
+
+    if workers is None:
+      import os
+      workers = os.cpu_count() or 1
+    self.workers = workers
+
+    self.__position = 0
+    header = self.__read(len(MAGIC) + 1)
+    if header[:-1] != MAGIC or header[-1] >= len(_COMPRESSIONS):
+      raise ValueError('Not a bran block container!')
+    self.__decompress = _compressors(_COMPRESSIONS[header[-1]], None)[1]
+    self.__start = self.__position
+    self.__index = None
+
+  def __read(self, size):
+    data = self.__file.read(size)
+    if len(data) != size:
+      raise ValueError('Truncated bran block container!')
+    self.__position += size
+    return data
+
+  def __seek(self, offset, whence = 0):
+    self.__position = self.__file.seek(offset, whence)
+
+  def __load_index(self):
+    # Read the footer from the end of the file.
+    if self.__index is not None:
+      return self.__index
+
+    import io
+    self.__seek(-(_TRAILER.size + len(MAGIC)), io.SEEK_END)
+    size, = _TRAILER.unpack(self.__read(_TRAILER.size))
+    if self.__read(len(MAGIC)) != MAGIC:
+      raise ValueError('Bad bran block container footer!')
+    self.__seek(-(_TRAILER.size + len(MAGIC) + size), io.SEEK_END)
+
+    from . import DERTranscoder
+    blocks = DERTranscoder().decode(self.__read(size))
+
+    # Cumulative record counts for indexing
+    import itertools
+    self.__firsts = [0] + list(itertools.accumulate(
+        block[3] for block in blocks))
+    self.__index = blocks
+    return blocks
+
+  @property
+  def blocks(self):
+    """
+    The block index.
+
+    A list of (offset, compressed size, uncompressed size, record count)
+    tuples.
+    """
+    return self.__load_index()
+
+  @property
+  def records(self):
+    """The total number of records in the container."""
+    self.__load_index()
+    return self.__firsts[-1]
+
+  def read_block(self, index):
+    """
+    Read and decode the records of a single block.
+
+    :param int index: The index of the block.
+    :return: A list of values.
+    """
+    offset, compressed_size = self.__load_index()[index][:2]
+    self.__seek(offset + _BLOCK_HEADER.size)
+    return self.__decode(self.__decompress(self.__read(compressed_size)))
+
+  def __getitem__(self, index):
+    """Read the record with the given index."""
+    import bisect
+    length = self.records
+    if index < 0:
+      index += length
+    if not 0 <= index < length:
+      raise IndexError('Record index out of range')
+    block = bisect.bisect_right(self.__firsts, index) - 1
+    return self.read_block(block)[index - self.__firsts[block]]
+
+  def __decode(self, data):
+    return list(self.__transcoder.decode_all(data))
+
+  def __raw_blocks(self):
+    # Yield the compressed blocks in file order, without using the index.
+    if self.__position != self.__start:
+      self.__seek(self.__start)
+    while True:
+      compressed_size, size, count = _BLOCK_HEADER.unpack(
+          self.__read(_BLOCK_HEADER.size))
+      if not compressed_size and not count:
+        return
+      yield self.__read(compressed_size)
+
+  def __iter__(self):
+    import collections
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(self.workers) as pool:
+      pending = collections.deque()
+      for raw in self.__raw_blocks():
+        pending.append(pool.submit(self.__decompress, raw))
+        if len(pending) > self.workers:
+          for value in self.__decode(pending.popleft().result()):
+            yield value
+      while pending:
+        for value in self.__decode(pending.popleft().result()):
+          yield value
+
+  def close(self):
+    """Close the file, if the reader opened it."""
+    if self.__owned:
+      self.__file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Structural diff of two encoded values without decoding them.
+
+bran encodings are canonical, so equal values have equal bytes. diff() walks
+the TLV trees of both encodings side by side, and skips every subtree whose
+bytes are equal without looking into it. Mapping entries are matched by the
+encoding of their keys, list and tuple items by their index. Only the keys
+on the paths to changed values, and the changed values themselves, are
+decoded, so the cost is dominated by the size of the change rather than by
+the size of the documents.
+
+Differences in any other type, including sets, are reported for the value as
+a whole.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('Change', 'MISSING', 'diff')
+
+import collections
+
+from .codec import read_header
+
+Change = collections.namedtuple('Change', ('path', 'old', 'new'))
+Change.__doc__ = """
+A changed value.
+
+:param tuple path: The mapping keys and sequence indices leading to the value;
+    the empty tuple stands for the whole value.
+:param mixed old: The old value, or MISSING if it was added.
+:param mixed new: The new value, or MISSING if it was removed.
+"""
+
+
+class _Missing(object):
+  # The type of MISSING.
+
+  def __repr__(self):
+    return 'MISSING'
+
+
+#: Stands for the old value of added entries, and the new value of removed
+#: ones.
+MISSING = _Missing()
+
+
+def _children(data, start, end):
+  # Return the ranges of the consecutive values in the range.
+  ranges = []
+  while start < end:
+    stop = read_header(data, start, end)[2]
+    ranges.append((start, stop))
+    start = stop
+  return ranges
+
+
+class _Walker(object):
+  # Compares two encodings with the tags of a transcoder, and collects the
+  # changes.
+
+  def __init__(self, transcoder, old, new):
+    from .util import identifier_octets
+
+    def tags(template):
+      tagset = template.tagSet
+      return identifier_octets(tagset[-1]) + identifier_octets(tagset[0])
+
+    inner = transcoder.inner
+    self.decode = transcoder.decode
+    self.pair = tags(inner.TUPLE)
+    self.mapping = tags(inner.MAPPING)
+    self.sequences = (self.pair, tags(inner.LIST))
+    self.old = old
+    self.new = new
+    self.changes = []
+
+  def content(self, data, offset, end):
+    # Return the outer and inner identifier octets of an explicitly tagged
+    # value and its content range, or None for anything else.
+    ident, start, stop = read_header(data, offset, end)
+    if not ident[0] & 0x20 or start >= stop:
+      return None
+    inner, inner_start, inner_stop = read_header(data, start, stop)
+    if inner_stop != stop:
+      return None
+    return ident + inner, inner_start, stop
+
+  def entries(self, data, start, end):
+    # Return the mapping entries in the range as a list of encoded keys and
+    # value ranges.
+    entries = []
+    for offset, stop in _children(data, start, end):
+      pair = self.content(data, offset, stop)
+      if pair is None or pair[0] != self.pair:
+        from pyasn1 import error
+        raise error.PyAsn1Error('Invalid mapping entry at %d' % (offset,))
+      key_stop = read_header(data, pair[1], stop)[2]
+      value_stop = read_header(data, key_stop, stop)[2]
+      if value_stop != stop:
+        from pyasn1 import error
+        raise error.PyAsn1Error('Invalid mapping entry at %d' % (offset,))
+      entries.append((bytes(data[pair[1]:key_stop]), (key_stop, stop)))
+    return entries
+
+  def report(self, path, old, new):
+    # Decode the values at the given ranges; None stands for a missing one.
+    if old is None:
+      old = MISSING
+    else:
+      old = self.decode(self.old[old[0]:old[1]])
+    if new is None:
+      new = MISSING
+    else:
+      new = self.decode(self.new[new[0]:new[1]])
+    self.changes.append(Change(path, old, new))
+
+  def compare(self, path, old, new):
+    # Compare the values at the given ranges of the old and new encodings.
+    if self.old[old[0]:old[1]] == self.new[new[0]:new[1]]:
+      return
+
+    old_content = self.content(self.old, old[0], old[1])
+    new_content = self.content(self.new, new[0], new[1])
+    if old_content is None or new_content is None \
+        or old_content[0] != new_content[0]:
+      self.report(path, old, new)
+    elif old_content[0] == self.mapping:
+      self.compare_mappings(path, old_content[1:], new_content[1:])
+    elif old_content[0] in self.sequences:
+      self.compare_sequences(path, old_content[1:], new_content[1:])
+    else:
+      self.report(path, old, new)
+
+  def compare_mappings(self, path, old, new):
+    old_entries = self.entries(self.old, old[0], old[1])
+    new_entries = self.entries(self.new, new[0], new[1])
+    old_values = dict(old_entries)
+    new_keys = set(key for key, _ in new_entries)
+
+    # Keys are decoded only for the paths of changed entries.
+    for key, value in new_entries:
+      previous = old_values.get(key, None)
+      if previous is None:
+        self.report(path + (self.decode(key),), None, value)
+      elif self.old[previous[0]:previous[1]] != self.new[value[0]:value[1]]:
+        self.compare(path + (self.decode(key),), previous, value)
+    for key, value in old_entries:
+      if key not in new_keys:
+        self.report(path + (self.decode(key),), value, None)
+
+  def compare_sequences(self, path, old, new):
+    old_items = _children(self.old, old[0], old[1])
+    new_items = _children(self.new, new[0], new[1])
+    for index, (old_item, new_item) in enumerate(zip(old_items, new_items)):
+      self.compare(path + (index,), old_item, new_item)
+    for index in range(len(new_items), len(old_items)):
+      self.report(path + (index,), old_items[index], None)
+    for index in range(len(old_items), len(new_items)):
+      self.report(path + (index,), None, new_items[index])
+
+
+def diff(old, new, transcoder = None):
+  """
+  Return the differences between two encoded values.
+
+  Both inputs are expected to be bran encodings, e.g. from dumps(); use
+  validate() first for untrusted input. As with decoding, any data following
+  the first value is ignored.
+
+  Mapping entries that exist on one side only are reported with MISSING on
+  the other. List and tuple items are compared by index, so inserting an item
+  reports every following item as changed. A value that changes its type,
+  e.g. from list to tuple, is reported as a whole.
+
+  :param bytes old: The old encoding.
+  :param bytes new: The new encoding.
+  :param DERTranscoder transcoder: [optional] The transcoder to use;
+      defaults to the shared bran.default_transcoder().
+  :return: A list of Change tuples; empty if the values are equal.
+  """
+  if transcoder is None:
+    from . import default_transcoder
+    transcoder = default_transcoder()
+  old = memoryview(old).cast('B')
+  new = memoryview(new).cast('B')
+  walker = _Walker(transcoder, old, new)
+  walker.compare((), (0, read_header(old, 0, len(old))[2]),
+      (0, read_header(new, 0, len(new))[2]))
+  return walker.changes
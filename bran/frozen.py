@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Immutable, hashable container types for decoded values.
+
+Transcoders created with the ``frozen = True`` option decode mappings as
+FrozenDict, lists as FrozenList and sets as frozenset, so that decoded values
+can be used as dictionary keys, e.g. with functools.lru_cache, and shared
+between threads without copying.
+
+Both types encode exactly like their mutable counterparts, so decoding and
+re-encoding a value yields the same bytes.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('FrozenDict', 'FrozenList')
+
+from .util import Mapping
+
+
+class FrozenDict(Mapping):
+  """
+  A read-only, hashable mapping.
+
+  FrozenDict compares equal to any mapping with the same items, including
+  dict. Its hash is computed from its items on first use, so all keys and
+  values must be hashable.
+  """
+
+  __slots__ = ('__items', '__hash')
+
+  def __init__(self, *args, **kwargs):
+    self.__items = dict(*args, **kwargs)
+    self.__hash = None
+
+  def __getitem__(self, key):
+    return self.__items[key]
+
+  def __iter__(self):
+    return iter(self.__items)
+
+  def __len__(self):
+    return len(self.__items)
+
+  def __contains__(self, key):
+    return key in self.__items
+
+  def __hash__(self):
+    if self.__hash is None:
+      self.__hash = hash(frozenset(self.__items.items()))
+    return self.__hash
+
+  def __repr__(self):
+    return '%s(%r)' % (type(self).__name__, self.__items)
+
+
+class FrozenList(tuple):
+  """
+  A hashable list, i.e. a tuple that is encoded with the LIST tag.
+
+  FrozenList compares equal to lists and other FrozenLists with the same
+  items, but not to plain tuples, because those have a different encoding.
+  """
+
+  __slots__ = ()
+
+  def __eq__(self, other):
+    if isinstance(other, (FrozenList, list)):
+      return tuple.__eq__(self, tuple(other))
+    if isinstance(other, tuple):
+      return False
+    return NotImplemented
+
+  def __ne__(self, other):
+    result = self.__eq__(other)
+    if result is NotImplemented:
+      return result
+    return not result
+
+  __hash__ = tuple.__hash__
+
+  def __repr__(self):
+    return '%s(%r)' % (type(self).__name__, list(self))
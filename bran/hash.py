@@ -9,11 +9,96 @@ from hashlib.
 __author__ = 'Jens Finkhaeuser'
 __copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
 __license__ = 'MIT +no-false-attribs'
-__all__ = ()
+__all__ = ('BranHasher', 'hasher', 'prefix_digests', 'MultiHasher',
+    'digests')
 
 import hashlib
 
 
+class BranHasher(object):
+  """
+  A hashlib wrapper that hashes objects.
+
+  The class implements `update`, `digest` and `hexdigest` like the hashlib
+  hash functions. The difference is that instead of only accepting buffer API
+  objects in `update`, any object that can be serialized using DERTranscoder
+  is supported.
+
+  Encoded values are fed to the hash function buffer by buffer, so large byte
+  payloads are not copied.
+  """
+
+  def __init__(self, obj = None, hashfunc = None, *args, **kwargs):
+    """
+    Initialize the hasher.
+
+    Additional positional and keyword arguments are passed to the hash
+    function constructor.
+
+    :param mixed obj: An optional object to update the hash function with.
+    :param callable hashfunc: One of hashlib's constructor functions; defaults
+      to hashlib.sha512
+    :param DERTranscoder transcoder: [optional, keyword only] The transcoder
+      to use; defaults to the shared bran.default_transcoder().
+    """
+    transcoder = kwargs.pop('transcoder', None)
+    if transcoder is None:
+      from . import default_transcoder
+      transcoder = default_transcoder()
+    self.__transcoder = transcoder
+
+    # Initialize chosen hash function
+    self.__hashfunc = (hashfunc or hashlib.sha512)(*args, **kwargs)
+
+    # Start hashing if we've been given an object in the ctor
+    if obj is not None:
+      self.update(obj)
+
+  @property
+  def name(self):
+    """The name of the underlying hash function."""
+    return self.__hashfunc.name
+
+  @property
+  def digest_size(self):
+    """The size of the resulting digest in Bytes."""
+    return self.__hashfunc.digest_size
+
+  @property
+  def block_size(self):
+    """The internal block size of the hash function in Bytes."""
+    return self.__hashfunc.block_size
+
+  def update(self, *args):
+    """Update the hash function with the encoding of each of the arguments."""
+    write = self.__hashfunc.update
+    for obj in args:
+      self.__transcoder.encode_into(obj, write)
+
+  def digest(self, *args, **kwargs):
+    """Return the digest of the objects passed to update() so far."""
+    return self.__hashfunc.digest(*args, **kwargs)
+
+  def hexdigest(self, *args, **kwargs):
+    """Return the digest as a string of hexadecimal digits."""
+    return self.__hashfunc.hexdigest(*args, **kwargs)
+
+  def copy(self):
+    """
+    Return a copy of the hasher.
+
+    The copy continues from the current hash state, so objects passed to
+    update() so far are not encoded or hashed again. The transcoder keeps no
+    per-call state, and is shared.
+
+    :return: A BranHasher instance.
+    """
+    other = object.__new__(type(self))
+    other.__transcoder = self.__transcoder
+    other.__hashfunc = self.__hashfunc.copy()
+    return other
+
+
 def hasher(obj = None, hashfunc = hashlib.sha512, *args, **kwargs):
   """
   Create a hashlib wrapper that hashes objects.
@@ -26,30 +111,147 @@ def hasher(obj = None, hashfunc = hashlib.sha512, *args, **kwargs):
   :param mixed obj: An optional object to update the hash function with.
   :param callable hashfunc: One of hashlib's constructor functions; defaults to
     hashlib.sha512
-  :return: A hashlib-like hasher.
+  :return: A BranHasher instance.
+  """
+  return BranHasher(obj, hashfunc, *args, **kwargs)
+
+
+def prefix_digests(prefix, items, hashfunc = None, *args, **kwargs):
+  """
+  Return the digests of a common prefix followed by each of several items.
+
+  The prefix is encoded and hashed once; each item is hashed from a copy of
+  that state. Each digest is the same as that of a hasher updated with the
+  prefix and then the item.
+
+  Additional positional and keyword arguments are passed to BranHasher.
+
+  :param mixed prefix: The object that all digests start with.
+  :param iterable items: The objects to hash after the prefix.
+  :param callable hashfunc: [optional] One of hashlib's constructor
+    functions; defaults to hashlib.sha512
+  :return: A list of digests, one per item.
   """
-  class BranHasher(object):
-    def __init__(self, obj, *args, **kwargs):
-      # Initialize chosen hash function
-      self.__hashfunc = hashfunc(*args, **kwargs)
+  base = BranHasher(prefix, hashfunc, *args, **kwargs)
+  result = []
+  for item in items:
+    copy = base.copy()
+    copy.update(item)
+    result.append(copy.digest())
+  return result
+
+
+class MultiHasher(object):
+  """
+  Compute several digests of the same objects in one encoding pass.
+
+  Each encoded buffer is passed to all hash functions, so the cost of
+  encoding is paid once. Optionally, each hash function runs in its own
+  thread; hashlib releases the GIL while hashing larger buffers, so this
+  pays off for large inputs.
+  """
+
+  def __init__(self, hashfuncs, obj = None, threads = False,
+      transcoder = None):
+    """
+    Initialize the hasher.
 
-      # Initialize transcoder
-      from . import DERTranscoder
-      self.__transcoder = DERTranscoder()
+    :param mixed hashfuncs: Either a sequence of hashlib constructor
+        functions or hashlib algorithm names, or a mapping of names to
+        constructor functions.
+    :param mixed obj: [optional] An object to update the hash functions with.
+    :param bool threads: [optional] If True, run each hash function in its
+        own thread during update(). Defaults to False.
+    :param DERTranscoder transcoder: [optional] The transcoder to use;
+        defaults to the shared bran.default_transcoder().
+    """
+    if transcoder is None:
+      from . import default_transcoder
+      transcoder = default_transcoder()
+    self.__transcoder = transcoder
+    self.threads = threads
 
-      # Start hashing if we've been given an object in the ctor
-      if obj is not None:
-        self.update(obj)
+    import six
+    from .util import Mapping
+    if isinstance(hashfuncs, Mapping):
+      self.__hashobjs = [(name, func()) for name, func in hashfuncs.items()]
+    else:
+      self.__hashobjs = []
+      for func in hashfuncs:
+        if isinstance(func, six.string_types):
+          hashobj = hashlib.new(func)
+          self.__hashobjs.append((func, hashobj))
+        else:
+          hashobj = func()
+          self.__hashobjs.append((hashobj.name, hashobj))
 
-    def update(self, *args, **kwargs):
-      # Replace args by encoded versions of its objects.
-      encoded = [self.__transcoder.encode(x) for x in args]
-      return self.__hashfunc.update(*encoded, **kwargs)
+    if obj is not None:
+      self.update(obj)
 
-    def digest(self, *args, **kwargs):
-      return self.__hashfunc.digest(*args, **kwargs)
+  @property
+  def names(self):
+    """The names of the digests, in order."""
+    return [name for name, _ in self.__hashobjs]
 
-    def hexdigest(self, *args, **kwargs):
-      return self.__hashfunc.hexdigest(*args, **kwargs)
+  def update(self, *args):
+    """Update all hash functions with the encoding of each argument."""
+    if not self.threads or len(self.__hashobjs) < 2:
+      updates = [hashobj.update for _, hashobj in self.__hashobjs]
 
-  return BranHasher(obj, *args, **kwargs)
+      def write(chunk):
+        for update in updates:
+          update(chunk)
+      for obj in args:
+        self.__transcoder.encode_into(obj, write)
+      return
+
+    # One thread per hash function, fed through a bounded queue each.
+    import threading
+    import queue
+    queues = [queue.Queue(64) for _ in self.__hashobjs]
+
+    def work(hashobj, chunks):
+      while True:
+        chunk = chunks.get()
+        if chunk is None:
+          return
+        hashobj.update(chunk)
+
+    workers = [threading.Thread(target = work, args = (hashobj, chunks))
+               for (_, hashobj), chunks in zip(self.__hashobjs, queues)]
+    for worker in workers:
+      worker.start()
+
+    def write(chunk):
+      for chunks in queues:
+        chunks.put(chunk)
+    try:
+      for obj in args:
+        self.__transcoder.encode_into(obj, write)
+    finally:
+      for chunks in queues:
+        chunks.put(None)
+      for worker in workers:
+        worker.join()
+
+  def digests(self):
+    """Return a dict of the digests of the objects passed so far by name."""
+    return dict((name, hashobj.digest()) for name, hashobj in self.__hashobjs)
+
+  def hexdigests(self):
+    """Return a dict of the digests as strings of hexadecimal digits."""
+    return dict((name, hashobj.hexdigest())
+                for name, hashobj in self.__hashobjs)
+
+
+def digests(obj, hashfuncs, threads = False, transcoder = None):
+  """
+  Return several digests of an object, encoding it once.
+
+  :param mixed obj: The object to hash.
+  :param mixed hashfuncs: As for MultiHasher.
+  :param bool threads: [optional] As for MultiHasher.
+  :param DERTranscoder transcoder: [optional] As for MultiHasher.
+  :return: A dict mapping the names of the hash functions to digests.
+  """
+  return MultiHasher(hashfuncs, obj, threads, transcoder).digests()
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Transcode JSON text to DER without building Python values.
+
+The JSON text is tokenized, and each token is encoded as it is read. Only the
+encoded output is buffered: arrays and objects are collected as lists of
+encoded chunks until their length is known, and object members are kept
+encoded until they can be sorted by key. The output is the same as encoding
+the result of json.loads() with a DERTranscoder, and so are digests over it.
+
+JSON values map to bran values like json.loads() maps them to Python values:
+objects become mappings, arrays lists, and numbers int or float. Duplicate
+object keys keep the last value.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('encode_json', 'encode_json_into', 'digest_json')
+
+import re
+
+from .codec import encode_length, encode_integer, encode_real
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER = re.compile(r'(-?(?:0|[1-9]\d*))(\.\d+)?([eE][-+]?\d+)?')
+
+_CONSTANTS = (
+  ('null', b'\x05\x00'),
+  ('true', b'\x01\x01\xff'),
+  ('false', b'\x01\x01\x00'),
+  ('NaN', None),
+  ('Infinity', b'\x09\x01\x40'),
+  ('-Infinity', b'\x09\x01\x41'),
+)
+
+
+class _Encoder(object):
+  # Recursive descent over the JSON text. Each method returns the list of
+  # encoded chunks of a value and their total size.
+
+  def __init__(self, transcoder):
+    from json.decoder import scanstring
+    from .util import identifier_octets
+
+    self.scanstring = scanstring
+    self.sort = transcoder.inner.options.get('sort', sorted)
+
+    def tags(template):
+      tagset = template.tagSet
+      return identifier_octets(tagset[-1]), identifier_octets(tagset[0])
+    self.list_tags = tags(transcoder.inner.LIST)
+    self.mapping_tags = tags(transcoder.inner.MAPPING)
+    self.pair_tags = tags(transcoder.inner.TUPLE)
+
+  def encode(self, text):
+    idx = _WHITESPACE.match(text, 0).end()
+    chunks, size, idx = self.value(text, idx)
+    idx = _WHITESPACE.match(text, idx).end()
+    if idx != len(text):
+      self.error('Extra data', text, idx)
+    return chunks, size
+
+  def error(self, message, text, idx):
+    import json
+    raise json.JSONDecodeError(message, text, idx)
+
+  def value(self, text, idx):
+    try:
+      char = text[idx]
+    except IndexError:
+      self.error('Expecting value', text, idx)
+
+    if char == '"':
+      value, idx = self.scanstring(text, idx + 1)
+      return self.string(value) + (idx,)
+    if char == '{':
+      return self.object(text, idx + 1)
+    if char == '[':
+      return self.array(text, idx + 1)
+
+    match = _NUMBER.match(text, idx)
+    if match is not None:
+      integer, fraction, exponent = match.groups()
+      if fraction or exponent:
+        content = encode_real(float(match.group()))
+        header = b'\x09'
+      else:
+        content = encode_integer(int(integer))
+        header = b'\x02'
+      chunk = header + encode_length(len(content)) + content
+      return [chunk], len(chunk), match.end()
+
+    for name, encoded in _CONSTANTS:
+      if text.startswith(name, idx):
+        if encoded is None:
+          # Fails like encoding float('nan')
+          encode_real(float(name))
+        return [encoded], len(encoded), idx + len(name)
+
+    self.error('Expecting value', text, idx)
+
+  def string(self, value):
+    content = value.encode('utf8')
+    chunk = b'\x0c' + encode_length(len(content)) + content
+    return [chunk], len(chunk)
+
+  def wrap(self, tags, chunks, size):
+    # Prefix content with the headers of an explicitly tagged SEQUENCE
+    outer, inner = tags
+    inner_header = inner + encode_length(size)
+    size += len(inner_header)
+    header = outer + encode_length(size) + inner_header
+    chunks.insert(0, header)
+    return chunks, size + len(header) - len(inner_header)
+
+  def array(self, text, idx):
+    chunks = []
+    size = 0
+    idx = _WHITESPACE.match(text, idx).end()
+    if text[idx:idx + 1] == ']':
+      return self.wrap(self.list_tags, chunks, size) + (idx + 1,)
+
+    while True:
+      item, item_size, idx = self.value(text, idx)
+      chunks.extend(item)
+      size += item_size
+
+      idx = _WHITESPACE.match(text, idx).end()
+      char = text[idx:idx + 1]
+      if char == ']':
+        return self.wrap(self.list_tags, chunks, size) + (idx + 1,)
+      if char != ',':
+        self.error('Expecting \',\' delimiter', text, idx)
+      idx = _WHITESPACE.match(text, idx + 1).end()
+
+  def object(self, text, idx):
+    members = {}
+    idx = _WHITESPACE.match(text, idx).end()
+    if text[idx:idx + 1] != '}':
+      while True:
+        if text[idx:idx + 1] != '"':
+          self.error('Expecting property name enclosed in double quotes',
+              text, idx)
+        key, idx = self.scanstring(text, idx + 1)
+        idx = _WHITESPACE.match(text, idx).end()
+        if text[idx:idx + 1] != ':':
+          self.error('Expecting \':\' delimiter', text, idx)
+        idx = _WHITESPACE.match(text, idx + 1).end()
+
+        # The member is kept encoded as a (key, value) pair.
+        chunks, size = self.string(key)
+        value, value_size, idx = self.value(text, idx)
+        chunks.extend(value)
+        members[key] = self.wrap(self.pair_tags, chunks, size + value_size)
+
+        idx = _WHITESPACE.match(text, idx).end()
+        char = text[idx:idx + 1]
+        if char == '}':
+          break
+        if char != ',':
+          self.error('Expecting \',\' delimiter', text, idx)
+        idx = _WHITESPACE.match(text, idx + 1).end()
+
+    keys = list(members)
+    if self.sort is not False:
+      keys = self.sort(keys)
+
+    chunks = []
+    size = 0
+    for key in keys:
+      member, member_size = members.pop(key)
+      chunks.extend(member)
+      size += member_size
+    return self.wrap(self.mapping_tags, chunks, size) + (idx + 1,)
+
+
+def _chunks(text, transcoder):
+  if hasattr(text, 'read'):
+    text = text.read()
+  if isinstance(text, (bytes, bytearray, memoryview)):
+    text = bytes(text).decode('utf8')
+  if transcoder is None:
+    from . import default_transcoder
+    transcoder = default_transcoder()
+  return _Encoder(transcoder).encode(text)[0]
+
+
+def encode_json(text, transcoder = None):
+  """
+  Transcode JSON text to DER.
+
+  :param mixed text: The JSON text as str, UTF-8 encoded bytes, or a file
+      object to read it from.
+  :param DERTranscoder transcoder: [optional] The transcoder whose options
+      and tags to use; defaults to the shared bran.default_transcoder().
+  :return: The same bytes as encoding json.loads(text) with the transcoder.
+  :raises: json.JSONDecodeError for invalid JSON, ValueError for NaN.
+  """
+  return b''.join(_chunks(text, transcoder))
+
+
+def encode_json_into(text, write, transcoder = None):
+  """
+  Transcode JSON text to DER, and pass each buffer to a write function.
+
+  :param mixed text: As for encode_json().
+  :param callable write: Called with each buffer in turn, e.g. the write()
+      method of a file object or the update() method of a hash function.
+  :param DERTranscoder transcoder: [optional] As for encode_json().
+  :return: The total number of Bytes written.
+  """
+  total = 0
+  for chunk in _chunks(text, transcoder):
+    write(chunk)
+    total += len(chunk)
+  return total
+
+
+def digest_json(text, hashfunc = None, transcoder = None):
+  """
+  Return the hash digest of the DER encoding of JSON text.
+
+  This is the same as bran.digest(json.loads(text)).
+
+  :param mixed text: As for encode_json().
+  :param callable hashfunc: [optional] One of hashlib's constructor functions;
+      defaults to hashlib.sha512
+  :param DERTranscoder transcoder: [optional] As for encode_json().
+  :return: The digest as bytes.
+  """
+  import hashlib
+  hashobj = (hashfunc or hashlib.sha512)()
+  encode_json_into(text, hashobj.update, transcoder)
+  return hashobj.digest()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Message authentication codes over encoded objects.
+
+BranMAC authenticates objects by their DER encoding, with either HMAC or
+keyed BLAKE2. The key is processed once, when the BranMAC is created; each
+message starts from a copy of that keyed state, so authenticating many small
+messages does not repeat the key setup.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('BranMAC',)
+
+import hashlib
+
+_BLAKE2 = {
+  'blake2b': hashlib.blake2b,
+  'blake2s': hashlib.blake2s,
+}
+
+
+class BranMAC(object):
+  """
+  A keyed hash of objects.
+
+  Like BranHasher, update() accepts any object that DERTranscoder can
+  encode, and digest() returns the MAC of the objects passed so far. In
+  addition, mac() and verify() authenticate single objects without touching
+  that state.
+  """
+
+  def __init__(self, key, digestmod = 'sha256', obj = None,
+      transcoder = None, **kwargs):
+    """
+    Initialize the MAC with a key.
+
+    :param bytes key: The secret key.
+    :param mixed digestmod: [optional] A hashlib constructor or algorithm
+        name. hashlib.blake2b and hashlib.blake2s are used in their keyed
+        mode; any other hash function is used with HMAC. Defaults to
+        'sha256'.
+    :param mixed obj: [optional] An object to update the MAC with.
+    :param DERTranscoder transcoder: [optional] The transcoder to use;
+        defaults to the shared bran.default_transcoder().
+
+    Additional keyword arguments, e.g. digest_size or person, are passed to
+    the BLAKE2 constructors.
+    """
+    if transcoder is None:
+      from . import default_transcoder
+      transcoder = default_transcoder()
+    self.__transcoder = transcoder
+
+    blake2 = _BLAKE2.get(digestmod, None)
+    if blake2 is None and digestmod in _BLAKE2.values():
+      blake2 = digestmod
+    if blake2 is not None:
+      self.__keyed = blake2(key = key, **kwargs)
+    else:
+      if kwargs:
+        raise TypeError('Unexpected arguments for HMAC: %s'
+            % (', '.join(sorted(kwargs)),))
+      import hmac
+      self.__keyed = hmac.new(key, digestmod = digestmod)
+
+    self.__state = self.__keyed.copy()
+    if obj is not None:
+      self.update(obj)
+
+  @property
+  def name(self):
+    """The name of the MAC algorithm, e.g. 'hmac-sha256' or 'blake2b'."""
+    return self.__keyed.name
+
+  @property
+  def digest_size(self):
+    """The size of the resulting MAC in Bytes."""
+    return self.__keyed.digest_size
+
+  def update(self, *args):
+    """Update the MAC with the encoding of each of the arguments."""
+    write = self.__state.update
+    for obj in args:
+      self.__transcoder.encode_into(obj, write)
+
+  def digest(self):
+    """Return the MAC of the objects passed to update() so far."""
+    return self.__state.digest()
+
+  def hexdigest(self):
+    """Return the MAC as a string of hexadecimal digits."""
+    return self.__state.hexdigest()
+
+  def reset(self):
+    """Discard the objects passed to update() so far."""
+    self.__state = self.__keyed.copy()
+
+  def copy(self):
+    """
+    Return a copy of the MAC, e.g. to authenticate messages that share a
+    common prefix.
+
+    :return: A BranMAC instance with the same key and state.
+    """
+    other = object.__new__(type(self))
+    other.__transcoder = self.__transcoder
+    other.__keyed = self.__keyed
+    other.__state = self.__state.copy()
+    return other
+
+  def mac(self, obj):
+    """
+    Return the MAC of a single object.
+
+    The state built by update() is not affected.
+
+    :param mixed obj: The object to authenticate.
+    :return: The MAC as bytes.
+    """
+    state = self.__keyed.copy()
+    self.__transcoder.encode_into(obj, state.update)
+    return state.digest()
+
+  def verify(self, obj, tag):
+    """
+    Check a MAC of a single object in constant time.
+
+    :param mixed obj: The object to authenticate.
+    :param bytes tag: The expected MAC.
+    :return: True if the tag matches, else False.
+    """
+    import hmac
+    return hmac.compare_digest(self.mac(obj), tag)
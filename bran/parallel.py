@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel decoding of files holding concatenated bran records.
+
+The file is scanned once for the boundaries of its top-level records, using
+only their DER headers. The records are then grouped into byte ranges that
+are decoded in a process pool. Each worker reads its range from the file by
+path and offset, so no record data is pickled on the way in; only the decoded
+values, or the results of a user function, are passed back.
+
+Functions passed to workers must be picklable, i.e. defined at module level.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('scan_records', 'split_ranges', 'decode_file', 'map_reduce_file')
+
+
+def scan_records(path):
+  """
+  Yield the byte ranges of the top-level records in a file.
+
+  Only the identifier and length octets of each record are read.
+
+  :param str path: The path of the file.
+  :return: A generator yielding (offset, length) tuples.
+  :raises: SubstrateUnderrunError if the last record is truncated.
+  """
+  import mmap
+  from .codec import read_header
+
+  with open(path, 'rb') as fileobj:
+    import os
+    size = os.fstat(fileobj.fileno()).st_size
+    if not size:
+      return
+    with mmap.mmap(fileobj.fileno(), 0, access = mmap.ACCESS_READ) as data:
+      offset = 0
+      while offset < size:
+        stop = read_header(data, offset, size)[2]
+        yield offset, stop - offset
+        offset = stop
+
+
+def split_ranges(records, chunk_size):
+  """
+  Group consecutive records into ranges of roughly the given size.
+
+  :param iterable records: (offset, length) tuples as yielded by
+      scan_records().
+  :param int chunk_size: The size in Bytes at which a range is closed.
+  :return: A generator yielding (offset, length, count) tuples.
+  """
+  start = None
+  end = 0
+  count = 0
+  for offset, length in records:
+    if start is None:
+      start = offset
+    end = offset + length
+    count += 1
+    if end - start >= chunk_size:
+      yield start, end - start, count
+      start = None
+      count = 0
+  if count:
+    yield start, end - start, count
+
+
+def _transcoder(factory):
+  # Return the transcoder to use in a worker.
+  if factory is None:
+    from . import default_transcoder
+    return default_transcoder()
+  return factory()
+
+
+def _decode_range(path, offset, length, func, factory):
+  # Worker: read a range by path and offset, and decode its records.
+  with open(path, 'rb') as fileobj:
+    fileobj.seek(offset)
+    data = fileobj.read(length)
+
+  values = _transcoder(factory).decode_all(data)
+  if func is None:
+    return list(values)
+  return [func(value) for value in values]
+
+
+def _reduce_range(path, offset, length, mapper, reducer, factory):
+  # Worker: map and reduce the records of a range.
+  import functools
+  values = _decode_range(path, offset, length, mapper, factory)
+  return functools.reduce(reducer, values)
+
+
+def _run(tasks, jobs):
+  # Run (function, args) tasks in a process pool, yielding results in order.
+  # At most twice as many tasks as there are workers are in flight, so
+  # results are not accumulated if the consumer is slow.
+  if jobs is None:
+    import os
+    jobs = os.cpu_count() or 1
+
+  if jobs == 1:
+    for func, args in tasks:
+      yield func(*args)
+    return
+
+  import collections
+  from concurrent.futures import ProcessPoolExecutor
+  with ProcessPoolExecutor(jobs) as pool:
+    pending = collections.deque()
+    for func, args in tasks:
+      pending.append(pool.submit(func, *args))
+      if len(pending) >= 2 * jobs:
+        yield pending.popleft().result()
+    while pending:
+      yield pending.popleft().result()
+
+
+def decode_file(path, func = None, jobs = None, chunk_size = 16 << 20,
+    transcoder_factory = None):
+  """
+  Decode all records in a file in parallel.
+
+  :param str path: The path of the file.
+  :param callable func: [optional] A function that is applied to each
+      decoded record in the workers; the iterator yields its results instead
+      of the records.
+  :param int jobs: [optional] The number of worker processes; defaults to the
+      number of CPUs. With 1, records are decoded in the calling process.
+  :param int chunk_size: [optional] The approximate number of Bytes each
+      worker decodes at a time; defaults to 16 MiB.
+  :param callable transcoder_factory: [optional] A function without
+      arguments that returns the DERTranscoder to use in workers; defaults to
+      the shared bran.default_transcoder().
+  :return: An iterator over the decoded records, or the results of func, in
+      file order.
+  """
+  tasks = ((_decode_range, (path, offset, length, func, transcoder_factory))
+           for offset, length, _ in split_ranges(scan_records(path),
+               chunk_size))
+  for values in _run(tasks, jobs):
+    for value in values:
+      yield value
+
+
+def map_reduce_file(path, mapper, reducer, initial = None, jobs = None,
+    chunk_size = 16 << 20, transcoder_factory = None):
+  """
+  Map each record in a file, and reduce the results.
+
+  Workers map and reduce the records of their range; the range results are
+  then reduced in file order in the calling process. The reducer must
+  therefore be associative.
+
+  :param str path: The path of the file.
+  :param callable mapper: A function applied to each decoded record.
+  :param callable reducer: A function of two arguments combining results.
+  :param mixed initial: [optional] The initial value of the reduction; it
+      is returned for files without records.
+  :param int jobs: [optional] As for decode_file().
+  :param int chunk_size: [optional] As for decode_file().
+  :param callable transcoder_factory: [optional] As for decode_file().
+  :return: The reduced result.
+  """
+  import functools
+  tasks = ((_reduce_range, (path, offset, length, mapper, reducer,
+              transcoder_factory))
+           for offset, length, _ in split_ranges(scan_records(path),
+               chunk_size))
+  results = _run(tasks, jobs)
+  if initial is None:
+    initial = next(results, None)
+  return functools.reduce(reducer, results, initial)
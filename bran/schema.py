@@ -0,0 +1,605 @@
+# -*- coding: utf-8 -*-
+"""
+Schema-compiled encoders and decoders.
+
+Most records have a fixed shape: the same keys and the same leaf types every
+time. A compiled schema resolves the key order, tags and leaf codecs once, so
+that encoding and decoding such records skips the type discovery and key
+sorting of the generic path.
+
+Schemas are given by example. The specification may be a sample value, or a
+structure with types in place of values:
+
+- The leaf types None, bool, int, float, complex, bytes and str.
+  Complex numbers are explicitly tagged pairs of REALs, but are compiled like
+  the other leaf types.
+- A mapping with fixed keys, e.g. ``{ u'id': int, u'tags': [str] }``.
+- A list, whose first element specifies the type of all elements.
+- A tuple with a fixed number of elements.
+- A dataclass or typing.NamedTuple class or instance. Dataclasses are encoded
+  as a mapping of their field names; both decode as instances of the class.
+- ``object``, or anything else, for values of arbitrary type.
+
+Values that do not match the schema are not rejected; they are encoded and
+decoded by the generic path instead, with the same result as if no schema had
+been used. The only difference is that dataclass instances, which the generic
+path does not know, are encoded as mappings of their fields, and that records
+decoded by the generic path are not converted back into dataclass or
+NamedTuple instances.
+
+The transcoder's decoding limits apply to compiled decoding as they do to
+the generic path.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('compile_schema', 'CompiledSchema')
+
+from .codec import encode_length, encode_integer, encode_real, decode_real, \
+    read_header, LimitExceeded, _Budget
+
+
+class _Mismatch(Exception):
+  # Raised by node encoders when a value does not match the schema.
+  pass
+
+
+class _Limits(object):
+  # The transcoder's decoding limits, checked against a _Budget in the same
+  # places as bran.codec.Decoder checks them.
+
+  def __init__(self, options):
+    self.max_size = options.get('max_size', None)
+    self.max_depth = options.get('max_depth', None)
+    self.max_items = options.get('max_items', None)
+    self.max_length = options.get('max_length', None)
+    self.max_total = options.get('max_total', None)
+    self.enabled = any(limit is not None for limit in (self.max_depth,
+        self.max_items, self.max_length, self.max_total))
+
+  def enter(self, budget, start):
+    # Enter the nesting level of the content at start. Return the budget's
+    # previous state, which is restored before falling back to the generic
+    # path.
+    state = budget.depth, budget.total
+    budget.depth += 1
+    if self.max_depth is not None and budget.depth > self.max_depth:
+      raise LimitExceeded('Nesting depth exceeds the limit of %d'
+          % (self.max_depth,), start)
+    return state
+
+  def count(self, count, offset):
+    # Check that another element may follow count elements.
+    if self.max_items is not None and count >= self.max_items:
+      raise LimitExceeded('Number of elements exceeds the limit of %d'
+          % (self.max_items,), offset)
+
+  def charge(self, budget, ident, offset, length):
+    # Charge a primitive value's content length.
+    if self.max_length is not None and length > self.max_length \
+        and ident in (b'\x0c', b'\x04'):
+      raise LimitExceeded('Length %d exceeds the limit of %d'
+          % (length, self.max_length), offset)
+    budget.total += length
+    if self.max_total is not None and budget.total > self.max_total:
+      raise LimitExceeded('Total decoded size exceeds the limit of %d'
+          % (self.max_total,), offset)
+
+
+def _header(ident, length):
+  return ident + encode_length(length)
+
+
+def _explicit(outer, inner, content):
+  # Wrap content in an explicitly tagged SEQUENCE or SET
+  inner_header = _header(inner, len(content))
+  return _header(outer, len(inner_header) + len(content)) + inner_header \
+      + content
+
+
+class _Node(object):
+  # Base class for schema nodes. Subclasses implement encode(value), which
+  # returns the encoding or raises _Mismatch, and decode_value(data, offset,
+  # end, budget), which returns the value and the offset following it,
+  # falling back to the generic decoder on mismatches. The budget is None
+  # unless the transcoder has limits.
+
+  def __init__(self, schema):
+    self.schema = schema
+    self.limits = schema.limits
+
+  def generic(self, data, offset, end, budget, state = None):
+    # Decode with the generic path; a state returned by _Limits.enter()
+    # undoes what was charged for the value so far.
+    if state is not None:
+      budget.depth, budget.total = state
+    return self.schema.generic_decoder.decode_value(data, offset, end,
+        budget)
+
+
+class _Any(_Node):
+  # Values of arbitrary type use the generic path.
+
+  def encode(self, value):
+    return self.schema.transcoder.encode(self.schema.plain(value))
+
+  def decode_value(self, data, offset, end, budget):
+    return self.generic(data, offset, end, budget)
+
+
+class _Leaf(_Node):
+  # Leaf values of a single exact type.
+
+  def __init__(self, schema, kind, ident, content, decode):
+    _Node.__init__(self, schema)
+    self.kind = kind
+    self.ident = ident
+    self.ident_octet = ident[0]
+    self.content = content
+    self.decode = decode
+
+  def encode(self, value):
+    if type(value) is not self.kind:
+      raise _Mismatch()
+    content = self.content(value)
+    return self.ident + encode_length(len(content)) + content
+
+  def decode_value(self, data, offset, end, budget):
+    if offset >= end or data[offset] != self.ident_octet:
+      return self.generic(data, offset, end, budget)
+    _, start, stop = read_header(data, offset, end)
+    if budget is not None:
+      self.limits.charge(budget, self.ident, offset, stop - start)
+    return self.decode(data[start:stop]), stop
+
+
+def _decode_null(content):
+  if content:
+    from pyasn1 import error
+    raise error.PyAsn1Error('Unexpected %d-octet substrate for Null'
+        % len(content))
+  return None
+
+
+def _decode_boolean(content):
+  from pyasn1 import error
+  if len(content) != 1 or content[0] not in (0x00, 0xff):
+    raise error.PyAsn1Error('Unexpected Boolean payload')
+  return content[0] == 0xff
+
+
+def _leaves():
+  # Leaf types with their identifier octets, content encoders and decoders
+  import six
+  return {
+    type(None): (b'\x05', lambda value: b'', _decode_null),
+    bool: (b'\x01', lambda value: value and b'\xff' or b'\x00',
+      _decode_boolean),
+    int: (b'\x02', encode_integer,
+      lambda content: int.from_bytes(content, 'big', signed = True)),
+    float: (b'\x09', encode_real, decode_real),
+    bytes: (b'\x04', bytes, bytes),
+    six.text_type: (b'\x0c', lambda value: value.encode('utf8'),
+      lambda content: bytes(content).decode('utf8')),
+  }
+
+
+class _Constructed(_Node):
+  # Base class for nodes encoded as explicitly tagged SEQUENCEs.
+
+  def __init__(self, schema, tags):
+    _Node.__init__(self, schema)
+    self.outer, self.inner = tags
+
+  def content(self, data, offset, end):
+    # Return the content range of the value at offset, or None if it does
+    # not have the expected tags.
+    if offset >= end:
+      return None
+    ident, start, stop = read_header(data, offset, end)
+    if ident != self.outer or start >= stop:
+      return None
+    ident, inner_start, inner_stop = read_header(data, start, stop)
+    if ident != self.inner or inner_stop != stop:
+      return None
+    return inner_start, stop
+
+
+class _Complex(_Constructed):
+  # Complex numbers, as a pair of REALs.
+
+  def __init__(self, schema):
+    _Constructed.__init__(self, schema, schema.tags('COMPLEX'))
+
+  def encode(self, value):
+    if type(value) is not complex:
+      raise _Mismatch()
+    content = b''.join(_header(b'\x09', len(part)) + part
+        for part in (encode_real(value.real), encode_real(value.imag)))
+    return _explicit(self.outer, self.inner, content)
+
+  def decode_value(self, data, offset, end, budget):
+    content = self.content(data, offset, end)
+    if content is None:
+      return self.generic(data, offset, end, budget)
+    pos, stop = content
+    state = None
+    if budget is not None:
+      state = self.limits.enter(budget, pos)
+
+    parts = []
+    for _ in range(2):
+      if pos >= stop or data[pos] != 0x09:
+        return self.generic(data, offset, end, budget, state)
+      if budget is not None:
+        self.limits.count(len(parts), pos)
+      ident, start, item_stop = read_header(data, pos, stop)
+      if budget is not None:
+        self.limits.charge(budget, ident, pos, item_stop - start)
+      parts.append(decode_real(data[start:item_stop]))
+      pos = item_stop
+    if pos != stop:
+      return self.generic(data, offset, end, budget, state)
+    if budget is not None:
+      budget.depth -= 1
+    return complex(parts[0], parts[1]), stop
+
+
+class _Record(_Constructed):
+  # Mappings with a fixed set of keys, and dataclasses.
+
+  def __init__(self, schema, fields, cls = None):
+    _Constructed.__init__(self, schema, schema.tags('MAPPING'))
+    self.pair = _Constructed(schema, schema.tags('TUPLE'))
+    self.cls = cls
+
+    transcoder = schema.transcoder
+    keys = [key for key, _ in fields]
+    self.sort = transcoder.inner.options.get('sort', sorted)
+    if self.sort is not False:
+      keys = list(self.sort(keys))
+    nodes = dict(fields)
+    self.keys = tuple(keys)
+    self.nodes = tuple(nodes[key] for key in keys)
+    self.encoded_keys = tuple(transcoder.encode(key) for key in keys)
+    self.key_count = len(keys)
+
+  def __items(self, value):
+    # Return the values in key order
+    if self.cls is not None:
+      if type(value) is not self.cls:
+        raise _Mismatch()
+      return [getattr(value, key) for key in self.keys]
+
+    from .util import Mapping
+    if not isinstance(value, Mapping) or len(value) != self.key_count:
+      raise _Mismatch()
+    if self.sort is not sorted:
+      # The order may depend on the value; only accept the compiled order.
+      keys = list(value.keys())
+      if self.sort is not False:
+        keys = list(self.sort(keys))
+      if tuple(keys) != self.keys:
+        raise _Mismatch()
+    try:
+      return [value[key] for key in self.keys]
+    except KeyError:
+      raise _Mismatch()
+
+  def encode(self, value):
+    outer, inner = self.pair.outer, self.pair.inner
+    parts = []
+    for key, node, item in zip(self.encoded_keys, self.nodes,
+        self.__items(value)):
+      parts.append(_explicit(outer, inner, key + node.encode(item)))
+    return _explicit(self.outer, self.inner, b''.join(parts))
+
+  def decode_value(self, data, offset, end, budget):
+    content = self.content(data, offset, end)
+    if content is None:
+      return self.generic(data, offset, end, budget)
+    pos, stop = content
+    state = None
+    if budget is not None:
+      state = self.limits.enter(budget, pos)
+
+    pair = self.pair
+    values = []
+    for key, node in zip(self.encoded_keys, self.nodes):
+      pair_content = pair.content(data, pos, stop)
+      if pair_content is None:
+        return self.generic(data, offset, end, budget, state)
+      if budget is not None:
+        self.limits.count(len(values), pos)
+      start, pair_stop = pair_content
+      if data[start:start + len(key)] != key:
+        return self.generic(data, offset, end, budget, state)
+      if budget is not None:
+        # The key is charged like a decoded one.
+        ident, key_start, key_stop = read_header(data, start, pair_stop)
+        self.limits.charge(budget, ident, start, key_stop - key_start)
+      item, item_stop = node.decode_value(data, start + len(key), pair_stop,
+          budget)
+      if item_stop != pair_stop:
+        return self.generic(data, offset, end, budget, state)
+      values.append(item)
+      pos = pair_stop
+
+    if pos != stop:
+      return self.generic(data, offset, end, budget, state)
+    if budget is not None:
+      budget.depth -= 1
+
+    if self.cls is not None:
+      return self.cls(**dict(zip(self.keys, values))), stop
+    return self.schema.mapping(zip(self.keys, values)), stop
+
+
+class _Tuple(_Constructed):
+  # Tuples with a fixed number of elements, and NamedTuples.
+
+  def __init__(self, schema, nodes, cls = None):
+    _Constructed.__init__(self, schema, schema.tags('TUPLE'))
+    self.nodes = tuple(nodes)
+    self.cls = cls
+
+  def encode(self, value):
+    if not isinstance(value, tuple) or len(value) != len(self.nodes):
+      raise _Mismatch()
+    return _explicit(self.outer, self.inner, b''.join(
+        node.encode(item) for node, item in zip(self.nodes, value)))
+
+  def decode_value(self, data, offset, end, budget):
+    content = self.content(data, offset, end)
+    if content is None:
+      return self.generic(data, offset, end, budget)
+    pos, stop = content
+    state = None
+    if budget is not None:
+      state = self.limits.enter(budget, pos)
+
+    values = []
+    for node in self.nodes:
+      if pos >= stop:
+        return self.generic(data, offset, end, budget, state)
+      if budget is not None:
+        self.limits.count(len(values), pos)
+      item, pos = node.decode_value(data, pos, stop, budget)
+      values.append(item)
+    if pos != stop:
+      return self.generic(data, offset, end, budget, state)
+    if budget is not None:
+      budget.depth -= 1
+
+    if self.cls is not None:
+      return self.cls(*values), stop
+    return tuple(values), stop
+
+
+class _List(_Constructed):
+  # Lists with elements of the same schema.
+
+  def __init__(self, schema, node):
+    _Constructed.__init__(self, schema, schema.tags('LIST'))
+    self.node = node
+
+  def encode(self, value):
+    if type(value) is not list:
+      raise _Mismatch()
+    encode = self.node.encode
+    return _explicit(self.outer, self.inner, b''.join(
+        encode(item) for item in value))
+
+  def decode_value(self, data, offset, end, budget):
+    content = self.content(data, offset, end)
+    if content is None:
+      return self.generic(data, offset, end, budget)
+    pos, stop = content
+
+    decode = self.node.decode_value
+    values = []
+    if budget is None:
+      while pos < stop:
+        item, pos = decode(data, pos, stop, None)
+        values.append(item)
+    else:
+      limits = self.limits
+      limits.enter(budget, pos)
+      while pos < stop:
+        limits.count(len(values), pos)
+        item, pos = decode(data, pos, stop, budget)
+        values.append(item)
+      budget.depth -= 1
+    if self.schema.list is not list:
+      values = self.schema.list(values)
+    return values, stop
+
+
+class CompiledSchema(object):
+  """
+  Encoder and decoder specialized for values of a given schema.
+
+  See the module documentation for how schemas are specified.
+  """
+
+  def __init__(self, spec, transcoder = None):
+    """
+    Compile the schema.
+
+    :param mixed spec: The schema specification.
+    :param DERTranscoder transcoder: [optional] The transcoder whose options
+        and tags to use, and which handles values that do not match the
+        schema; defaults to the shared bran.default_transcoder().
+    """
+    if transcoder is None:
+      from . import default_transcoder
+      transcoder = default_transcoder()
+    self.transcoder = transcoder
+
+    from .codec import Decoder
+    self.generic_decoder = Decoder(transcoder.inner)
+    self.limits = _Limits(transcoder.inner.options)
+
+    # Decoded mappings and lists follow the transcoder's frozen option.
+    self.mapping, self.list = dict, list
+    if transcoder.inner.options.get('frozen', False):
+      from .frozen import FrozenDict, FrozenList
+      self.mapping, self.list = FrozenDict, FrozenList
+
+    self.__leaves = _leaves()
+    self.__dataclasses = set()
+    self.__root = self.__node(spec)
+
+  def tags(self, name):
+    """
+    Return the outer and inner identifier octets of a transcoder template.
+
+    :param str name: One of 'COMPLEX', 'TUPLE', 'LIST' or 'MAPPING'.
+    :return: A tuple of two bytes objects.
+    """
+    from .util import identifier_octets
+    tagset = getattr(self.transcoder.inner, name).tagSet
+    return identifier_octets(tagset[-1]), identifier_octets(tagset[0])
+
+  def __node(self, spec):
+    # Build the node for a specification
+    import dataclasses
+    from .util import Mapping
+
+    if spec is None:
+      spec = type(None)
+
+    if spec is complex or type(spec) is complex:
+      return _Complex(self)
+
+    if isinstance(spec, type):
+      if spec in self.__leaves:
+        return _Leaf(self, spec, *self.__leaves[spec])
+      if dataclasses.is_dataclass(spec):
+        return self.__dataclass(spec, None)
+      if issubclass(spec, tuple) and hasattr(spec, '_fields'):
+        return self.__namedtuple(spec, None)
+      return self.__typing(spec)
+
+    if type(spec) in self.__leaves:
+      return self.__node(type(spec))
+
+    if dataclasses.is_dataclass(spec):
+      return self.__dataclass(type(spec), spec)
+
+    if isinstance(spec, tuple) and hasattr(spec, '_fields'):
+      return self.__namedtuple(type(spec), spec)
+
+    if isinstance(spec, Mapping):
+      return _Record(self, [(key, self.__node(value))
+                            for key, value in spec.items()])
+
+    if type(spec) is list:
+      element = spec[0] if spec else object
+      return _List(self, self.__node(element))
+
+    if type(spec) is tuple:
+      return _Tuple(self, [self.__node(item) for item in spec])
+
+    return self.__typing(spec)
+
+  def __typing(self, spec):
+    # typing generics such as List[int] or Tuple[int, str]; everything else
+    # is handled by the generic path.
+    origin = getattr(spec, '__origin__', None)
+    args = getattr(spec, '__args__', None) or ()
+    if origin is list and len(args) == 1:
+      return _List(self, self.__node(args[0]))
+    if origin is tuple and args and Ellipsis not in args:
+      return _Tuple(self, [self.__node(arg) for arg in args])
+    return _Any(self)
+
+  def __dataclass(self, cls, sample):
+    import dataclasses, typing
+    self.__dataclasses.add(cls)
+    if sample is None:
+      hints = typing.get_type_hints(cls)
+      fields = [(field.name, self.__node(hints.get(field.name, object)))
+                for field in dataclasses.fields(cls)]
+    else:
+      fields = [(field.name, self.__node(getattr(sample, field.name)))
+                for field in dataclasses.fields(cls)]
+    return _Record(self, fields, cls)
+
+  def __namedtuple(self, cls, sample):
+    if sample is None:
+      hints = getattr(cls, '__annotations__', {})
+      nodes = [self.__node(hints.get(name, object)) for name in cls._fields]
+    else:
+      nodes = [self.__node(item) for item in sample]
+    return _Tuple(self, nodes, cls)
+
+  def plain(self, value):
+    """
+    Convert dataclass instances of the schema to plain mappings.
+
+    This is applied to values before they are passed to the generic path.
+
+    :param mixed value: The value to convert.
+    :return: The converted value.
+    """
+    if not self.__dataclasses:
+      return value
+    return self.__plain(value)
+
+  def __plain(self, value):
+    from .util import Mapping
+    if type(value) in self.__dataclasses:
+      import dataclasses
+      return dict((field.name, self.__plain(getattr(value, field.name)))
+                  for field in dataclasses.fields(value))
+    if isinstance(value, Mapping):
+      return dict((key, self.__plain(item)) for key, item in value.items())
+    if type(value) in (list, tuple):
+      return type(value)(self.__plain(item) for item in value)
+    return value
+
+  def encode(self, value):
+    """
+    DER-encode the given value.
+
+    :param mixed value: The value to encode.
+    :return: The DER encoding as bytes.
+    """
+    try:
+      return self.__root.encode(value)
+    except _Mismatch:
+      return self.transcoder.encode(self.plain(value))
+
+  def decode(self, data):
+    """
+    DER-decode the given byte sequence.
+
+    :param bytes data: The value to decode.
+    :return: The decoded value.
+    :raises: LimitExceeded if the data exceeds one of the transcoder's
+        limits.
+    """
+    if not isinstance(data, bytes):
+      data = memoryview(data).cast('B')
+    limits = self.limits
+    if limits.max_size is not None and len(data) > limits.max_size:
+      raise LimitExceeded('Input size %d exceeds the limit of %d'
+          % (len(data), limits.max_size), 0)
+    budget = None
+    if limits.enabled:
+      budget = _Budget()
+    return self.__root.decode_value(data, 0, len(data), budget)[0]
+
+
+def compile_schema(spec, transcoder = None):
+  """
+  Compile a schema into a specialized encoder and decoder.
+
+  :param mixed spec: The schema specification; see the module documentation.
+  :param DERTranscoder transcoder: [optional] The transcoder whose options
+      and tags to use; defaults to the shared bran.default_transcoder().
+  :return: A CompiledSchema instance.
+  """
+  return CompiledSchema(spec, transcoder)
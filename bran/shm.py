@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Pass encoded values between processes through shared memory.
+
+A SharedRing owns a multiprocessing.shared_memory segment that values are
+encoded into. Encoding yields a SharedRef, i.e. the name of the segment and
+the offset and length of the encoding in it; only that small tuple needs to
+be pickled and sent to another process, which decodes the value from a
+memoryview of the segment with decode_shared(). The encoded record is thus
+copied once, into the segment, and never pickled.
+
+The ring hands out space in allocation order and wraps around at its end.
+Space is reused only after the producer calls release() for a record, e.g.
+once the consumer has reported the record as processed.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('SharedRef', 'SharedRing', 'decode_shared', 'detach')
+
+import collections
+
+SharedRef = collections.namedtuple('SharedRef', ('name', 'offset', 'length'))
+SharedRef.__doc__ = """
+The location of an encoded value in a shared memory segment.
+
+:param str name: The name of the segment.
+:param int offset: The offset of the encoding in the segment.
+:param int length: The length of the encoding in Bytes.
+"""
+
+# Segments of rings created in this process, and segments mapped by
+# decode_shared(), by name.
+_owned = {}
+_attached = {}
+
+
+class SharedRing(object):
+  """
+  A ring buffer of encoded values in a shared memory segment.
+
+  Rings are meant to be used by a single producer thread. Use them as a
+  context manager, or call close() to remove the segment.
+  """
+
+  def __init__(self, size, transcoder = None):
+    """
+    Create the shared memory segment.
+
+    :param int size: The size of the segment in Bytes; it limits the total
+        size of records that are not yet released.
+    :param DERTranscoder transcoder: [optional] The transcoder to use;
+        defaults to the shared bran.default_transcoder().
+    """
+    from multiprocessing import shared_memory
+    if transcoder is None:
+      from . import default_transcoder
+      transcoder = default_transcoder()
+    self.__transcoder = transcoder
+
+    self.__segment = shared_memory.SharedMemory(create = True, size = size)
+    self.name = self.__segment.name
+    self.size = size
+    _owned[self.name] = self.__segment
+
+    # Allocated records in order, as [offset, length, released], and the
+    # offset at which the next record is written.
+    self.__records = collections.deque()
+    self.__head = 0
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def __allocate(self, length):
+    # Return the offset of a free region of the given length, or None.
+    if not self.__records:
+      self.__head = 0
+      end = self.size
+    else:
+      tail = self.__records[0][0]
+      if self.__head > tail:
+        # Free space is after the head, and before the tail.
+        if self.__head + length <= self.size:
+          return self.__head
+        if length <= tail:
+          return 0
+        return None
+      end = tail
+
+    if self.__head + length <= end:
+      return self.__head
+    return None
+
+  def put(self, value):
+    """
+    Encode a value into the segment.
+
+    :param mixed value: The value to encode.
+    :return: A SharedRef to pass to decode_shared().
+    :raises: ValueError if the encoding is larger than the segment,
+        BufferError if there is not enough unreleased space.
+    """
+    from .blob import BlobRef
+    buffers = self.__transcoder.backend.encode_buffers(value)
+    length = sum(len(buf) for buf in buffers)
+    if length > self.size:
+      raise ValueError('An encoding of %d Bytes does not fit into a segment '
+          'of %d Bytes!' % (length, self.size))
+
+    offset = self.__allocate(length)
+    if offset is None:
+      raise BufferError('Not enough free space for %d Bytes; release records '
+          'first!' % (length,))
+
+    target = self.__segment.buf
+    pos = offset
+    for buf in buffers:
+      if isinstance(buf, BlobRef):
+        for data in buf.chunks():
+          target[pos:pos + len(data)] = data
+          pos += len(data)
+      else:
+        target[pos:pos + len(buf)] = buf
+        pos += len(buf)
+
+    self.__records.append([offset, length, False])
+    self.__head = offset + length
+    return SharedRef(self.name, offset, length)
+
+  def release(self, ref):
+    """
+    Mark a record as processed, so that its space can be reused.
+
+    Records may be released in any order, but space is reclaimed in
+    allocation order.
+
+    :param SharedRef ref: A reference returned by put().
+    :raises: ValueError if the reference is not allocated in this ring.
+    """
+    for record in self.__records:
+      if record[0] == ref.offset and record[1] == ref.length \
+          and not record[2] and ref.name == self.name:
+        record[2] = True
+        break
+    else:
+      raise ValueError('%r is not allocated in this ring!' % (ref,))
+
+    while self.__records and self.__records[0][2]:
+      self.__records.popleft()
+
+  def __len__(self):
+    """Return the number of records that are not yet released."""
+    return sum(1 for record in self.__records if not record[2])
+
+  def close(self):
+    """Close and remove the shared memory segment."""
+    if _owned.pop(self.name, None) is not None:
+      self.__segment.close()
+      self.__segment.unlink()
+
+
+def _attach(name):
+  # Map a segment into this process, once.
+  segment = _owned.get(name, None) or _attached.get(name, None)
+  if segment is None:
+    from multiprocessing import shared_memory
+    try:
+      segment = shared_memory.SharedMemory(name, track = False)
+    except TypeError:
+      # Python < 3.13; the resource tracker is shared with the creator.
+      segment = shared_memory.SharedMemory(name)
+    _attached[name] = segment
+  return segment
+
+
+def decode_shared(ref, transcoder = None):
+  """
+  Decode a value from a shared memory segment.
+
+  The segment is mapped into the process on first use, and stays mapped
+  until detach() is called.
+
+  :param SharedRef ref: The location of the encoding.
+  :param DERTranscoder transcoder: [optional] The transcoder to use;
+      defaults to the shared bran.default_transcoder().
+  :return: The decoded value; it does not reference the segment.
+  """
+  if transcoder is None:
+    from . import default_transcoder
+    transcoder = default_transcoder()
+  segment = _attach(ref.name)
+  with segment.buf[ref.offset:ref.offset + ref.length] as view:
+    return transcoder.decode(view)
+
+
+def detach(name = None):
+  """
+  Unmap segments mapped by decode_shared().
+
+  Segments of SharedRing instances in this process are left alone; use
+  their close() method instead.
+
+  :param str name: [optional] The name of the segment; defaults to all
+      segments.
+  """
+  for key in list(_attached):
+    if name is None or key == name:
+      _attached.pop(key).close()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Encode iterators and generators as lists or tuples with bounded memory.
+
+DER needs the length of a sequence before its content, so the items of an
+iterator are encoded one by one into a spooled temporary file, which is kept
+in memory up to a size limit, and moved to disk beyond it. Once the iterator
+is exhausted, the header is written, and the spooled content is passed on
+like a bran.blob.BlobRef: DERTranscoder.encode_into() and BranHasher read it
+back in chunks. Peak memory use therefore does not depend on the number of
+items.
+
+Iterators that are not sequences, mappings or sets, e.g. generators, are
+encoded as lists automatically. Wrap any iterable in SpooledSequence to pick
+the tuple encoding, or to set the spool's memory limit.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('SpooledSequence',)
+
+
+class SpooledSequence(object):
+  """
+  An iterable that is encoded as a list or tuple via a spooled file.
+
+  The iterable is consumed when the value is encoded, so an iterator can be
+  encoded only once.
+  """
+
+  def __init__(self, iterable, kind = list, max_memory = 1 << 20):
+    """
+    Wrap an iterable.
+
+    :param iterable iterable: The items to encode.
+    :param type kind: [optional] Either list or tuple; decides the encoding.
+        Defaults to list.
+    :param int max_memory: [optional] The size in Bytes up to which the
+        encoded items are kept in memory; defaults to 1 MiB.
+    """
+    if kind not in (list, tuple):
+      raise ValueError('Spooled sequences are lists or tuples, not %r!'
+          % (kind,))
+    self.iterable = iterable
+    self.kind = kind
+    self.max_memory = max_memory
+
+  def __iter__(self):
+    return iter(self.iterable)
+
+  def __repr__(self):
+    return '%s(%r, %s)' % (type(self).__name__, self.iterable,
+        self.kind.__name__)
@@ -32,3 +32,67 @@ def stringify(tag_or_tagset):
     return '+'.join(stringify(tag) for tag in tag_or_tagset)
   raise TypeError('{0} is not an instance of Tag or TagSet'.format(
       str(tag_or_tagset)))
+
+
+def identifier_octets(tag_or_tagset):
+  """
+  Return the DER identifier octets of a Tag or TagSet.
+
+  For a TagSet, the identifier octets of all tags are concatenated, starting
+  with the outermost tag. For explicitly tagged values, that is the order in
+  which the identifiers appear in the DER encoding.
+
+  Besides Tag and TagSet instances, the strings returned by stringify() are
+  accepted as well.
+
+  :param mixed tag_or_tagset: A Tag, TagSet or stringified tag set.
+  :return: The identifier octets as bytes.
+  :raises: TypeError if the value is not a Tag, TagSet or string; ValueError
+      if a string is not a valid stringified tag set.
+  """
+  import six
+  from pyasn1.type.tag import Tag, TagSet
+  if isinstance(tag_or_tagset, Tag):
+    tags = [(tag_or_tagset.tagClass, tag_or_tagset.tagFormat,
+             tag_or_tagset.tagId)]
+  elif isinstance(tag_or_tagset, TagSet):
+    tags = [(tag.tagClass, tag.tagFormat, tag.tagId)
+            for tag in tag_or_tagset]
+  elif isinstance(tag_or_tagset, six.string_types):
+    tags = [_parse_tag(part) for part in tag_or_tagset.split('+')]
+  else:
+    raise TypeError('{0} is not an instance of Tag or TagSet'.format(
+        str(tag_or_tagset)))
+
+  ret = bytearray()
+  for tag_class, tag_format, tag_id in reversed(tags):
+    if tag_id < 0x1f:
+      ret.append(tag_class | tag_format | tag_id)
+      continue
+
+    # High tag number form; base 128 with continuation bits.
+    ret.append(tag_class | tag_format | 0x1f)
+    chunks = [tag_id & 0x7f]
+    tag_id >>= 7
+    while tag_id:
+      chunks.append(0x80 | (tag_id & 0x7f))
+      tag_id >>= 7
+    ret.extend(reversed(chunks))
+  return bytes(ret)
+
+
+def _parse_tag(value):
+  # Parse a single "[class:format:id]" string as produced by stringify()
+  if not (value.startswith('[') and value.endswith(']')):
+    raise ValueError('Bad tag string "{0}"!'.format(value))
+  try:
+    return tuple(int(part) for part in value[1:-1].split(':', 2))
+  except ValueError:
+    raise ValueError('Bad tag string "{0}"!'.format(value))
+
+
+try:
+  from collections.abc import Mapping, Set, Sequence, Iterator  # noqa: F401
+except ImportError:  # pragma: no cover
+  # Python 2
+  from collections import Mapping, Set, Sequence, Iterator  # noqa: F401
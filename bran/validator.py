@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+"""
+Validation of DER-encoded input without decoding it.
+
+The Validator checks that a byte sequence is exactly what bran would produce
+for some value: well-formed TLV structure, DER's minimal identifier and
+length octets, canonical content of the universal types, known tags, and the
+order of mapping keys and set elements. Violations are reported with the byte
+offset at which they occur.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ('ValidationError', 'Validator')
+
+import re
+
+from pyasn1 import error
+
+from .codec import _INF, _OCTETS
+
+# The nesting depth beyond which input is rejected if the transcoder sets no
+# max_depth, so that validation stays well within Python's recursion limit.
+DEFAULT_MAX_DEPTH = 200
+
+# The NR3 form of encode_real(): a mantissa without trailing zeroes, and an
+# exponent that is written as +0 if it is zero.
+_NR3 = re.compile(br'\x03-?(?:[1-9]|[1-9][0-9]*[1-9])E(?:\+0|-?[1-9][0-9]*)\Z')
+
+
+class ValidationError(error.PyAsn1Error):
+  """
+  Raised when DER input violates the encoding rules.
+
+  The offset attribute holds the byte offset of the first violation.
+  """
+
+  def __init__(self, message, offset):
+    message = '%s at offset %d' % (message, offset)
+    error.PyAsn1Error.__init__(self, message)
+    self.args = (message,)
+    self.offset = offset
+
+
+class Validator(object):
+  """
+  Validate DER-encoded values against the tags and options of a transcoder.
+
+  No Python values are built for the input, with one exception: the order of
+  mapping keys and set elements is defined by the transcoder's sort option on
+  the Python values, so they are decoded for comparison. Text and byte keys
+  are compared by their content octets instead when the default sort order is
+  used. If the sort option is False, the order is not checked.
+
+  Integers are checked to have the length bran produces, which is minimal
+  except for negative values of the form -(2 ** (8 * n - 1)); see
+  bran.codec.encode_integer().
+
+  The transcoder's max_size, max_depth, max_items and max_length limits are
+  enforced as in decoding, but violations raise ValidationError. Without a
+  max_depth, nesting is limited to DEFAULT_MAX_DEPTH.
+  """
+
+  def __init__(self, transcoder):
+    """
+    Initialize the validator.
+
+    :param ASN1Transcoder transcoder: The transcoder whose tags and options to
+        use.
+    """
+    import six
+    from .codec import Decoder, tag_key
+    from .util import identifier_octets
+
+    self.__decode_value = Decoder(transcoder).decode_value
+    self.__sort = transcoder.options.get('sort', sorted)
+
+    options = transcoder.options
+    self.__max_size = options.get('max_size', None)
+    self.__max_depth = options.get('max_depth', None)
+    if self.__max_depth is None:
+      self.__max_depth = DEFAULT_MAX_DEPTH
+    self.__max_items = options.get('max_items', None)
+    self.__max_length = options.get('max_length', None)
+
+    self.__primitives = dict((ident, (handler, ((0, ident[0]),)))
+        for ident, handler in (
+          (b'\x05', self.__null),
+          (b'\x01', self.__boolean),
+          (b'\x02', self.__integer),
+          (b'\x09', self.__real),
+          (b'\x0c', self.__text),
+          (b'\x04', None),
+        ))
+
+    tagset = transcoder.TUPLE.tagSet
+    self.__pair = (identifier_octets(tagset[-1]), identifier_octets(tagset[0]))
+    self.__explicit = {}
+    for template, handler in (
+        (transcoder.COMPLEX, self.__complex),
+        (transcoder.TUPLE, self.__sequence),
+        (transcoder.LIST, self.__sequence),
+        (transcoder.MAPPING, self.__mapping),
+        (transcoder.SET, self.__set)):
+      self.__explicit[identifier_octets(template.tagSet)] = (handler,
+          tag_key(template.tagSet))
+    if transcoder.options.get('stdlib_types', False):
+      self.__primitives[b'\x18'] = (self.__time, ((0, 24),))
+      for template, handler in (
+          (transcoder.UUID, self.__uuid),
+          (transcoder.DECIMAL, self.__decimal),
+          (transcoder.DATE, self.__date)):
+        self.__explicit[identifier_octets(template.tagSet)] = (handler,
+            tag_key(template.tagSet))
+
+    # Registry tag sets, and the prefixes of all explicitly tagged ones
+    from .util import _parse_tag
+    self.__registry = {}
+    for key in transcoder.options.get('registry', {}):
+      if isinstance(key, six.string_types):
+        self.__registry[identifier_octets(key)] = tuple(
+            (tag[0], tag[2]) for tag in map(_parse_tag, key.split('+')))
+    self.__prefixes = set()
+    for octets in list(self.__explicit) + list(self.__registry):
+      for idx in range(1, len(octets)):
+        self.__prefixes.add(octets[:idx])
+
+  def validate(self, data):
+    """
+    Validate a single DER-encoded value.
+
+    Unlike decoding, data following the value is a violation.
+
+    :param bytes data: A bytes-like object.
+    :raises: ValidationError at the first violation.
+    """
+    if not isinstance(data, bytes):
+      data = memoryview(data).cast('B')
+    end = len(data)
+    if self.__max_size is not None and end > self.__max_size:
+      raise ValidationError('Input size %d exceeds the limit of %d'
+          % (end, self.__max_size), 0)
+    stop = self.__value(data, 0, end, 0)[0]
+    if stop != end:
+      raise ValidationError('Trailing data', stop)
+
+  def __header(self, data, offset, end):
+    # Parse identifier and length octets, enforcing DER's minimal forms.
+    if offset >= end:
+      raise ValidationError('Missing identifier octets', offset)
+    pos = offset + 1
+    if data[offset] & 0x1f != 0x1f:
+      ident = _OCTETS[data[offset]]
+    else:
+      # High tag number form
+      if pos < end and data[pos] == 0x80:
+        raise ValidationError('Non-minimal tag number', pos)
+      number = 0
+      while True:
+        if pos >= end:
+          raise ValidationError('Truncated identifier octets', pos)
+        number = (number << 7) | (data[pos] & 0x7f)
+        pos += 1
+        if not data[pos - 1] & 0x80:
+          break
+      if number < 0x1f:
+        raise ValidationError('Non-minimal tag number', offset)
+      ident = bytes(data[offset:pos])
+
+    if pos >= end:
+      raise ValidationError('Missing length octets', pos)
+    length_offset = pos
+    length = data[pos]
+    pos += 1
+    if length & 0x80:
+      size = length & 0x7f
+      if not size:
+        raise ValidationError('Indefinite length', length_offset)
+      if pos + size > end:
+        raise ValidationError('Truncated length octets', length_offset)
+      if not data[pos]:
+        raise ValidationError('Non-minimal length', length_offset)
+      length = int.from_bytes(data[pos:pos + size], 'big')
+      if length < 0x80:
+        raise ValidationError('Non-minimal length', length_offset)
+      pos += size
+
+    if pos + length > end:
+      raise ValidationError('Content exceeds the available data',
+          length_offset)
+    return ident, pos, pos + length
+
+  def __value(self, data, offset, end, depth):
+    # Validate the value at offset, which is nested in depth containers;
+    # return the offset following it and its SET ordering key.
+    ident, start, stop = self.__header(data, offset, end)
+
+    entry = self.__primitives.get(ident, None)
+    if entry is not None:
+      if self.__max_length is not None and stop - start > self.__max_length \
+          and ident in (b'\x0c', b'\x04'):
+        raise ValidationError('Length %d exceeds the limit of %d'
+            % (stop - start, self.__max_length), offset)
+      if entry[0] is not None:
+        entry[0](data, start, stop)
+      return stop, entry[1]
+
+    # Explicitly tagged builtin types and registry tag sets are identified
+    # by the concatenated identifier octets of the nested tags.
+    chain = ident
+    constructed = data[offset] & 0x20
+    content_start, content_stop = start, stop
+    while True:
+      entry = self.__explicit.get(chain, None)
+      if entry is not None:
+        entry[0](data, content_start, content_stop, depth)
+        return stop, entry[1]
+
+      key = self.__registry.get(chain, None)
+      if key is not None:
+        if constructed:
+          self.__structure(data, content_start, content_stop, depth)
+        return stop, key
+
+      if chain not in self.__prefixes or not constructed \
+          or content_start == content_stop:
+        raise ValidationError('Unknown tag', offset)
+
+      inner, inner_start, inner_stop = self.__header(data, content_start,
+          content_stop)
+      if inner_stop != content_stop:
+        raise ValidationError('Trailing data in explicit tag', inner_stop)
+      constructed = data[content_start] & 0x20
+      chain += inner
+      content_start, content_stop = inner_start, inner_stop
+
+  def __nest(self, depth, start):
+    # Enter a container whose content starts at start; return its depth.
+    depth += 1
+    if depth > self.__max_depth:
+      raise ValidationError('Nesting depth exceeds the limit of %d'
+          % (self.__max_depth,), start)
+    return depth
+
+  def __count(self, count, start):
+    # Count an element of a container; return the new number of elements.
+    if self.__max_items is not None and count >= self.__max_items:
+      raise ValidationError('Number of elements exceeds the limit of %d'
+          % (self.__max_items,), start)
+    return count + 1
+
+  def __structure(self, data, start, stop, depth):
+    # Registry values are opaque; only check their TLV structure, and the
+    # limits on it.
+    depth = self.__nest(depth, start)
+    count = 0
+    while start < stop:
+      count = self.__count(count, start)
+      ident, content_start, content_stop = self.__header(data, start, stop)
+      if data[start] & 0x20:
+        self.__structure(data, content_start, content_stop, depth)
+      elif self.__max_length is not None \
+          and content_stop - content_start > self.__max_length \
+          and ident in (b'\x0c', b'\x04'):
+        raise ValidationError('Length %d exceeds the limit of %d'
+            % (content_stop - content_start, self.__max_length), start)
+      start = content_stop
+
+  def __null(self, data, start, stop):
+    if start != stop:
+      raise ValidationError('Non-empty NULL', start)
+
+  def __boolean(self, data, start, stop):
+    if stop - start != 1:
+      raise ValidationError('BOOLEAN must be one octet', start)
+    if data[start] not in (0x00, 0xff):
+      raise ValidationError('Non-canonical BOOLEAN', start)
+
+  def __integer(self, data, start, stop):
+    if start == stop:
+      raise ValidationError('Empty INTEGER', start)
+    if stop - start == 1:
+      if data[start] == 0x80:
+        # -128 is encoded in two octets
+        raise ValidationError('Non-canonical INTEGER', start)
+      return
+
+    first, second = data[start], data[start + 1]
+    if not first and not second & 0x80:
+      raise ValidationError('Non-minimal INTEGER', start)
+    if first == 0xff and second & 0x80:
+      # Only negative powers of 256 / 2 have a redundant leading 0xff.
+      if second != 0x80 or any(data[start + 2:stop]):
+        raise ValidationError('Non-minimal INTEGER', start)
+    elif first == 0x80 and not any(data[start + 1:stop]):
+      raise ValidationError('Non-canonical INTEGER', start)
+
+  def __real(self, data, start, stop):
+    from .codec import encode_real, decode_real
+    content = bytes(data[start:stop])
+    try:
+      value = decode_real(content)
+    except (error.PyAsn1Error, ValueError):
+      raise ValidationError('Bad REAL', start)
+    if content[:1] != b'\x03':
+      if encode_real(value) != content:
+        raise ValidationError('Non-canonical REAL', start)
+      return
+
+    # The digits of a fraction depend on how encode_real() rounds while it
+    # scales the float, and decode_real() re-normalises them like pyasn1, so
+    # neither reproduces them. Check the syntax, that the value is a finite,
+    # non-zero float, and that integers are written exactly.
+    if not _NR3.match(content):
+      raise ValidationError('Non-canonical REAL', start)
+    value = float(content[1:])
+    if not value or value in (_INF, -_INF) \
+        or (b'E-' not in content and encode_real(value) != content):
+      raise ValidationError('Non-canonical REAL', start)
+
+  def __text(self, data, start, stop):
+    try:
+      bytes(data[start:stop]).decode('utf8')
+    except UnicodeDecodeError as ex:
+      raise ValidationError('Invalid UTF-8', start + ex.start)
+
+  def __complex(self, data, start, stop, depth):
+    depth = self.__nest(depth, start)
+    offset = start
+    for _ in range(2):
+      if offset == stop:
+        raise ValidationError('COMPLEX must hold two REAL values', start)
+      if data[offset] != 0x09:
+        raise ValidationError('COMPLEX must hold two REAL values', offset)
+      offset = self.__value(data, offset, stop, depth)[0]
+    if offset != stop:
+      raise ValidationError('COMPLEX must hold two REAL values', offset)
+
+  def __time(self, data, start, stop):
+    from .codec import encode_time, decode_time
+    content = bytes(data[start:stop])
+    try:
+      canonical = encode_time(decode_time(content))
+    except error.PyAsn1Error:
+      raise ValidationError('Bad GeneralizedTime', start)
+    if canonical != content:
+      raise ValidationError('Non-canonical GeneralizedTime', start)
+
+  def __uuid(self, data, start, stop, depth):
+    if stop - start != 16:
+      raise ValidationError('UUID must be 16 octets', start)
+
+  def __decimal(self, data, start, stop, depth):
+    depth = self.__nest(depth, start)
+    parts = []
+    offset = start
+    while offset < stop and len(parts) < 2:
+      if data[offset] != 0x02:
+        break
+      part_stop = self.__value(data, offset, stop, depth)[0]
+      parts.append(self.__decode_value(data, offset, part_stop)[0])
+      offset = part_stop
+    if len(parts) != 2 or offset != stop:
+      raise ValidationError('Decimal must hold two INTEGER values', offset)
+    coefficient, exponent = parts
+    if (coefficient and not coefficient % 10) \
+        or (not coefficient and exponent):
+      raise ValidationError('Non-canonical Decimal', start)
+    from .codec import decode_decimal
+    try:
+      decode_decimal(coefficient, exponent)
+    except error.PyAsn1Error:
+      raise ValidationError('Decimal exponent out of range', start)
+
+  def __date(self, data, start, stop, depth):
+    import datetime
+    self.__integer(data, start, stop)
+    ordinal = int.from_bytes(data[start:stop], 'big', signed = True)
+    if not 1 <= ordinal <= datetime.date.max.toordinal():
+      raise ValidationError('Date out of range', start)
+
+  def __sequence(self, data, start, stop, depth):
+    depth = self.__nest(depth, start)
+    value = self.__value
+    count = 0
+    while start < stop:
+      count = self.__count(count, start)
+      start = value(data, start, stop, depth)[0]
+
+  def __mapping(self, data, start, stop, depth):
+    depth = self.__nest(depth, start)
+    header = self.__header
+    value = self.__value
+    outer, inner = self.__pair
+    keys = []
+    while start < stop:
+      self.__count(len(keys), start)
+      ident, content, pair_stop = header(data, start, stop)
+      if ident != outer or content == pair_stop:
+        raise ValidationError('Mapping entry is not a pair', start)
+      ident, key_start, inner_stop = header(data, content, pair_stop)
+      if ident != inner or inner_stop != pair_stop or key_start == pair_stop:
+        raise ValidationError('Mapping entry is not a pair', start)
+      key_stop = value(data, key_start, pair_stop, depth)[0]
+      if key_stop == pair_stop or value(data, key_stop, pair_stop, depth)[0] \
+          != pair_stop:
+        raise ValidationError('Mapping entry is not a pair', start)
+      keys.append((key_start, key_stop))
+      start = pair_stop
+
+    if self.__sort is sorted:
+      self.__check_sorted_keys(data, keys)
+    elif self.__sort is not False:
+      self.__check_order(data, keys, [()] * len(keys), 'Mapping key')
+
+  def __check_sorted_keys(self, data, keys):
+    # Keys must be strictly ascending, which also makes them unique. Text and
+    # byte keys compare like their content octets, so they are not decoded.
+    from .codec import read_header
+    previous = None
+    for start, stop in keys:
+      if data[start] in (0x0c, 0x04):
+        content = bytes(data[read_header(data, start, stop)[1]:stop])
+        key = (data[start], content)
+      else:
+        key = (None, self.__decode_value(data, start, stop)[0])
+        try:
+          hash(key[1])
+        except TypeError:
+          raise ValidationError('Unhashable Mapping key', start)
+
+      if previous is not None:
+        if previous[0] == key[0] and key[0] is not None:
+          ordered = previous[1] < key[1]
+        else:
+          try:
+            ordered = self.__key_value(previous) < self.__key_value(key)
+          except TypeError:
+            ordered = False
+        if not ordered:
+          raise ValidationError('Mapping key out of order', start)
+      previous = key
+
+  def __key_value(self, key):
+    if key[0] == 0x0c:
+      return key[1].decode('utf8')
+    return key[1]
+
+  def __set(self, data, start, stop, depth):
+    depth = self.__nest(depth, start)
+    value = self.__value
+    items = []
+    tag_keys = []
+    while start < stop:
+      self.__count(len(items), start)
+      child_stop, key = value(data, start, stop, depth)
+      if tag_keys and key < tag_keys[-1]:
+        raise ValidationError('SET element out of tag order', start)
+      items.append((start, child_stop))
+      tag_keys.append(key)
+      start = child_stop
+
+    if self.__sort is not False:
+      self.__check_order(data, items, tag_keys, 'SET element')
+
+  def __check_order(self, data, ranges, tag_keys, label):
+    # The encoder sorts the values with the sort option, and then stable
+    # sorts them by tag key. Check that the ranges' values are unique and in
+    # that order.
+    values = []
+    seen = set()
+    for start, stop in ranges:
+      value = self.__decode_value(data, start, stop)[0]
+      try:
+        if value in seen:
+          raise ValidationError('Duplicate %s' % label, start)
+        seen.add(value)
+      except TypeError:
+        raise ValidationError('Unhashable %s' % label, start)
+      values.append(value)
+
+    if self.__sort is sorted:
+      # The encoder sorts all values before it orders them by tag, which
+      # fails for values of different types that do not compare.
+      if len(set(tag_keys)) > 1:
+        try:
+          sorted(values)
+        except TypeError:
+          raise ValidationError('%s not sortable' % label, ranges[0][0])
+
+      # Within runs of the same tag key, values must be ascending.
+      for idx in range(1, len(values)):
+        if tag_keys[idx] != tag_keys[idx - 1]:
+          continue
+        try:
+          ordered = values[idx - 1] < values[idx]
+        except TypeError:
+          ordered = False
+        if not ordered:
+          raise ValidationError('%s out of order' % label, ranges[idx][0])
+      return
+
+    # For other sort functions, compare with the encoder's order.
+    try:
+      expected = list(self.__sort(values))
+    except TypeError:
+      raise ValidationError('%s not sortable' % label, ranges[0][0])
+    positions = dict((id(value), idx) for idx, value in enumerate(values))
+    expected_keys = [tag_keys[positions[id(value)]] for value in expected]
+    order = sorted(range(len(expected)), key = expected_keys.__getitem__)
+    for idx, value in enumerate(values):
+      if expected[order[idx]] is not value:
+        raise ValidationError('%s out of order' % label, ranges[idx][0])
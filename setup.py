@@ -39,12 +39,13 @@ if __name__ == '__main__':
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         'Topic :: Security :: Cryptography',
         'Topic :: Software Development :: Libraries :: Python Modules',
       ],
@@ -55,6 +56,7 @@ if __name__ == '__main__':
       license = 'MITNFA',
       packages = find_packages(exclude = ['ez_setup', 'examples', 'tests']),
       include_package_data = True,
+      python_requires = '>=3.8',
       install_requires = [
         'six~=1.11',
         'pyasn1~=0.4',
@@ -64,6 +66,11 @@ if __name__ == '__main__':
       },
       scripts = [
       ],
+      entry_points = {
+        'console_scripts': [
+          'bran = bran.cli:main',
+        ],
+      },
       zip_safe = True,
       test_suite = 'tests',
       setup_requires = ['pytest-runner'],
@@ -175,3 +175,44 @@ def test_registry_no_callable():
     from pyasn1.type import univ
     decoded = tc.decode(univ.ObjectIdentifier([42]))
 
+
+def test_registry_compiled():
+  from bran import ASN1Transcoder
+  from pyasn1.type import univ, tag
+
+  # Registry tags are compiled when the transcoder is constructed; later
+  # changes to the registry are not picked up.
+  registry = {}
+  tc = ASN1Transcoder(registry = registry)
+  registry['[0:0:6]'] = lambda x: Foo()
+  with pytest.raises(TypeError):
+    tc.decode(univ.ObjectIdentifier([42]))
+
+  # Explicitly tagged registry values
+  tagged = univ.ObjectIdentifier([42]).subtype(
+      explicitTag = tag.Tag(tag.tagClassContext, tag.tagFormatSimple, 0x10))
+  tc = ASN1Transcoder(registry = {
+    '[0:0:6]+[128:32:16]': lambda x: 'tagged',
+  })
+  assert 'tagged' == tc.decode(tagged)
+  # Repeated lookups use the cached tag set
+  assert 'tagged' == tc.decode(tagged)
+
+
+def test_decode_subtypes(transcoder):
+  from pyasn1.type import univ, char
+
+  # Subtypes of known universal types decode as their base type
+  assert 3 == transcoder.decode(univ.Enumerated(3))
+  assert b'abc' == transcoder.decode(char.PrintableString('abc'))
+
+  # Untagged sets decode as sets
+  val = univ.Set()
+  val[0] = univ.Integer(1)
+  assert set([1]) == transcoder.decode(val)
+
+  # Untagged sequences are not known
+  val = univ.Sequence()
+  val[0] = univ.Integer(1)
+  with pytest.raises(TypeError):
+    transcoder.decode(val)
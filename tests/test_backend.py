@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Test suite for bran.backend.
+
+The conformance and differential tests run against every available backend,
+including those installed through entry points.
+"""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+from bran.backend import backends
+
+BACKENDS = [backend.name for backend in backends()]
+
+
+@pytest.fixture(params = BACKENDS)
+def backend(request):
+  return request.param
+
+
+def test_selection():
+  from bran import DERTranscoder
+  from bran.backend import get_backend, NativeBackend, PyASN1Backend
+
+  # The fastest backend is the default.
+  assert backends()[0] is get_backend()
+  assert isinstance(DERTranscoder().backend, get_backend())
+  assert backends().index(NativeBackend) < backends().index(PyASN1Backend)
+
+  assert get_backend('pyasn1') is PyASN1Backend
+  assert isinstance(DERTranscoder(backend = 'pyasn1').backend, PyASN1Backend)
+  assert isinstance(DERTranscoder(backend = NativeBackend).backend,
+      NativeBackend)
+
+  with pytest.raises(ValueError):
+    get_backend('nonexistent')
+
+
+def test_register():
+  from bran.backend import register, get_backend, Backend, NativeBackend
+  from bran import backend as module
+
+  with pytest.raises(TypeError):
+    register(object)
+  with pytest.raises(TypeError):
+    register(Backend)
+
+  @register
+  class Unavailable(NativeBackend):
+    name = 'unavailable'
+    speed = 1000
+
+    @classmethod
+    def available(cls):
+      return False
+
+  @register
+  class Faster(NativeBackend):
+    name = 'faster'
+    speed = 1000
+
+  try:
+    assert Unavailable not in backends()
+    assert get_backend() is Faster
+  finally:
+    del module._registry['unavailable']
+    del module._registry['faster']
+  assert get_backend() is not Faster
+
+
+def test_interface():
+  from bran import ASN1Transcoder
+  from bran.backend import Backend
+
+  backend = Backend(ASN1Transcoder())
+  assert Backend.available()
+  for method, arg in ((backend.encode_buffers, 1), (backend.decode, b''),
+      (backend.decode_all, b'')):
+    with pytest.raises(NotImplementedError):
+      method(arg)
+
+
+@pytest.mark.parametrize('value,expected', [
+  (None, '0500'),
+  (True, '0101ff'),
+  (False, '010100'),
+  (0, '020100'),
+  (128, '02020080'),
+  (-128, '0202ff80'),
+  (b'', '0400'),
+  (u'hä', '0c0368c3a4'),
+  (1.5, '0906033135452d31'),
+  (complex(1, -2), 'a111300f09050331452b300906032d32452b30'),
+  ((1,), 'a2053003020101'),
+  ([1], 'a3053003020101'),
+  ({u'a': 1}, 'a40c300aa20830060c0161020101'),
+  (set([2, 1]), 'a5083106020101020102'),
+])
+def test_conformance_vectors(backend, value, expected):
+  from bran import DERTranscoder
+  import binascii
+  tc = DERTranscoder(backend = backend)
+  encoded = tc.encode(value)
+  assert binascii.hexlify(encoded).decode('ascii') == expected
+  assert tc.decode(encoded) == value
+
+
+def test_conformance_nested(backend, nested_data):
+  from bran import DERTranscoder
+  tc = DERTranscoder(backend = backend)
+  encoded = tc.encode(nested_data)
+  assert encoded == DERTranscoder(backend = 'pyasn1').encode(nested_data)
+  assert tc.decode(encoded) == nested_data
+  assert tc.decode(bytearray(encoded)) == nested_data
+  assert tc.decode(memoryview(encoded)) == nested_data
+
+  # Trailing data is ignored by decode(), and read by decode_all()
+  assert tc.decode(encoded + encoded) == nested_data
+  assert list(tc.decode_all(encoded * 3)) == [nested_data] * 3
+  assert list(tc.decode_all(b'')) == []
+
+  out = []
+  assert tc.encode_into(nested_data, out.append) == len(encoded)
+  assert b''.join(out) == encoded
+
+
+def test_conformance_options(backend):
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.frozen import FrozenDict, FrozenList
+  from pyasn1.type import univ
+
+  value = {u'a': [1, {u'b': set([2])}]}
+  tc = DERTranscoder(ASN1Transcoder(frozen = True), backend = backend)
+  decoded = tc.decode(tc.encode(value))
+  assert decoded == value
+  assert isinstance(decoded, FrozenDict)
+  assert isinstance(decoded[u'a'], FrozenList)
+  assert isinstance(decoded[u'a'][1][u'b'], frozenset)
+
+  class Foo(object):
+    pass
+
+  registry = {
+    Foo: lambda x: univ.ObjectIdentifier([1, 2, 42]),
+    '[0:0:6]': lambda x: tuple(x),
+  }
+  tc = DERTranscoder(ASN1Transcoder(registry = registry), backend = backend)
+  encoded = tc.encode([Foo(), 1])
+  assert encoded == DERTranscoder(ASN1Transcoder(registry = registry),
+      backend = 'pyasn1').encode([Foo(), 1])
+  assert tc.decode(encoded) == [(1, 2, 42), 1]
+
+
+@pytest.mark.parametrize('data', [
+  b'\x02',
+  b'\x02\x05\x01',
+  b'\xa3\x05\x30\x03\x02\x01',
+])
+def test_conformance_errors(backend, data):
+  from bran import DERTranscoder
+  from pyasn1.error import PyAsn1Error
+  with pytest.raises(PyAsn1Error):
+    DERTranscoder(backend = backend).decode(data)
+
+
+class _Oid(object):
+  # A registry type, encoded as an OBJECT IDENTIFIER.
+
+  def __init__(self, arcs):
+    self.arcs = arcs
+
+
+def _encode_oid(value):
+  from pyasn1.type import univ
+  return univ.ObjectIdentifier(value.arcs)
+
+
+# Transcoder options the differential test runs with.
+OPTION_SETS = {
+  'default': {},
+  'stdlib_types': { 'stdlib_types': True },
+  'frozen': { 'frozen': True },
+  'registry': { 'registry': {
+    _Oid: _encode_oid,
+    '[0:0:6]': lambda value: tuple(value),
+  } },
+  'limits': { 'max_depth': 3, 'max_items': 4, 'max_length': 6,
+    'max_total': 80 },
+}
+
+
+def _random_value(rng, depth, extras = ()):
+  # Generate a nested value that every backend must handle identically.
+  scalars = (
+    lambda: None,
+    lambda: rng.random() < 0.5,
+    lambda: rng.randint(-2 ** 70, 2 ** 70),
+    lambda: rng.randint(-300, 300),
+    lambda: rng.uniform(-1e6, 1e6),
+    lambda: complex(rng.randint(-9, 9), rng.uniform(-1, 1)),
+    lambda: _random_text(rng),
+    lambda: _random_text(rng).encode('utf8'),
+  ) + tuple(extras)
+  if depth <= 0 or rng.random() < 0.4:
+    return rng.choice(scalars)()
+
+  size = rng.randint(0, 5)
+  kind = rng.randint(0, 3)
+  if kind == 0:
+    return [_random_value(rng, depth - 1, extras) for _ in range(size)]
+  if kind == 1:
+    return tuple(_random_value(rng, depth - 1, extras) for _ in range(size))
+
+  # Mapping keys and set items need a common type to sort.
+  item = rng.choice((
+    lambda: rng.randint(-1000, 1000),
+    lambda: _random_text(rng),
+    lambda: _random_text(rng).encode('utf8'),
+  ))
+  if kind == 2:
+    return dict((item(), _random_value(rng, depth - 1, extras))
+                for _ in range(size))
+  return set(item() for _ in range(size))
+
+
+def _random_text(rng):
+  alphabet = u'abcxyz äöü€\U0001f600'
+  return u''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+
+
+def _extras(rng, options):
+  # Generators for the scalar types that the options add.
+  import datetime, decimal, uuid
+  extras = []
+  if options.get('stdlib_types', False):
+    utc = datetime.timezone.utc
+    extras += [
+      lambda: datetime.datetime(2000, 1, 1, tzinfo = utc)
+          + datetime.timedelta(seconds = rng.randint(0, 10 ** 9),
+                               microseconds = rng.randint(0, 999999)),
+      lambda: datetime.date.fromordinal(rng.randint(1, 10 ** 6)),
+      lambda: uuid.UUID(int = rng.getrandbits(128)),
+      lambda: decimal.Decimal(rng.randint(-10 ** 9, 10 ** 9)).scaleb(
+          rng.randint(-20, 20)),
+    ]
+  if 'registry' in options:
+    extras.append(lambda: _Oid((1, rng.randint(0, 39),
+        rng.randint(0, 2 ** 40))))
+  return extras
+
+
+def _decode(tc, data):
+  # Return the decoded value, or the message of a LimitExceeded error.
+  from bran.codec import LimitExceeded
+  try:
+    return tc.decode(data)
+  except LimitExceeded as ex:
+    return str(ex)
+
+
+@pytest.mark.parametrize('options', sorted(OPTION_SETS))
+@pytest.mark.parametrize('seed', range(20))
+def test_differential(seed, options):
+  # All backends must agree byte for byte on encodings, and on the values
+  # decoded from each other's output, for each set of transcoder options.
+  import random
+  from bran import DERTranscoder, ASN1Transcoder
+
+  rng = random.Random(seed)
+  options = OPTION_SETS[options]
+  transcoders = [DERTranscoder(ASN1Transcoder(**options), backend = name)
+                 for name in BACKENDS]
+  extras = _extras(rng, options)
+  for _ in range(10):
+    value = _random_value(rng, 4, extras)
+    encodings = [tc.encode(value) for tc in transcoders]
+    assert len(set(encodings)) == 1, value
+
+    # REAL values are stored in base 10, so floats need not survive the
+    # round trip exactly; all backends must lose the same precision, though.
+    decoded = [_decode(tc, encodings[0]) for tc in transcoders]
+    assert all(item == decoded[0] and type(item) is type(decoded[0])
+               for item in decoded), value
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.blob."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+DATA = bytes(bytearray(range(256))) * 1000
+
+
+class _Stream(object):
+  # An unseekable stream
+  def __init__(self, data):
+    import io
+    self.__buf = io.BytesIO(data)
+
+  def seekable(self):
+    return False
+
+  def read(self, size):
+    return self.__buf.read(size)
+
+
+@pytest.fixture
+def blob_file(tmpdir):
+  path = tmpdir.join('blob')
+  path.write_binary(DATA)
+  return str(path)
+
+
+def test_path(blob_file):
+  from bran.blob import BlobRef
+  blob = BlobRef(blob_file, chunk_size = 1000)
+  assert len(blob) == len(DATA)
+  chunks = list(blob.chunks())
+  assert max(len(chunk) for chunk in chunks) == 1000
+  assert b''.join(chunks) == DATA
+
+  # Paths can be read again
+  assert blob.read() == DATA
+
+  # Partial
+  assert BlobRef(blob_file, 10).read() == DATA[:10]
+
+
+def test_fileobj():
+  import io
+  from bran.blob import BlobRef
+  fileobj = io.BytesIO(DATA)
+  fileobj.seek(100)
+  blob = BlobRef(fileobj)
+  assert len(blob) == len(DATA) - 100
+  assert blob.read() == DATA[100:]
+  # Reads start from the original position
+  assert blob.read() == DATA[100:]
+  assert 'BlobRef(' in repr(blob)
+
+
+def test_unseekable():
+  from bran.blob import BlobRef
+  with pytest.raises(ValueError):
+    BlobRef(_Stream(DATA))
+
+  blob = BlobRef(_Stream(DATA), 300)
+  assert blob.read() == DATA[:300]
+
+
+def test_short(blob_file):
+  from bran.blob import BlobRef
+  blob = BlobRef(blob_file, len(DATA) + 1)
+  with pytest.raises(ValueError):
+    blob.read()
+
+
+def test_encode(blob_file):
+  from bran import DERTranscoder, ASN1Transcoder, dumps
+  from bran.blob import BlobRef
+  value = {'name': 'blob', 'data': [BlobRef(blob_file), 42]}
+  expected = dumps({'name': 'blob', 'data': [DATA, 42]})
+
+  dt = DERTranscoder()
+  assert dt.encode(value) == expected
+  buffers = dt.encode_buffers(value)
+  assert all(isinstance(buf, (bytes, bytearray, memoryview))
+      for buf in buffers)
+  assert b''.join(buffers) == expected
+
+  out = []
+  assert dt.encode_into(value, out.append) == len(expected)
+  assert b''.join(out) == expected
+  # The blob is passed on in chunks
+  assert max(len(chunk) for chunk in out) <= 1 << 16
+
+  # The pyasn1 based transcoder reads the blob
+  from pyasn1.codec.der import encoder
+  asn1 = ASN1Transcoder().encode(BlobRef(blob_file))
+  assert encoder.encode(asn1) == dumps(DATA)
+
+
+def test_small_blobs(blob_file):
+  # Small blobs are not merged with the surrounding buffers
+  from bran import DERTranscoder, dumps
+  from bran.blob import BlobRef
+  value = [BlobRef(blob_file, 5), b'x', BlobRef(blob_file, 0)]
+  dt = DERTranscoder()
+  assert dt.encode(value) == dumps([DATA[:5], b'x', b''])
+
+  out = []
+  dt.encode_into(value, out.append)
+  assert b''.join(out) == dumps([DATA[:5], b'x', b''])
+
+
+def test_hash(blob_file):
+  from bran.hash import hasher
+  from bran.blob import BlobRef
+  expected = hasher({'data': DATA}).digest()
+  assert hasher({'data': BlobRef(blob_file)}).digest() == expected
+
+  with open(blob_file, 'rb') as fileobj:
+    assert hasher({'data': BlobRef(fileobj)}).digest() == expected
+
+  assert hasher({'data': BlobRef(_Stream(DATA), len(DATA))}).digest() \
+      == expected
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.cli."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import json
+
+import pytest
+
+
+RECORDS = [
+  { u'id': idx, u'name': u'record %d' % idx, u'values': [idx, 1.5, None],
+    u'ok': idx % 2 == 0 }
+  for idx in range(25)
+]
+
+
+@pytest.fixture
+def jsonl(tmpdir):
+  path = tmpdir.join('records.jsonl')
+  path.write(u'\n'.join(json.dumps(record) for record in RECORDS) + u'\n\n')
+  return str(path)
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_roundtrip(jsonl, tmpdir, capsys, jobs):
+  import bran
+  from bran.cli import main
+
+  der = str(tmpdir.join('records.der'))
+  assert main(['encode', jsonl, '-o', der, '--batch', '7', '-j', jobs]) == 0
+  with open(der, 'rb') as fileobj:
+    assert list(bran.DERTranscoder().decode_all(fileobj.read())) == RECORDS
+  assert '25 records' in capsys.readouterr().err
+
+  out = str(tmpdir.join('records.out'))
+  assert main(['decode', der, '-o', out, '-j', jobs, '-q']) == 0
+  with open(out) as fileobj:
+    assert [json.loads(line) for line in fileobj] == RECORDS
+  assert capsys.readouterr().err == ''
+
+
+def test_hash_verify(jsonl, tmpdir, capsys):
+  import bran
+  from bran.cli import main
+
+  der = str(tmpdir.join('records.der'))
+  main(['encode', jsonl, '-o', der, '-q'])
+
+  digests = str(tmpdir.join('digests'))
+  assert main(['hash', der, '-o', digests, '-q']) == 0
+  with open(digests) as fileobj:
+    lines = fileobj.read().split()
+  assert lines == [bran.digest(record).hex() for record in RECORDS]
+
+  # JSON input gives the same digests
+  assert main(['hash', jsonl, '-f', 'json', '-q', '--batch', '4']) == 0
+  assert capsys.readouterr().out.split() == lines
+
+  assert main(['verify', der, digests, '-q']) == 0
+  assert main(['verify', jsonl, digests, '-f', 'json', '-q']) == 0
+  assert main(['verify', der, digests, '--hash', 'sha256', '-q']) == 1
+  assert 'Record 0: digest mismatch' in capsys.readouterr().err
+
+  with open(digests, 'w') as fileobj:
+    fileobj.write(u'\n'.join(lines[:-1]))
+  assert main(['verify', der, digests, '-q']) == 1
+  assert 'Record count differs' in capsys.readouterr().err
+
+
+def test_stdin(monkeypatch, capsys):
+  import io
+  import bran
+  from bran.cli import main
+
+  class Stdin(object):
+    buffer = io.BytesIO(b''.join(bran.dumps(record) for record in RECORDS))
+
+  monkeypatch.setattr('sys.stdin', Stdin)
+  assert main(['decode', '-q']) == 0
+  out = capsys.readouterr().out
+  assert [json.loads(line) for line in out.splitlines()] == RECORDS
+
+
+def test_read_der_records():
+  import io
+  import bran
+  from bran.cli import read_der_records
+
+  data = b''.join(bran.dumps(record) for record in RECORDS)
+  records = list(read_der_records(io.BytesIO(data), chunk_size = 10))
+  assert [bran.loads(record) for record in records] == RECORDS
+
+  with pytest.raises(ValueError):
+    list(read_der_records(io.BytesIO(data[:-1]), chunk_size = 10))
+
+
+def test_jsonable(tmpdir, capsys):
+  import bran
+  from bran.cli import main
+
+  der = str(tmpdir.join('values.der'))
+  values = [b'\x00\x01', set([3, 1, 2]), set([1, u'a']), 1 + 2j,
+            (1, [2])]
+  with open(der, 'wb') as fileobj:
+    tc = bran.DERTranscoder(bran.ASN1Transcoder(sort = False))
+    for value in values:
+      fileobj.write(tc.encode(value))
+  assert main(['decode', der, '-q']) == 0
+  lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+  assert lines[:2] == [u'AAE=', [1, 2, 3]]
+  assert sorted(lines[2], key = str) == [1, u'a']
+  assert lines[3:] == [[1.0, 2.0], [1, [2]]]
+
+  # Mapping keys JSON does not know are converted to strings
+  values = [{ b'k': 1 }, { (1, 2): 3, (1, b'x'): [{ b'\xff': None }] },
+            { 1: u'a', u'b': 2 }, { 1j: 1 }, { 2: 3 }]
+  with open(der, 'wb') as fileobj:
+    tc = bran.DERTranscoder(bran.ASN1Transcoder(sort = False))
+    for value in values:
+      fileobj.write(tc.encode(value))
+  assert main(['decode', der, '-q']) == 0
+  lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+  assert lines == [
+    { u'aw==': 1 },
+    { u'[1, 2]': 3, u'[1, "eA=="]': [{ u'/w==': None }] },
+    { u'1': u'a', u'b': 2 },
+    { u'[0.0, 1.0]': 1 },
+    { u'2': 3 },
+  ]
+
+  from bran.cli import _jsonable
+  with pytest.raises(TypeError):
+    _jsonable(object())
+
+
+@pytest.mark.parametrize('args', [
+  ['-j', '0'], ['-j', '-2'], ['--jobs', 'x'], ['--batch', '0'],
+])
+def test_bad_counts(jsonl, capsys, args):
+  from bran.cli import main
+  with pytest.raises(SystemExit) as exc:
+    main(['encode', jsonl] + args)
+  assert exc.value.code == 2
+  assert 'expected a positive integer' in capsys.readouterr().err
+
+
+def test_main_module(monkeypatch, capsys):
+  import runpy
+  monkeypatch.setattr('sys.argv', ['bran', '--help'])
+  with pytest.raises(SystemExit) as exc:
+    runpy.run_module('bran', run_name = '__main__')
+  assert exc.value.code == 0
+  assert 'encode' in capsys.readouterr().out
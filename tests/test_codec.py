@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.codec."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+
+def pyasn1_encode(value):
+  # Reference encoding via ASN1Transcoder and pyasn1
+  from bran import ASN1Transcoder
+  from pyasn1.codec.der import encoder
+  return encoder.encode(ASN1Transcoder().encode(value))
+
+
+def pyasn1_decode(data):
+  # Reference decoding via pyasn1 and ASN1Transcoder
+  from bran import ASN1Transcoder
+  from pyasn1.codec.der import decoder
+  return ASN1Transcoder().decode(decoder.decode(data)[0])
+
+
+def random_floats(count):
+  import random, struct
+  rng = random.Random(42)
+  ret = []
+  while len(ret) < count:
+    value = rng.choice([
+      rng.random() * 10 ** rng.randint(-30, 30),
+      round(rng.random() * 1000, rng.randint(0, 4)),
+      struct.unpack('<d', struct.pack('<Q', rng.getrandbits(64)))[0],
+    ])
+    if value == value:
+      ret.append(value)
+  return ret
+
+
+@pytest.mark.parametrize('value', [
+  0.0, -0.0, 1.0, -1.0, 0.1, 3.1415, 42.0, 2147483648.0, 1e300, -1e-300,
+  5e-324, 1.7976931348623157e308, float('inf'), float('-inf'),
+] + random_floats(200))
+def test_real(value):
+  from bran.codec import encode_real, decode_real, read_header
+
+  # The fast path must produce the same bytes and values as pyasn1
+  encoded = pyasn1_encode(value)
+  _, start, end = read_header(encoded, 0, len(encoded))
+  assert encoded[start:end] == encode_real(value)
+
+  decoded = decode_real(encode_real(value))
+  expected = pyasn1_decode(encoded)
+  assert repr(decoded) == repr(expected)
+
+
+def test_real_nan():
+  from bran.codec import encode_real
+  with pytest.raises(ValueError):
+    pyasn1_encode(float('nan'))
+  with pytest.raises(ValueError):
+    encode_real(float('nan'))
+
+
+@pytest.mark.parametrize('content', [
+  b'\x01123', b'\x02-12.5', b'\x031E400', b'\x03-1E400', b'\x030E0',
+  b'\x80\x01\x03', b'\xc0\xff\x03', b'\x94\x01\x03', b'\xa3\x01\x01\x05',
+  b'\x83\x01\x02\x05',
+])
+def test_real_decode_forms(content):
+  # Forms that bran does not produce must still decode as with pyasn1
+  from bran.codec import decode_real, encode_length
+  data = b'\x09' + encode_length(len(content)) + content
+  assert repr(decode_real(content)) == repr(pyasn1_decode(data))
+
+
+@pytest.mark.parametrize('content', [
+  b'\x80\x01', b'\xb0\x01\x01', b'\x00abc', b'\x03abc', b'\x04',
+  # Truncated exponent length, and values beyond the float range
+  b'\x83', b'\x82\x7f\xff\xff\x01', b'\x01' + b'9' * 400,
+])
+def test_real_decode_errors(content):
+  from pyasn1.error import PyAsn1Error
+  from bran.codec import decode_real
+  with pytest.raises(PyAsn1Error):
+    decode_real(content)
+
+
+@pytest.mark.parametrize('value', [
+  None, True, False, 0, -128, 2 ** 70, b'', b'abc', u'hällo', 3.1415,
+  complex(1, -2), (1, [2, (3,)]), { 1: set([1, 2]), 3: { 4: 5 } },
+  set([1, b'a', u'x', None, (1, 2), 2.5, 1j]),
+  u'x' * 1000, b'y' * 70000,
+])
+def test_decoder(value):
+  from bran import ASN1Transcoder
+  from bran.codec import Decoder
+  from pyasn1.codec.der import encoder
+
+  data = encoder.encode(ASN1Transcoder(sort = False).encode(value))
+  decoder = Decoder(ASN1Transcoder())
+  assert decoder.decode(data) == pyasn1_decode(data)
+
+  # Other buffer types work the same
+  assert decoder.decode(bytearray(data)) == decoder.decode(data)
+  assert decoder.decode(memoryview(data)) == decoder.decode(data)
+
+
+def test_decoder_fallback():
+  from bran import ASN1Transcoder
+  from bran.codec import Decoder, UnknownTag
+  from pyasn1.type import univ
+  from pyasn1.codec.der import encoder
+
+  class Foo(object):
+    pass
+
+  tc = ASN1Transcoder(registry = {
+    '[0:0:6]': lambda x: Foo,
+  })
+  decoder = Decoder(tc)
+
+  data = encoder.encode(univ.ObjectIdentifier([1, 2, 42]))
+  data = b'\xa3\x06\x30\x04' + data
+  assert decoder.decode(data) == [Foo]
+
+  # Untagged sequences are not known
+  with pytest.raises(UnknownTag):
+    decoder.decode(b'\x30\x03\x02\x01\x01')
+
+
+@pytest.mark.parametrize('data,offset', [
+  # Universal SEQUENCE and SET, an OBJECT IDENTIFIER, and unknown context tags
+  (b'\x30\x03\x02\x01\x01', 0),
+  (b'\x31\x03\x02\x01\x01', 0),
+  (b'\x06\x01\x2a', 0),
+  (b'\xa9\x03\x02\x01\x01', 0),
+  (b'\x89\x01\x01', 0),
+  # Builtin tags with unexpected content
+  (b'\xa3\x00', 0),
+  (b'\xa3\x02\x31\x00', 0),
+  (b'\xa3\x05\x30\x00\x02\x01\x01', 0),
+  # Nested in a builtin container
+  (b'\xa3\x09\x30\x07\x02\x01\x01\x30\x02\x05\x00', 7),
+  # Registry prefixes that do not complete a registry tag set
+  (b'\xaa\x00', 0),
+  (b'\xaa\x03\x02\x01\x01', 0),
+  (b'\xaa\x05\x30\x00\x02\x01\x01', 0),
+  (b'\x8a\x00', 0),
+])
+def test_decoder_unknown_tags(data, offset):
+  # Tags that are neither builtin nor registered are rejected by their
+  # header, without passing them to pyasn1.
+  from bran import ASN1Transcoder
+  from bran.codec import Decoder, UnknownTag
+  from pyasn1.error import PyAsn1Error
+
+  decoder = Decoder(ASN1Transcoder(registry = {
+    '[0:32:16]+[128:32:10]': lambda value: list(value),
+  }))
+  with pytest.raises(UnknownTag) as exc:
+    decoder.decode(data)
+  assert exc.value.offset == offset
+  assert isinstance(exc.value, PyAsn1Error)
+  assert str(exc.value).endswith('at offset %d' % offset)
+
+
+def test_check_limits():
+  # check_limits() fails where decoding would, but decodes nothing.
+  from bran import ASN1Transcoder
+  from bran.codec import Decoder, LimitExceeded
+
+  data = b'\xa3\x0b\x30\x09\x02\x01\x01\x02\x01\x02\x02\x01\x03'
+  assert Decoder(ASN1Transcoder()).check_limits(data) == len(data)
+  decoder = Decoder(ASN1Transcoder(max_items = 3, max_total = 3))
+  assert decoder.check_limits(memoryview(data + data), len(data)) \
+      == 2 * len(data)
+  with pytest.raises(LimitExceeded) as exc:
+    Decoder(ASN1Transcoder(max_items = 2)).check_limits(data)
+  assert exc.value.offset == 10
+
+  # Unknown tags and malformed mapping entries are left to the decoder, but
+  # their content is still checked.
+  decoder = Decoder(ASN1Transcoder(max_depth = 2, max_items = 2))
+  assert decoder.check_limits(b'\x30\x03\x02\x01\x01') == 5
+  for data, offset in (
+      (b'\x30\x09\x02\x01\x01\x02\x01\x02\x02\x01\x03', 8),
+      (b'\xa4\x0b\x30\x09\x02\x01\x01\x02\x01\x02\x02\x01\x03', 10),
+      (b'\xa4\x0a\x30\x08\xa3\x06\x30\x04\xa3\x02\x30\x00', 12)):
+    with pytest.raises(LimitExceeded) as exc:
+      decoder.check_limits(data)
+    assert exc.value.offset == offset
+
+
+@pytest.mark.parametrize('data', [
+  b'', b'\x02', b'\x02\x02\x01', b'\x02\x82\x01', b'\x1f', b'\x1f\x81',
+  b'\x1f\x81\x01',
+])
+def test_decoder_underrun(data):
+  from bran import ASN1Transcoder
+  from bran.codec import Decoder
+  from pyasn1.error import SubstrateUnderrunError
+  with pytest.raises(SubstrateUnderrunError):
+    Decoder(ASN1Transcoder()).decode(data)
+
+
+@pytest.mark.parametrize('data', [
+  b'\x05\x01\x00', b'\x01\x02\x00\x00', b'\x01\x01\x01', b'\x02\x80\x00\x00',
+])
+def test_decoder_errors(data):
+  from bran import ASN1Transcoder
+  from bran.codec import Decoder
+  from pyasn1.error import PyAsn1Error
+  with pytest.raises(PyAsn1Error):
+    Decoder(ASN1Transcoder()).decode(data)
+
+
+@pytest.mark.parametrize('value,content', [
+  ((2024, 5, 6, 7, 8, 9, 0), b'20240506070809Z'),
+  ((2024, 5, 6, 7, 8, 9, 120000), b'20240506070809.12Z'),
+  ((1, 1, 1, 0, 0, 0, 1), b'00010101000000.000001Z'),
+])
+def test_time(value, content):
+  import datetime
+  from bran.codec import encode_time, decode_time
+
+  utc = datetime.timezone.utc
+  dt = datetime.datetime(*value, tzinfo = utc)
+  assert encode_time(dt) == content
+  assert decode_time(content) == dt
+  assert decode_time(content).tzinfo is utc
+
+  # Other time zones are converted to UTC
+  local = dt.astimezone(datetime.timezone(datetime.timedelta(hours = 5)))
+  assert encode_time(local) == content
+
+
+def test_time_errors():
+  import datetime
+  from bran.codec import encode_time, decode_time
+  from pyasn1.error import PyAsn1Error
+
+  with pytest.raises(ValueError):
+    encode_time(datetime.datetime(2024, 1, 1))
+  for content in (b'20240506070809', b'202405060708Z', b'20241306070809Z',
+      b'20240506070809.1234567Z', b'\xff'):
+    with pytest.raises(PyAsn1Error):
+      decode_time(content)
+
+
+@pytest.mark.parametrize('text,parts', [
+  ('1.50', (15, -1)),
+  ('1.5', (15, -1)),
+  ('-12E+3', (-12, 3)),
+  ('1200', (12, 2)),
+  ('0', (0, 0)),
+  ('-0.000', (0, 0)),
+  ('1E-30', (1, -30)),
+  ('12345678901234567890123456789012345', (12345678901234567890123456789012345,
+      0)),
+])
+def test_decimal_parts(text, parts):
+  import decimal
+  from bran.codec import decimal_parts, decode_decimal
+
+  value = decimal.Decimal(text)
+  assert decimal_parts(value) == parts
+  assert decode_decimal(*parts) == value
+
+
+def test_decimal_parts_errors():
+  import decimal
+  from bran.codec import decimal_parts
+  for text in ('NaN', 'Infinity', '-Infinity', 'sNaN'):
+    with pytest.raises(ValueError):
+      decimal_parts(decimal.Decimal(text))
+
+
+def test_decimal_parts_long():
+  # More digits than int() and str() convert by default
+  import decimal
+  from bran.codec import decimal_parts, decode_decimal
+
+  for text, parts in (
+      ('1' * 5000, ((10 ** 5000 - 1) // 9, 0)),
+      ('-' + '9' * 6000 + '0' * 10 + 'E-7', (1 - 10 ** 6000, 3))):
+    value = decimal.Decimal(text)
+    assert decimal_parts(value) == parts
+    assert decode_decimal(*parts) == value
+
+
+@pytest.mark.parametrize('exponent', [10 ** 18, -10 ** 19, 2 ** 64])
+def test_decode_decimal_errors(exponent):
+  from bran.codec import decode_decimal
+  from pyasn1.error import PyAsn1Error
+  with pytest.raises(PyAsn1Error):
+    decode_decimal(1, exponent)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.container."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+
+def records(count):
+  return [{ u'id': idx, u'name': u'record %d' % idx, u'data': b'x' * idx }
+          for idx in range(count)]
+
+
+@pytest.mark.parametrize('compression', ['zlib', 'lzma', 'none'])
+def test_roundtrip(compression, tmpdir):
+  from bran.container import BlockWriter, BlockReader
+
+  path = str(tmpdir.join('test.bran'))
+  values = records(200)
+  with BlockWriter(path, block_size = 1024, compression = compression) as w:
+    for value in values:
+      w.write(value)
+
+  with BlockReader(path, workers = 2) as reader:
+    assert list(reader) == values
+    assert reader.records == len(values)
+    assert len(reader.blocks) > 1
+    assert sum(block[3] for block in reader.blocks) == len(values)
+
+    # Random access
+    assert reader[0] == values[0]
+    assert reader[123] == values[123]
+    assert reader[-1] == values[-1]
+    with pytest.raises(IndexError):
+      reader[len(values)]
+
+    # Iterating again after random access works
+    assert list(reader) == values
+
+
+def test_stream():
+  # Sequential reading does not need to seek.
+  import io
+  from bran import dumps
+  from bran.container import BlockWriter, BlockReader
+
+  out = io.BytesIO()
+  values = records(50)
+  writer = BlockWriter(out, block_size = 256)
+  for value in values[:-1]:
+    writer.write(value)
+  writer.block_size = 1
+  writer.write_encoded(dumps(values[-1]))
+  writer.close()
+  writer.close()
+
+  class Unseekable(object):
+    def __init__(self, data):
+      self.__data = io.BytesIO(data)
+
+    def read(self, size):
+      return self.__data.read(size)
+
+  reader = BlockReader(Unseekable(out.getvalue()))
+  assert list(reader) == values
+
+
+def test_empty():
+  import io
+  from bran.container import BlockWriter, BlockReader
+
+  out = io.BytesIO()
+  BlockWriter(out).close()
+
+  reader = BlockReader(io.BytesIO(out.getvalue()))
+  assert list(reader) == []
+  assert reader.records == 0
+
+
+def test_errors(tmpdir):
+  import io
+  from bran.container import BlockWriter, BlockReader
+
+  with pytest.raises(ValueError):
+    BlockWriter(io.BytesIO(), compression = 'foo')
+
+  # An existing file is left alone
+  path = tmpdir.join('existing')
+  path.write_binary(b'keep')
+  with pytest.raises(ValueError):
+    BlockWriter(str(path), compression = 'foo')
+  assert path.read_binary() == b'keep'
+
+  with pytest.raises(ValueError):
+    BlockReader(io.BytesIO(b'not a container'))
+
+  out = io.BytesIO()
+  with BlockWriter(out) as writer:
+    writer.write(42)
+  data = out.getvalue()
+
+  # Truncated data
+  with pytest.raises(ValueError):
+    list(BlockReader(io.BytesIO(data[:15])))
+
+  # Bad footer
+  with pytest.raises(ValueError):
+    BlockReader(io.BytesIO(data[:-1] + b'\x00')).records
@@ -18,3 +18,310 @@ def test_nested(transcoder, nested_data):
   decoded = transcoder.decode(transcoder.encode(nested_data))
   assert decoded == nested_data
 
+
+def test_encode_buffers(transcoder, nested_data):
+  # The concatenated buffers must be identical to the regular encoding.
+  buffers = transcoder.encode_buffers(nested_data)
+  assert b''.join(buffers) == transcoder.encode(nested_data)
+
+
+@pytest.mark.parametrize('value', [
+  None, True, False, 0, 127, 128, -128, -129, 2 ** 100, -2 ** 100,
+  b'', u'', u'hällo', 3.1415, complex(1, -2),
+  b'x' * 200, u'y' * 70000,
+  -256, -2 ** 64, set([b'zz', b'a']),
+  { 1: [2, (3,)], 2: { u'a': set([4]) } },
+])
+def test_encode_buffers_values(transcoder, value):
+  assert b''.join(transcoder.encode_buffers(value)) == transcoder.encode(value)
+
+  # Encoding must produce the same result as pyasn1
+  from bran import ASN1Transcoder
+  from pyasn1.codec.der import encoder
+  assert transcoder.encode(value) == encoder.encode(
+      ASN1Transcoder().encode(value))
+
+
+def test_encode_buffers_references():
+  from bran import DERTranscoder
+  transcoder = DERTranscoder(threshold = 16)
+
+  blob = b'x' * 32
+  view = memoryview(bytearray(b'y' * 64))
+  buffers = transcoder.encode_buffers({ u'blob': blob, u'view': view,
+    u'small': b'z' })
+
+  # Large payloads are passed by reference; everything else is coalesced.
+  assert blob in buffers
+  assert any(buf is blob for buf in buffers)
+  assert any(buf is view for buf in buffers)
+  assert len(buffers) == 4
+
+  expected = transcoder.encode({ u'blob': blob, u'view': view.tobytes(),
+    u'small': b'z' })
+  assert b''.join(buffers) == expected
+
+  # Multi-dimensional views are flattened
+  view = memoryview(bytearray(range(6))).cast('B', (2, 3))
+  assert b''.join(transcoder.encode_buffers(view)) \
+      == transcoder.encode(bytes(range(6)))
+
+
+def test_encode_into(transcoder, nested_data):
+  import hashlib
+  expected = transcoder.encode(nested_data)
+
+  h = hashlib.sha256()
+  written = transcoder.encode_into(nested_data, h.update)
+  assert written == len(expected)
+  assert h.digest() == hashlib.sha256(expected).digest()
+
+
+def test_encode_buffers_registry():
+  from bran import ASN1Transcoder, DERTranscoder
+  from pyasn1.type import univ
+
+  class Foo(object):
+    pass
+
+  transcoder = DERTranscoder(ASN1Transcoder(registry = {
+    Foo: lambda x: univ.ObjectIdentifier([1, 2, 42]),
+  }, sort = False))
+
+  # DER orders mixed SET components by tag
+  value = [Foo(), set([Foo(), 3, None, b'a', u'x', (1, 2), frozenset([3]), 2.5,
+      1j])]
+  assert b''.join(transcoder.encode_buffers(value)) == transcoder.encode(value)
+
+
+def test_dumps_loads(nested_data):
+  import bran
+  encoded = bran.dumps(nested_data)
+  assert encoded == bran.DERTranscoder().encode(nested_data)
+  assert bran.loads(encoded) == nested_data
+
+  # The default transcoder is cached
+  assert bran.default_transcoder() is bran.default_transcoder()
+
+  # Custom transcoders can be passed
+  tc = bran.DERTranscoder(bran.ASN1Transcoder(sort = reversed))
+  assert bran.dumps([1], tc) == tc.encode([1])
+  assert bran.loads(bran.dumps([1], tc), tc) == [1]
+
+
+def test_decode_all(transcoder, nested_data):
+  values = [nested_data, 42, [u'x']]
+  data = b''.join(transcoder.encode(value) for value in values)
+  assert list(transcoder.decode_all(data)) == values
+  assert list(transcoder.decode_all(bytearray(data))) == values
+  assert list(transcoder.decode_all(b'')) == []
+
+
+@pytest.mark.parametrize('limits,value', [
+  ({ 'max_size': 10 }, [u'x' * 10]),
+  ({ 'max_depth': 2 }, [[[1]]]),
+  ({ 'max_depth': 2 }, { 1: { 2: { 3: 4 } } }),
+  ({ 'max_depth': 1 }, [1j]),
+  ({ 'max_items': 3 }, [1, 2, 3, 4]),
+  ({ 'max_items': 3 }, { 1: 2, 3: 4, 5: 6, 7: 8 }),
+  ({ 'max_items': 3 }, set([1, 2, 3, 4])),
+  ({ 'max_length': 10 }, { u'a': u'x' * 11 }),
+  ({ 'max_length': 10 }, [b'x' * 11]),
+  ({ 'max_total': 20 }, [b'x' * 10, u'y' * 10, 1]),
+  ({ 'max_total': 20 }, [2 ** 200]),
+])
+@pytest.mark.parametrize('backend', ['native', 'pyasn1'])
+def test_limits(limits, value, backend):
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.codec import LimitExceeded
+  from pyasn1.error import PyAsn1Error
+
+  tc = DERTranscoder(ASN1Transcoder(**limits), backend = backend)
+  data = tc.encode(value)
+  with pytest.raises(LimitExceeded) as exc:
+    tc.decode(data)
+  assert isinstance(exc.value, PyAsn1Error)
+  assert 0 <= exc.value.offset < len(data)
+  assert str(exc.value).endswith('at offset %d' % exc.value.offset)
+  with pytest.raises(LimitExceeded) as native:
+    DERTranscoder(tc.inner).decode(data)
+  assert str(exc.value) == str(native.value)
+  with pytest.raises(LimitExceeded):
+    list(tc.decode_all(data + data))
+
+  # Raising the limits by one step lets the value through.
+  raised = dict((key, limit + 1) for key, limit in limits.items())
+  if 'max_size' in raised:
+    raised['max_size'] = len(data)
+  if 'max_total' in raised:
+    raised['max_total'] = len(data)
+  assert DERTranscoder(ASN1Transcoder(**raised),
+      backend = backend).decode(data) == value
+
+
+@pytest.mark.parametrize('backend', ['native', 'pyasn1'])
+def test_limits_decode_all(backend):
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.codec import LimitExceeded
+
+  # The size limit applies to the buffer, the others to each record.
+  data = b''.join(DERTranscoder().encode([b'x' * 10]) for _ in range(3))
+  tc = DERTranscoder(ASN1Transcoder(max_total = 10, max_size = len(data)),
+      backend = backend)
+  assert list(tc.decode_all(data)) == [[b'x' * 10]] * 3
+
+  tc = DERTranscoder(ASN1Transcoder(max_size = len(data) - 1),
+      backend = backend)
+  with pytest.raises(LimitExceeded):
+    list(tc.decode_all(data))
+
+
+def test_limits_registry():
+  # Registry values count towards the total size as a whole.
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.codec import LimitExceeded
+  from pyasn1.type import univ
+  from pyasn1.codec.der import encoder
+
+  data = encoder.encode(univ.SequenceOf(componentType = univ.Integer())
+      .setComponents(1, 2, 3))
+  registry = { '[0:32:16]': lambda value: [int(item) for item in value] }
+  tc = DERTranscoder(ASN1Transcoder(registry = registry, max_total = 9))
+  assert tc.decode(data) == [1, 2, 3]
+  tc = DERTranscoder(ASN1Transcoder(registry = registry, max_total = 8))
+  with pytest.raises(LimitExceeded):
+    tc.decode(data)
+
+
+@pytest.mark.parametrize('limits,data,offset', [
+  ({ 'max_items': 2 }, b'\x30\x09\x02\x01\x01\x02\x01\x02\x02\x01\x03', 8),
+  ({ 'max_depth': 2 }, b'\x30\x06\x30\x04\x30\x02\x05\x00', 6),
+  ({ 'max_length': 2 }, b'\x30\x05\x04\x03abc', 2),
+  ({ 'max_length': 2 }, b'\xa3\x09\x30\x07\x30\x05\x0c\x03abc', 6),
+])
+def test_limits_registry_structure(limits, data, offset):
+  # The nested values of registry values are checked against the limits
+  # before pyasn1 decodes them.
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.codec import LimitExceeded
+
+  registry = { '[0:32:16]': lambda value: len(value) }
+  for backend in ('native', 'pyasn1'):
+    tc = DERTranscoder(ASN1Transcoder(registry = registry, **limits),
+        backend = backend)
+    with pytest.raises(LimitExceeded) as exc:
+      tc.decode(data)
+    assert exc.value.offset == offset
+
+  tc = DERTranscoder(ASN1Transcoder(registry = registry))
+  assert tc.decode(data) in (1, 3, [1])
+
+
+def test_limits_unknown_tags():
+  # Unknown tags are rejected by their header, whatever their content.
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.codec import UnknownTag, encode_length
+
+  tc = DERTranscoder(ASN1Transcoder(max_depth = 10, max_items = 5,
+      max_length = 10))
+  content = b'\x02\x01\x01' * 20000
+  with pytest.raises(UnknownTag) as exc:
+    tc.decode(b'\x30' + encode_length(len(content)) + content)
+  assert exc.value.offset == 0
+  content = b'\x04\x82\x27\x10' + b'x' * 10000
+  with pytest.raises(UnknownTag):
+    tc.decode(b'\x30' + encode_length(len(content)) + content)
+
+
+@pytest.mark.parametrize('data', [
+  b'\xa4\x06\x30\x04\x02\x02\x01\x01',
+  b'\xa4\x04\x30\x02\xa2\x00',
+  b'\xa4\x06\x30\x04\xa2\x02\x30\x00',
+  b'\xa4\x06\x30\x04\xa3\x02\x30\x00',
+  b'\xa4\x09\x30\x07\xa2\x05\x30\x03\x02\x01\x01',
+  b'\xa4\x0f\x30\x0d\xa2\x0b\x30\x09\x02\x01\x01\x02\x01\x01\x02\x01\x01',
+])
+def test_decode_bad_mapping_entries(data):
+  from bran import DERTranscoder
+  from pyasn1.error import PyAsn1Error
+  with pytest.raises((TypeError, ValueError, PyAsn1Error)):
+    DERTranscoder().decode(data)
+
+
+def stdlib_values():
+  import datetime, decimal, uuid
+  utc = datetime.timezone.utc
+  return [
+    datetime.datetime(2024, 5, 6, 7, 8, 9, tzinfo = utc),
+    datetime.datetime(2024, 5, 6, 7, 8, 9, 120000,
+        tzinfo = datetime.timezone(datetime.timedelta(hours = 2))),
+  ] + [
+    # Fractions with zeroes, which pyasn1 does not re-format
+    datetime.datetime(2024, 5, 6, 7, 8, 9, microsecond, tzinfo = utc)
+    for microsecond in (1, 1000, 50000, 123456)
+  ] + [
+    datetime.date(2024, 1, 2),
+    datetime.date.min,
+    datetime.date.max,
+    uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    decimal.Decimal('1.50'),
+    decimal.Decimal('-0.00'),
+    decimal.Decimal('-12E+3'),
+    decimal.Decimal('-' + '1' * 5000),
+    { u'dates': set([datetime.date(2020, 1, 1), datetime.date(2019, 1, 1)]),
+      u'ids': [uuid.UUID(int = 0), uuid.UUID(int = 1)] },
+    { datetime.date(2020, 1, 1): decimal.Decimal(1) },
+  ]
+
+
+@pytest.mark.parametrize('value', stdlib_values())
+def test_stdlib_types(value):
+  from bran import DERTranscoder, ASN1Transcoder
+  tc = DERTranscoder(ASN1Transcoder(stdlib_types = True))
+  reference = DERTranscoder(ASN1Transcoder(stdlib_types = True),
+      backend = 'pyasn1')
+
+  data = tc.encode(value)
+  assert data == reference.encode(value)
+  assert tc.decode(data) == value
+  assert reference.decode(data) == value
+  tc.validate(data)
+
+  for backend in ('native', 'pyasn1'):
+    limited = DERTranscoder(ASN1Transcoder(stdlib_types = True,
+        max_total = len(data)), backend = backend)
+    assert limited.decode(data) == value
+
+  # Without the option, the types are unknown.
+  with pytest.raises(TypeError):
+    DERTranscoder().encode(value)
+
+
+def test_stdlib_types_set():
+  # Mixed SETs are ordered by tag
+  import datetime, decimal, uuid
+  from bran import DERTranscoder, ASN1Transcoder
+  value = set([uuid.UUID(int = 5), decimal.Decimal(3), 1,
+      datetime.date(2020, 1, 1),
+      datetime.datetime(2020, 1, 1, tzinfo = datetime.timezone.utc)])
+  tc = DERTranscoder(ASN1Transcoder(stdlib_types = True, sort = False))
+  data = tc.encode(value)
+  assert data == DERTranscoder(tc.inner, backend = 'pyasn1').encode(value)
+  assert tc.decode(data) == value
+  tc.validate(data)
+
+
+@pytest.mark.parametrize('data', [
+  b'\x18\x0e20240506070809',
+  b'\xa6\x05\x04\x03abc',
+  b'\xa7\x05\x30\x03\x02\x01\x01',
+  b'\xa7\x08\x30\x06\x02\x01\x01\x0c\x01a',
+  b'\xa8\x03\x02\x01\x00',
+  b'\xa8\x06\x02\x04\x7f\xff\xff\xff',
+])
+def test_stdlib_types_decode_errors(data):
+  from bran import DERTranscoder, ASN1Transcoder
+  from pyasn1.error import PyAsn1Error
+  tc = DERTranscoder(ASN1Transcoder(stdlib_types = True, max_total = 100))
+  with pytest.raises(PyAsn1Error):
+    tc.decode(data)
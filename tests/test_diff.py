@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.diff."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+
+def test_equal(nested_data):
+  from bran import dumps
+  from bran.diff import diff
+
+  encoded = dumps(nested_data)
+  assert diff(encoded, encoded) == []
+  assert diff(encoded, bytearray(encoded)) == []
+  assert diff(encoded, encoded + dumps(1)) == []
+
+
+def test_changes(nested_data):
+  import copy
+  from bran import dumps
+  from bran.diff import diff, Change, MISSING
+
+  new = copy.deepcopy(nested_data)
+  new['numbers']['int'] = 0
+  new['list'].append('maybe')
+  new['set'] = set([3])
+  new['added'] = None
+  del new['none']
+
+  changes = diff(dumps(nested_data), dumps(new))
+  assert sorted(changes, key = repr) == sorted([
+    Change(('numbers', 'int'), 42, 0),
+    Change(('list', 2), MISSING, 'maybe'),
+    Change(('set',), set([1, 2]), set([3])),
+    Change(('added',), MISSING, None),
+    Change(('none',), None, MISSING),
+  ], key = repr)
+  assert repr(MISSING) == 'MISSING'
+
+  # Shrinking sequences
+  assert diff(dumps((1, 2, 3)), dumps((1, 5))) == [
+    Change((1,), 2, 5),
+    Change((2,), 3, MISSING),
+  ]
+
+
+@pytest.mark.parametrize('old,new', [
+  (1, 2),
+  ([1], (1,)),
+  ({u'a': 1}, [1]),
+  (complex(1, 2), complex(1, 3)),
+  (b'a', u'a'),
+])
+def test_whole_value(old, new):
+  from bran import dumps
+  from bran.diff import diff, Change
+
+  assert diff(dumps(old), dumps(new)) == [Change((), old, new)]
+
+
+def test_nested_keys():
+  from bran import dumps
+  from bran.diff import diff, Change
+
+  old = {(1, 2): {b'x': [0, {u'y': 1}]}, (3,): u'same'}
+  new = {(1, 2): {b'x': [0, {u'y': 2}]}, (3,): u'same'}
+  assert diff(dumps(old), dumps(new)) == [
+    Change(((1, 2), b'x', 1, u'y'), 1, 2),
+  ]
+
+
+def test_decodes_changes_only():
+  # Equal subtrees are skipped without being decoded.
+  from bran import DERTranscoder, dumps
+  from bran.diff import diff
+
+  decoded = []
+
+  class Counting(DERTranscoder):
+    def decode(self, data):
+      decoded.append(len(data))
+      return DERTranscoder.decode(self, data)
+
+  old = dict((u'key%d' % i, [i] * 100) for i in range(100))
+  new = dict(old)
+  new[u'key50'] = u'changed'
+  changes = diff(dumps(old), dumps(new), Counting())
+  assert [change.path for change in changes] == [(u'key50',)]
+  # The changed key and both of its values.
+  assert len(decoded) == 3
+  assert sum(decoded) < 400
+
+
+def test_backends(nested_data):
+  from bran import DERTranscoder
+  from bran.backend import backends
+  from bran.diff import diff, MISSING
+
+  new = dict(nested_data)
+  new['dict'] = {'baz': 43}
+  results = []
+  for backend in backends():
+    tc = DERTranscoder(backend = backend)
+    results.append(diff(tc.encode(nested_data), tc.encode(new), tc))
+  assert results[0] == [(('dict', 'baz'), 42, 43), (('dict', 'foo'), 'bar',
+      MISSING)]
+  assert all(result == results[0] for result in results)
+
+
+@pytest.mark.parametrize('data', [
+  # MAPPING with an entry that is not a pair
+  b'\xa4\x05\x30\x03\x02\x01\x01',
+  # MAPPING with a pair of three values
+  b'\xa4\x0f\x30\x0d\xa2\x0b\x30\x09\x02\x01\x01\x02\x01\x02\x02\x01\x03',
+  # LIST with two values inside the explicit tag
+  b'\xa3\x05\x30\x00\x02\x01\x01',
+  # Truncated
+  b'\xa4\x05\x30\x03\x02\x01',
+])
+def test_errors(data):
+  from bran import dumps
+  from bran.diff import diff
+  from pyasn1.error import PyAsn1Error
+
+  with pytest.raises(PyAsn1Error):
+    diff(dumps({1: 1}), data)
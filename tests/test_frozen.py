@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.frozen."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+
+VALUE = {
+  u'list': [1, [2, 3], { u'a': [4] }],
+  u'tuple': (1, [2]),
+  u'set': set([1, 2]),
+  u'nested': { 1: { 2: set([(3, 4)]) } },
+  u'empty': [{}, set(), []],
+}
+
+
+def test_frozen_dict():
+  from bran.frozen import FrozenDict
+
+  value = FrozenDict({ 1: 2 }, b = 3)
+  assert value == { 1: 2, u'b': 3 }
+  assert value[1] == 2
+  assert 1 in value
+  assert len(value) == 2
+  assert sorted(value, key = str) == [1, u'b']
+  assert hash(value) == hash(FrozenDict([(u'b', 3), (1, 2)]))
+  assert repr(FrozenDict({ 1: 2 })) == 'FrozenDict({1: 2})'
+
+  with pytest.raises(TypeError):
+    value[1] = 3
+  with pytest.raises(AttributeError):
+    value.foo = 42
+
+
+def test_frozen_list():
+  from bran.frozen import FrozenList
+
+  value = FrozenList([1, 2])
+  assert value == [1, 2]
+  assert [1, 2] == value
+  assert value == FrozenList((1, 2))
+  assert value != (1, 2)
+  assert (1, 2) != value
+  assert value != [1]
+  assert value != 42
+  assert hash(value) == hash(FrozenList([1, 2]))
+  assert repr(value) == 'FrozenList([1, 2])'
+
+
+def test_decode_frozen():
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.frozen import FrozenDict, FrozenList
+  from pyasn1.codec.der import encoder
+
+  frozen = ASN1Transcoder(frozen = True)
+  tc = DERTranscoder(frozen)
+  encoded = DERTranscoder().encode(VALUE)
+
+  for decoded in (tc.decode(encoded), frozen.decode(frozen.encode(VALUE))):
+    assert decoded == VALUE
+    assert isinstance(decoded, FrozenDict)
+    assert isinstance(decoded[u'list'], FrozenList)
+    assert isinstance(decoded[u'list'][2], FrozenDict)
+    assert isinstance(decoded[u'tuple'], tuple)
+    assert isinstance(decoded[u'set'], frozenset)
+    assert isinstance(decoded[u'nested'][1][2], frozenset)
+    hash(decoded)
+
+    # Re-encoding yields the same bytes
+    assert tc.encode(decoded) == encoded
+    assert encoder.encode(frozen.encode(decoded)) == encoded
+
+
+def test_lru_cache():
+  import functools
+  from bran import DERTranscoder, ASN1Transcoder
+
+  tc = DERTranscoder(ASN1Transcoder(frozen = True))
+  calls = []
+
+  @functools.lru_cache()
+  def process(value):
+    calls.append(value)
+    return len(value)
+
+  data = tc.encode(VALUE)
+  assert process(tc.decode(data)) == process(tc.decode(data)) == len(VALUE)
+  assert len(calls) == 1
+
+
+def test_schema_frozen():
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.frozen import FrozenDict, FrozenList
+  from bran.schema import compile_schema
+
+  tc = DERTranscoder(ASN1Transcoder(frozen = True))
+  schema = compile_schema({ u'a': [int], u'b': { u'c': str } }, tc)
+  value = { u'a': [1, 2], u'b': { u'c': u'd' } }
+
+  decoded = schema.decode(schema.encode(value))
+  assert decoded == value
+  assert isinstance(decoded, FrozenDict)
+  assert isinstance(decoded[u'a'], FrozenList)
+  assert isinstance(decoded[u'b'], FrozenDict)
+  assert schema.encode(decoded) == tc.encode(value)
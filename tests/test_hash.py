@@ -32,3 +32,133 @@ def test_hash():
   hy = hasher(y).digest()
 
   assert hx == hy
+
+
+def test_hash_reference(nested_data):
+  # The digest is the hash of the DER encoding
+  import hashlib
+  from bran import DERTranscoder
+  from bran.hash import hasher
+
+  expected = hashlib.sha256(DERTranscoder().encode(nested_data)).digest()
+  assert hasher(nested_data, hashlib.sha256).digest() == expected
+
+
+def test_hasher_class():
+  import hashlib
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.hash import BranHasher, hasher
+
+  h = BranHasher(hashfunc = hashlib.sha256)
+  h.update(1, u'two')
+  assert h.name == 'sha256'
+  assert h.digest_size == 32
+  assert h.block_size == 64
+
+  h2 = hasher()
+  h2.update(1)
+  h2.update(u'two')
+  assert isinstance(h2, BranHasher)
+  h3 = BranHasher()
+  h3.update(1, u'two')
+  assert h2.hexdigest() == h3.hexdigest()
+
+  # Hash function arguments are passed on
+  h = BranHasher([1], hashlib.blake2b, digest_size = 16)
+  assert len(h.digest()) == 16
+
+  # A custom transcoder changes the result
+  tc = DERTranscoder(ASN1Transcoder(sort = False))
+  x = { u'b': 1, u'a': 2 }
+  assert BranHasher(x, transcoder = tc).digest() \
+      != BranHasher(x).digest()
+
+
+def test_digest(nested_data):
+  import hashlib
+  from bran import digest
+  from bran.hash import hasher
+
+  assert digest(nested_data) == hasher(nested_data).digest()
+  assert digest(nested_data, hashlib.md5) \
+      == hasher(nested_data, hashlib.md5).digest()
+
+
+def test_digest_threads(nested_data):
+  # The default transcoder is shared between threads.
+  from bran import digest
+  expected = digest(nested_data)
+
+  from concurrent.futures import ThreadPoolExecutor
+  with ThreadPoolExecutor(4) as pool:
+    results = list(pool.map(digest, [nested_data] * 64))
+  assert results == [expected] * 64
+
+
+@pytest.mark.parametrize('threads', [False, True])
+def test_multi_hasher(nested_data, threads):
+  import hashlib
+  from bran.hash import MultiHasher, hasher, digests
+
+  h = MultiHasher((hashlib.sha256, 'sha512', hashlib.blake2b),
+      threads = threads)
+  assert h.names == ['sha256', 'sha512', 'blake2b']
+  h.update(nested_data, b'x' * 100000)
+  result = h.digests()
+  for name, func in (('sha256', hashlib.sha256), ('sha512', hashlib.sha512),
+      ('blake2b', hashlib.blake2b)):
+    expected = hasher(nested_data, func)
+    expected.update(b'x' * 100000)
+    assert result[name] == expected.digest()
+    assert h.hexdigests()[name] == expected.hexdigest()
+
+  # Names can be chosen with a mapping
+  result = digests(nested_data, { u'a': hashlib.sha256, u'b': hashlib.md5 },
+      threads = threads)
+  assert result == { u'a': hasher(nested_data, hashlib.sha256).digest(),
+      u'b': hasher(nested_data, hashlib.md5).digest() }
+
+
+def test_multi_hasher_errors():
+  # Worker threads are stopped if encoding fails.
+  import threading
+  from bran.hash import MultiHasher
+
+  count = threading.active_count()
+  h = MultiHasher(('sha256', 'sha1'), threads = True)
+  with pytest.raises(TypeError):
+    h.update([1, object()])
+  assert threading.active_count() == count
+
+
+def test_copy(nested_data):
+  import hashlib
+  from bran.hash import BranHasher
+
+  h = BranHasher(nested_data, hashlib.sha256)
+  copy = h.copy()
+  assert isinstance(copy, BranHasher)
+  assert copy.name == 'sha256'
+  copy.update(1)
+  assert h.digest() == BranHasher(nested_data, hashlib.sha256).digest()
+
+  expected = BranHasher(hashfunc = hashlib.sha256)
+  expected.update(nested_data, 1)
+  assert copy.digest() == expected.digest()
+
+
+def test_prefix_digests(nested_data):
+  import hashlib
+  from bran.hash import BranHasher, prefix_digests
+
+  envelope = { u'version': 1, u'sender': u'x' }
+  payloads = [nested_data, b'payload', [1, 2, 3]]
+  expected = []
+  for payload in payloads:
+    h = BranHasher(hashfunc = hashlib.blake2b, digest_size = 16)
+    h.update(envelope, payload)
+    expected.append(h.digest())
+
+  assert prefix_digests(envelope, payloads, hashlib.blake2b,
+      digest_size = 16) == expected
+  assert prefix_digests(envelope, iter([])) == []
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.jsonstream."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize('text', [
+  'null', 'true', 'false', '0', '-0', '42', '-128', '12345678901234567890',
+  '1.5', '-0.0', '1e400', '-2.5E-3', '1E+2', 'Infinity', '-Infinity',
+  '""', '"h\\u00e4llo \\"x\\"\\n"', '"\\ud83d\\ude00"', u'"hällo"',
+  '[]', '{}', ' [ [ ] , { } ] ', '[1, [2, [3, []]]]',
+  '{"b": 1, "a": 2, "c": {"z": [true, null], "y": "x"}}',
+  '{"a": 1, "a": 2}', '{"b": 1, "a": 2, "b": 3}',
+  '{"\\u00e9": 1, "e": 2, "E": 3, "": 4}',
+  '\n\t{ "a" : [ 1 , 2 ] }\r\n',
+])
+def test_encode_json(text):
+  import bran
+  from bran.jsonstream import encode_json, digest_json
+
+  expected = bran.dumps(json.loads(text))
+  assert encode_json(text) == expected
+  assert encode_json(text.encode('utf8')) == expected
+  assert digest_json(text) == bran.digest(json.loads(text))
+
+
+@pytest.mark.parametrize('sort', [False, reversed])
+def test_sort_options(sort):
+  import bran
+  from bran.jsonstream import encode_json
+
+  tc = bran.DERTranscoder(bran.ASN1Transcoder(sort = sort))
+  text = '{"b": 1, "a": {"d": 2, "c": 3}, "b": 4}'
+  assert encode_json(text, tc) == tc.encode(json.loads(text))
+
+
+def test_encode_json_into():
+  import io
+  import hashlib
+  import bran
+  from bran.jsonstream import encode_json_into
+
+  text = '{"data": [' + ', '.join(str(idx) for idx in range(1000)) + ']}'
+  out = io.BytesIO()
+  assert encode_json_into(io.StringIO(text), out.write) == len(out.getvalue())
+  assert out.getvalue() == bran.dumps(json.loads(text))
+
+  h = hashlib.sha256()
+  encode_json_into(io.BytesIO(text.encode('utf8')), h.update)
+  assert h.digest() == bran.digest(json.loads(text), hashlib.sha256)
+
+
+@pytest.mark.parametrize('text', [
+  '', ' ', '[', '[1', '[1,', '[1 2]', '{', '{"a"', '{"a" 1}', '{"a": 1',
+  '{"a": 1 "b": 2}', '{1: 2}', '{"a": }', '"abc', '01', '1 2', 'nul',
+  '[1,]', '-', '.5', 'tru',
+])
+def test_errors(text):
+  from bran.jsonstream import encode_json
+
+  with pytest.raises(json.JSONDecodeError) as expected:
+    json.loads(text)
+  with pytest.raises(json.JSONDecodeError) as exc:
+    encode_json(text)
+  assert exc.value.pos == expected.value.pos
+
+
+def test_nan():
+  import bran
+  from bran.jsonstream import encode_json
+
+  with pytest.raises(ValueError):
+    bran.dumps(json.loads('NaN'))
+  with pytest.raises(ValueError):
+    encode_json('[NaN]')
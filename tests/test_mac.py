@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.mac."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+KEY = b'secret key'
+
+
+def test_hmac(nested_data):
+  import hmac
+  import hashlib
+  from bran import dumps
+  from bran.mac import BranMAC
+
+  expected = hmac.new(KEY, dumps(nested_data), hashlib.sha256)
+  mac = BranMAC(KEY)
+  assert mac.name == 'hmac-sha256'
+  assert mac.digest_size == 32
+  mac.update(nested_data)
+  assert mac.digest() == expected.digest()
+  assert mac.hexdigest() == expected.hexdigest()
+
+  assert BranMAC(KEY, hashlib.sha512, nested_data).digest() \
+      == hmac.new(KEY, dumps(nested_data), hashlib.sha512).digest()
+
+  with pytest.raises(TypeError):
+    BranMAC(KEY, digest_size = 16)
+
+
+@pytest.mark.parametrize('digestmod', ['blake2b', 'blake2s'])
+def test_blake2(nested_data, digestmod):
+  import hashlib
+  from bran import dumps
+  from bran.mac import BranMAC
+
+  func = getattr(hashlib, digestmod)
+  expected = func(dumps(nested_data), key = KEY, digest_size = 20).digest()
+  assert BranMAC(KEY, digestmod, nested_data, digest_size = 20).digest() \
+      == expected
+  assert BranMAC(KEY, func, nested_data, digest_size = 20).digest() \
+      == expected
+  assert BranMAC(KEY, func).name == digestmod
+
+
+def test_messages():
+  from bran.mac import BranMAC
+
+  mac = BranMAC(KEY)
+  tags = [mac.mac({u'seq': idx}) for idx in range(10)]
+  assert len(set(tags)) == 10
+  assert mac.mac({u'seq': 3}) == BranMAC(KEY, obj = {u'seq': 3}).digest()
+
+  assert mac.verify({u'seq': 3}, tags[3])
+  assert not mac.verify({u'seq': 4}, tags[3])
+  assert not BranMAC(b'other key').verify({u'seq': 3}, tags[3])
+
+  # One-off MACs leave the streaming state alone.
+  assert mac.digest() == BranMAC(KEY).digest()
+
+
+def test_copy_reset():
+  from bran.mac import BranMAC
+
+  mac = BranMAC(KEY, obj = u'prefix')
+  other = mac.copy()
+  other.update(1)
+  expected = BranMAC(KEY)
+  expected.update(u'prefix', 1)
+  assert other.digest() == expected.digest()
+  assert mac.digest() == BranMAC(KEY, obj = u'prefix').digest()
+
+  mac.reset()
+  assert mac.digest() == BranMAC(KEY).digest()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.parallel."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+
+def get_id(value):
+  return value[u'id']
+
+
+def add(first, second):
+  return first + second
+
+
+def unsorted_transcoder():
+  from bran import DERTranscoder, ASN1Transcoder
+  return DERTranscoder(ASN1Transcoder(sort = False))
+
+
+@pytest.fixture
+def record_file(tmpdir):
+  from bran import dumps
+  values = [{ u'id': idx, u'data': b'x' * (idx % 300) } for idx in range(500)]
+  path = str(tmpdir.join('records.der'))
+  with open(path, 'wb') as fileobj:
+    for value in values:
+      fileobj.write(dumps(value))
+  return path, values
+
+
+def test_scan(record_file):
+  from bran import dumps
+  from bran.parallel import scan_records, split_ranges
+  path, values = record_file
+
+  records = list(scan_records(path))
+  assert [length for _, length in records] \
+      == [len(dumps(value)) for value in values]
+
+  ranges = list(split_ranges(records, 4096))
+  assert sum(count for _, _, count in ranges) == len(values)
+  assert ranges[0][0] == 0
+  for (offset, length, _), (next_offset, _, _) in zip(ranges, ranges[1:]):
+    assert offset + length == next_offset
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_decode_file(record_file, jobs):
+  from bran.parallel import decode_file
+  path, values = record_file
+
+  assert list(decode_file(path, jobs = jobs, chunk_size = 4096)) == values
+  assert list(decode_file(path, get_id, jobs = jobs, chunk_size = 4096)) \
+      == list(range(len(values)))
+  assert list(decode_file(path, jobs = jobs,
+      transcoder_factory = unsorted_transcoder)) == values
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_map_reduce_file(record_file, jobs):
+  from bran.parallel import map_reduce_file
+  path, values = record_file
+
+  total = sum(range(len(values)))
+  assert map_reduce_file(path, get_id, add, jobs = jobs,
+      chunk_size = 4096) == total
+  assert map_reduce_file(path, get_id, add, 100, jobs = jobs,
+      chunk_size = 4096) == total + 100
+
+
+def test_empty_file(tmpdir):
+  from bran.parallel import decode_file, map_reduce_file
+  path = str(tmpdir.join('empty.der'))
+  open(path, 'wb').close()
+
+  assert list(decode_file(path)) == []
+  assert map_reduce_file(path, get_id, add) is None
+
+
+def test_truncated_file(tmpdir):
+  from bran import dumps
+  from bran.parallel import decode_file
+  from pyasn1.error import SubstrateUnderrunError
+
+  path = str(tmpdir.join('truncated.der'))
+  with open(path, 'wb') as fileobj:
+    fileobj.write(dumps([1, 2, 3])[:-1])
+
+  with pytest.raises(SubstrateUnderrunError):
+    list(decode_file(path, jobs = 1))
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.schema."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import dataclasses
+import typing
+
+import pytest
+
+
+class Point(typing.NamedTuple):
+  x: int
+  y: float
+
+
+class Untyped(typing.NamedTuple):
+  a: typing.Any
+  b: typing.Any
+
+
+@dataclasses.dataclass
+class Reading(object):
+  sensor: str
+  values: typing.List[float]
+  where: Point
+  extra: typing.Dict[str, int]
+  flags: typing.Tuple[bool, bytes]
+
+
+SAMPLE = {
+  u'id': 1,
+  u'name': u'foo',
+  u'payload': b'\x00\x01',
+  u'score': 1.5,
+  u'valid': True,
+  u'nothing': None,
+  u'tags': [u'a', u'b'],
+  u'pair': (1, u'x'),
+  u'nested': { 3: 4.5 },
+  u'anything': set([1]),
+}
+
+
+def test_sample():
+  from bran import dumps
+  from bran.schema import compile_schema
+
+  schema = compile_schema(SAMPLE)
+  encoded = schema.encode(SAMPLE)
+  assert encoded == dumps(SAMPLE)
+  assert schema.decode(encoded) == SAMPLE
+  assert schema.decode(bytearray(encoded)) == SAMPLE
+
+  # Other values of the same shape
+  value = dict(SAMPLE, id = -1000, tags = [], pair = (2, u''), valid = False)
+  encoded = schema.encode(value)
+  assert encoded == dumps(value)
+  assert schema.decode(encoded) == value
+
+
+@pytest.mark.parametrize('value', [
+  dict(SAMPLE, id = True),
+  dict(SAMPLE, id = u'one'),
+  dict(SAMPLE, tags = (u'a',)),
+  dict(SAMPLE, tags = [1, 2]),
+  dict(SAMPLE, pair = (1, u'x', 3)),
+  dict(SAMPLE, pair = [1, u'x']),
+  dict(SAMPLE, nested = { 3: 4 }),
+  dict(SAMPLE, nested = { 3: 4.5, 5: 6.5 }),
+  dict(SAMPLE, nested = { 1: 4.5 }),
+  dict(SAMPLE, extra = 1),
+  dict((key, value) for key, value in SAMPLE.items() if key != u'id'),
+  [1, 2, 3],
+  None,
+])
+def test_mismatch(value):
+  # Values not matching the schema use the generic path
+  from bran import dumps, loads
+  from bran.schema import compile_schema
+
+  schema = compile_schema(SAMPLE)
+  encoded = schema.encode(value)
+  assert encoded == dumps(value)
+  assert schema.decode(encoded) == loads(encoded)
+
+
+def test_declared():
+  from bran import dumps
+  from bran.schema import compile_schema
+
+  schema = compile_schema({ u'a': int, u'b': [str], u'c': (bytes, None),
+    u'd': complex, u'e': object, u'f': typing.List[int],
+    u'g': typing.Tuple[int, ...] })
+  value = { u'a': 1, u'b': [u'x'], u'c': (b'y', None), u'd': 1j,
+    u'e': { 1: 2 }, u'f': [1, 2], u'g': (1, 2, 3) }
+  encoded = schema.encode(value)
+  assert encoded == dumps(value)
+  assert schema.decode(encoded) == value
+
+
+@pytest.mark.parametrize('spec', [complex, 1j])
+def test_complex(spec):
+  from bran import dumps
+  from bran.schema import compile_schema, _Complex
+
+  schema = compile_schema([spec])
+  value = [complex(1.5, -2), 0j, complex(-1e300, 3.25)]
+  encoded = schema.encode(value)
+  assert encoded == dumps(value)
+  assert schema.decode(encoded) == value
+
+  # Mismatching values and encodings use the generic path
+  schema = compile_schema(spec)
+  assert isinstance(schema._CompiledSchema__root, _Complex)
+  for other in (1.5, (1.5, 2.0), complex(1, 2)):
+    encoded = schema.encode(other)
+    assert encoded == dumps(other)
+    assert schema.decode(encoded) == other
+
+  # INTEGER parts, and a surplus part
+  assert schema.decode(b'\xa1\x08\x30\x06\x02\x01\x01\x02\x01\x02') \
+      == complex(1, 2)
+  assert schema.decode(b'\xa1\x08\x30\x06\x09\x00\x09\x00\x09\x00') \
+      == 0j
+
+
+def test_namedtuple():
+  from bran import dumps
+  from bran.schema import compile_schema
+
+  for spec in (Point, Point(1, 2.0)):
+    schema = compile_schema(spec)
+    value = Point(3, 4.5)
+    encoded = schema.encode(value)
+    assert encoded == dumps(value)
+    decoded = schema.decode(encoded)
+    assert isinstance(decoded, Point)
+    assert decoded == value
+
+    # Mismatching encodings decode generically
+    encoded = dumps((1, 2, 3))
+    assert schema.decode(encoded) == (1, 2, 3)
+    encoded = dumps((1, 2))
+    assert schema.decode(encoded) == (1, 2)
+
+  schema = compile_schema(Untyped)
+  assert schema.decode(schema.encode(Untyped(1, u'x'))) == Untyped(1, u'x')
+
+
+def test_dataclass():
+  from bran import dumps
+  from bran.schema import compile_schema
+
+  value = Reading(u'temp', [1.5, 2.5], Point(1, 2.0), { u'a': 1 },
+      (True, b'x'))
+  plain = { u'sensor': u'temp', u'values': [1.5, 2.5], u'where': (1, 2.0),
+    u'extra': { u'a': 1 }, u'flags': (True, b'x') }
+
+  for spec in (Reading, value):
+    schema = compile_schema(spec)
+    encoded = schema.encode(value)
+    assert encoded == dumps(plain)
+    decoded = schema.decode(encoded)
+    assert isinstance(decoded, Reading)
+    assert decoded == value
+
+    # Mismatching dataclass values are encoded as mappings
+    other = Reading(u'temp', [1, 2], Point(1, 2.0), {}, (True, b'x'))
+    encoded = schema.encode([other])
+    assert encoded == dumps([dict(plain, values = [1, 2], extra = {})])
+
+    # And mismatching encodings decode generically
+    assert schema.decode(dumps(plain)) == value
+    assert schema.decode(dumps({ u'sensor': 1 })) == { u'sensor': 1 }
+
+
+def test_sort_options():
+  from collections import OrderedDict
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.schema import compile_schema
+
+  spec = OrderedDict([(u'b', int), (u'a', int)])
+  for sort in (False, reversed, sorted):
+    tc = DERTranscoder(ASN1Transcoder(sort = sort))
+    schema = compile_schema(spec, tc)
+    for keys in ((u'b', u'a'), (u'a', u'b')):
+      value = OrderedDict((key, 1) for key in keys)
+      encoded = schema.encode(value)
+      assert encoded == tc.encode(value)
+      assert schema.decode(encoded) == value
+
+
+def test_errors():
+  from bran.schema import compile_schema
+  from pyasn1.error import PyAsn1Error
+
+  schema = compile_schema([None])
+  with pytest.raises(PyAsn1Error):
+    schema.decode(b'\xa3\x05\x30\x03\x05\x01\x00')
+
+  schema = compile_schema([True])
+  with pytest.raises(PyAsn1Error):
+    schema.decode(b'\xa3\x05\x30\x03\x01\x01\x01')
+
+
+@pytest.mark.parametrize('limits', [
+  { 'max_size': 60 },
+  { 'max_depth': 1 },
+  { 'max_depth': 2 },
+  { 'max_items': 2 },
+  { 'max_items': 3 },
+  { 'max_length': 2 },
+  { 'max_total': 20 },
+  { 'max_total': 40 },
+  # Just enough for the value that falls back
+  { 'max_total': 81 },
+  { 'max_depth': 3, 'max_items': 12, 'max_length': 8, 'max_total': 200 },
+])
+def test_limits(limits):
+  # Compiled decoding fails exactly where generic decoding does.
+  from bran import DERTranscoder, ASN1Transcoder, dumps
+  from bran.codec import LimitExceeded
+  from bran.schema import compile_schema
+
+  tc = DERTranscoder(ASN1Transcoder(**limits))
+  values = [
+    SAMPLE,
+    dict(SAMPLE, tags = [u'x' * 10] * 5, nested = { 3: [[[1]]] }),
+    # Falls back to the generic path after the last key
+    dict(SAMPLE, zzz = 1),
+    [1j, 2j, 3j],
+    (Point(1, 2.5), [Point(3, 4.5)] * 3),
+  ]
+  specs = [SAMPLE, SAMPLE, SAMPLE, [complex], (Point, [Point])]
+  for spec, value in zip(specs, values):
+    schema = compile_schema(spec, tc)
+    data = dumps(value)
+    try:
+      expected = tc.decode(data)
+    except LimitExceeded as ex:
+      with pytest.raises(LimitExceeded) as exc:
+        schema.decode(data)
+      assert exc.value.offset == ex.offset
+    else:
+      assert schema.decode(data) == expected
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.shm."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+
+def summarize(ref):
+  from bran.shm import decode_shared
+  value = decode_shared(ref)
+  return value[u'id'], len(value[u'data'])
+
+
+def test_put_decode(nested_data):
+  from bran import dumps
+  from bran.shm import SharedRing, SharedRef, decode_shared
+
+  with SharedRing(4096) as ring:
+    ref = ring.put(nested_data)
+    assert isinstance(ref, SharedRef)
+    assert ref.name == ring.name
+    assert ref.length == len(dumps(nested_data))
+    assert decode_shared(ref) == nested_data
+    assert len(ring) == 1
+    ring.release(ref)
+    assert len(ring) == 0
+
+
+def test_attach(nested_data):
+  # Decoding in a process that did not create the segment maps it by name.
+  from multiprocessing import shared_memory
+  from bran.shm import SharedRing, decode_shared, detach, _attached
+
+  with SharedRing(4096) as ring:
+    ref = ring.put(nested_data)
+    other = shared_memory.SharedMemory(create = True, size = ref.length)
+    try:
+      other.buf[:ref.length] = ring._SharedRing__segment.buf[
+          ref.offset:ref.offset + ref.length]
+      moved = ref._replace(name = other.name, offset = 0)
+      assert decode_shared(moved) == nested_data
+      assert other.name in _attached
+      assert decode_shared(moved) == nested_data
+
+      detach(ring.name)
+      assert other.name in _attached
+      detach()
+      assert other.name not in _attached
+    finally:
+      other.close()
+      other.unlink()
+
+
+def test_ring_space():
+  from bran import dumps
+  from bran.shm import SharedRing
+
+  record = b'x' * 90
+  size = len(dumps(record))
+  with SharedRing(size * 3) as ring:
+    with pytest.raises(ValueError):
+      ring.put(b'x' * (size * 3))
+
+    refs = [ring.put(record) for _ in range(3)]
+    assert [ref.offset for ref in refs] == [0, size, 2 * size]
+    with pytest.raises(BufferError):
+      ring.put(record)
+
+    # Space is reclaimed in allocation order
+    ring.release(refs[1])
+    with pytest.raises(BufferError):
+      ring.put(record)
+    ring.release(refs[0])
+    wrapped = [ring.put(record), ring.put(record)]
+    assert [ref.offset for ref in wrapped] == [0, size]
+    with pytest.raises(BufferError):
+      ring.put(record)
+
+    with pytest.raises(ValueError):
+      ring.release(refs[0]._replace(offset = 1))
+
+    for ref in [refs[2]] + wrapped:
+      ring.release(ref)
+    assert ring.put(record).offset == 0
+
+
+def test_ring_blob(tmpdir):
+  from bran.blob import BlobRef
+  from bran.shm import SharedRing, decode_shared
+
+  path = tmpdir.join('blob')
+  path.write_binary(b'y' * 5000)
+  with SharedRing(8192) as ring:
+    ref = ring.put([BlobRef(str(path))])
+    assert decode_shared(ref) == [b'y' * 5000]
+
+
+def test_close():
+  from bran.shm import SharedRing
+  ring = SharedRing(64)
+  ring.close()
+  ring.close()
+
+
+def test_processes():
+  from concurrent.futures import ProcessPoolExecutor
+  from bran.shm import SharedRing
+
+  values = [{ u'id': idx, u'data': b'z' * (idx * 1000) } for idx in range(20)]
+  with SharedRing(1 << 20) as ring:
+    refs = [ring.put(value) for value in values]
+    with ProcessPoolExecutor(2) as pool:
+      results = list(pool.map(summarize, refs))
+    assert results == [(idx, idx * 1000) for idx in range(20)]
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.spool."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+
+@pytest.mark.parametrize('backend', ['native', 'pyasn1'])
+def test_generators(backend):
+  from bran import DERTranscoder
+  from bran.spool import SpooledSequence
+  tc = DERTranscoder(backend = backend)
+
+  assert tc.encode(x for x in range(5)) == tc.encode(list(range(5)))
+  assert tc.encode(iter([])) == tc.encode([])
+  assert tc.encode(SpooledSequence(range(3), tuple)) == tc.encode((0, 1, 2))
+  assert tc.encode(SpooledSequence([u'a'])) == tc.encode([u'a'])
+
+  # Nested iterators
+  value = {u'rows': ((idx, iter([b'x' * idx])) for idx in range(3))}
+  expected = {u'rows': [(idx, [b'x' * idx]) for idx in range(3)]}
+  encoded = tc.encode(value)
+  assert encoded == tc.encode(expected)
+  assert tc.decode(encoded) == expected
+
+
+def test_spill_to_disk(tmpdir):
+  # A tiny memory limit moves the spool to disk; the result is the same.
+  from bran import DERTranscoder
+  from bran.blob import BlobRef
+  from bran.spool import SpooledSequence
+
+  path = tmpdir.join('blob')
+  path.write_binary(b'b' * 3000)
+  items = [b'a' * 2000, BlobRef(str(path)), u'c' * 100, 42]
+  tc = DERTranscoder()
+  expected = tc.encode([b'a' * 2000, b'b' * 3000, u'c' * 100, 42])
+  value = SpooledSequence(iter(items), max_memory = 16)
+  assert tc.encode(value) == expected
+
+  out = []
+  assert tc.encode_into(SpooledSequence(iter(items), max_memory = 16),
+      out.append) == len(expected)
+  assert b''.join(out) == expected
+  assert b''.join(tc.encode_buffers(iter(items))) == expected
+
+
+def test_bounded_memory():
+  # Hashing a long generator does not hold its encoding in memory.
+  import tracemalloc
+  from bran.hash import hasher
+
+  def rows(count):
+    for idx in range(count):
+      yield {u'id': idx, u'data': b'x' * 4000}
+
+  # The encoding is about 4 MiB, the spool keeps at most 1 MiB in memory.
+  expected = hasher(list(rows(1000))).digest()
+
+  tracemalloc.start()
+  try:
+    digest = hasher(rows(1000)).digest()
+    peak = tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+  assert digest == expected
+  assert peak < 2 << 20
+
+
+def test_kind():
+  from bran.spool import SpooledSequence
+  with pytest.raises(ValueError):
+    SpooledSequence([], set)
+  assert repr(SpooledSequence([1], tuple)) == 'SpooledSequence([1], tuple)'
+
+
+def test_registry_iterators():
+  # Registered iterator types keep their registry encoding.
+  from bran import DERTranscoder, ASN1Transcoder
+  from pyasn1.type import univ
+
+  class Counter(object):
+    def __iter__(self):
+      return self
+
+    def __next__(self):
+      raise StopIteration
+
+  registry = {Counter: lambda value: univ.ObjectIdentifier([1, 2, 3])}
+  tc = DERTranscoder(ASN1Transcoder(registry = registry))
+  from pyasn1.codec.der import encoder
+  assert tc.encode(Counter()) == encoder.encode(
+      univ.ObjectIdentifier([1, 2, 3]))
+  assert tc.encode(iter([1])) == tc.encode([1])
@@ -28,3 +28,33 @@ def test_stringify():
   with pytest.raises(TypeError):
     stringify(None)
 
+
+def test_identifier_octets():
+  from pyasn1.type.tag import Tag, TagSet
+  from bran.util import identifier_octets
+
+  # A single low tag number
+  tag = Tag(0, 0, 2)
+  assert b'\x02' == identifier_octets(tag)
+
+  # Tag sets list the outermost tag first
+  tagset = TagSet() + Tag(0, 32, 16) + Tag(128, 32, 1)
+  assert b'\xa1\x30' == identifier_octets(tagset)
+
+  # High tag numbers use the base 128 form
+  assert b'\x9f\x82\x2c' == identifier_octets(Tag(128, 0, 300))
+  assert b'\x9f\x1f' == identifier_octets(Tag(128, 0, 31))
+
+  # Stringified tag sets are accepted
+  from bran.util import stringify
+  assert identifier_octets(stringify(tagset)) == identifier_octets(tagset)
+
+  # With invalid values
+  with pytest.raises(TypeError):
+    identifier_octets(None)
+
+  with pytest.raises(ValueError):
+    identifier_octets('0:0:2')
+
+  with pytest.raises(ValueError):
+    identifier_octets('[0:x:2]')
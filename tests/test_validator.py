@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""Test suite for bran.validator."""
+
+__author__ = 'Jens Finkhaeuser'
+__copyright__ = 'Copyright (c) 2017-2018 Jens Finkhaeuser'
+__license__ = 'MIT +no-false-attribs'
+__all__ = ()
+
+import pytest
+
+
+REGISTRY = {
+  '[0:0:6]': lambda value: value,
+  '[0:0:6]+[128:32:16]': lambda value: value,
+  '[0:32:16]+[128:32:20]': lambda value: value,
+  '[128:0:40]': lambda value: value,
+}
+
+
+@pytest.mark.parametrize('value', [
+  None, True, False, 0, 127, 128, -128, -129, -32768, 2 ** 70, -2 ** 71,
+  0.0, -0.0, 1.5, -1e300, float('inf'), float('-inf'), u'', u'hällo',
+  b'', b'x' * 300, 1j, (), [], (1, [2, (3,)]), {}, { 1: 2, 5: { 3: 4 } },
+  { -5: 1, 3: 2, 1.5: 3 }, { (1, 2): u'a', (1, 3): u'b' }, set(),
+  set([-1, 2, 5.5]), set([1, u'x', b'y', None, (1,), 1j]),
+])
+def test_valid(value):
+  from bran import DERTranscoder, ASN1Transcoder, dumps, validate
+
+  if isinstance(value, set) and len(set(map(type, value))) > 2:
+    tc = DERTranscoder(ASN1Transcoder(sort = False))
+  else:
+    tc = DERTranscoder()
+  data = dumps(value, tc)
+  validate(data, tc)
+  tc.validate(bytearray(data))
+  tc.validate(memoryview(data))
+
+  sort = tc.inner.options.get('sort', sorted)
+  DERTranscoder(ASN1Transcoder(frozen = True, sort = sort)).validate(data)
+
+
+def descending(items):
+  return sorted(items, reverse = True)
+
+
+def rotated(items):
+  items = sorted(items)
+  return items[1:] + items[:1]
+
+
+@pytest.mark.parametrize('sort', [False, descending, sorted])
+def test_sort_options(sort):
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.validator import ValidationError
+
+  tc = DERTranscoder(ASN1Transcoder(sort = sort))
+  other = DERTranscoder(ASN1Transcoder(sort = rotated))
+  for value in ({ 1: 2, 3: 4, 5: 6 }, set([1, 3, 5])):
+    tc.validate(tc.encode(value))
+
+    # Encodings in a different order are only accepted without sorting
+    data = other.encode(value)
+    if sort is False:
+      tc.validate(data)
+    else:
+      with pytest.raises(ValidationError):
+        tc.validate(data)
+
+
+def test_registry():
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.validator import ValidationError
+
+  tc = DERTranscoder(ASN1Transcoder(registry = REGISTRY))
+  for data in (b'\x06\x02\x2a\x03', b'\xb0\x04\x06\x02\x2a\x03',
+      b'\xb4\x05\x30\x03\x02\x01\x01', b'\xb4\x04\x30\x02\x30\x00',
+      b'\xa3\x06\x30\x04\x06\x02\x2a\x03', b'\x9f\x28\x01\x00'):
+    tc.validate(data)
+
+  # Only the TLV structure of registry values is checked
+  with pytest.raises(ValidationError) as exc:
+    tc.validate(b'\xb4\x05\x30\x03\x02\x02\x01')
+  assert exc.value.offset == 5
+
+  # Prefixes of registry tag sets are not known by themselves
+  with pytest.raises(ValidationError) as exc:
+    tc.validate(b'\xb4\x02\x05\x00')
+  assert exc.value.offset == 0
+  with pytest.raises(ValidationError) as exc:
+    tc.validate(b'\xb0\x00')
+  assert exc.value.offset == 0
+
+
+@pytest.mark.parametrize('data,offset', [
+  # Structure
+  (b'', 0),
+  (b'\x05', 1),
+  (b'\x05\x00\x00', 2),
+  (b'\x05\x80', 1),
+  (b'\x04\x82\x01', 1),
+  (b'\x04\x05abc', 1),
+  (b'\x1f', 1),
+  (b'\x1f\x81', 2),
+  # Minimal identifier and length octets
+  (b'\x1f\x80\x01\x00', 1),
+  (b'\x1f\x05\x00', 0),
+  (b'\x05\x81\x00', 1),
+  (b'\x04\x82\x00\x80' + b'x' * 128, 1),
+  (b'\x04\x81\x03abc', 1),
+  # Unknown tags
+  (b'\x30\x00', 0),
+  (b'\x06\x01\x2a', 0),
+  (b'\xa3\x00', 0),
+  (b'\xa3\x02\x31\x00', 0),
+  (b'\xa3\x03\x30\x00\x00', 4),
+  (b'\xa9\x02\x30\x00', 0),
+  # Universal types
+  (b'\x05\x01\x00', 2),
+  (b'\x01\x00', 2),
+  (b'\x01\x01\x01', 2),
+  (b'\x02\x00', 2),
+  (b'\x02\x01\x80', 2),
+  (b'\x02\x02\x00\x01', 2),
+  (b'\x02\x02\xff\x81', 2),
+  (b'\x02\x03\xff\x80\x01', 2),
+  (b'\x02\x02\x80\x00', 2),
+  (b'\x09\x01\x40\x00', 3),
+  (b'\x09\x03\x80\x01\x03', 2),
+  (b'\x09\x04\x0315E', 2),
+  (b'\x09\x05\x0315E0', 2),
+  (b'\x09\x01\x83', 2),
+  (b'\x09\x05\x82\x7f\xff\xff\x01', 2),
+  (b'\x0c\x03ab\xff', 4),
+  # Containers
+  (b'\xa1\x05\x30\x03\x09\x01\x40', 4),
+  (b'\xa1\x07\x30\x05\x09\x00\x02\x01\x00', 6),
+  (b'\xa1\x08\x30\x06\x09\x00\x09\x00\x09\x00', 8),
+  (b'\xa3\x05\x30\x03\x02\x01\x80', 6),
+  (b'\xa4\x05\x30\x03\x02\x01\x01', 4),
+  (b'\xa4\x06\x30\x04\xa2\x02\x30\x00', 4),
+  (b'\xa4\x09\x30\x07\xa2\x05\x30\x03\x02\x01\x01', 4),
+  (b'\xa4\x0f\x30\x0d\xa2\x0b\x30\x09\x02\x01\x01\x02\x01\x01\x02\x01\x01',
+      4),
+  (b'\xa4\x16\x30\x14\xa2\x08\x30\x06\x02\x01\x03\x02\x01\x04\xa2\x08\x30'
+      b'\x06\x02\x01\x01\x02\x01\x02', 18),
+  (b'\xa4\x16\x30\x14\xa2\x08\x30\x06\x02\x01\x01\x02\x01\x04\xa2\x08\x30'
+      b'\x06\x02\x01\x01\x02\x01\x02', 18),
+  (b'\xa4\x16\x30\x14\xa2\x08\x30\x06\x02\x01\x01\x02\x01\x04\xa2\x08\x30'
+      b'\x06\x0c\x01a\x02\x01\x02', 18),
+  (b'\xa4\x14\x30\x12\xa2\x07\x30\x05\x0c\x01a\x05\x00\xa2\x07\x30\x05'
+      b'\x0c\x01a\x05\x00', 17),
+  (b'\xa4\x14\x30\x12\xa2\x07\x30\x05\x0c\x01a\x05\x00\xa2\x07\x30\x05'
+      b'\x04\x01b\x05\x00', 17),
+  (b'\xa4\x0d\x30\x0b\xa2\x09\x30\x07\xa3\x02\x30\x00\x02\x01\x01', 8),
+  (b'\xa5\x07\x31\x05\x05\x00\x01\x01\x00', 6),
+  (b'\xa5\x06\x31\x04\xa3\x02\x30\x00', 4),
+  (b'\xa5\x10\x31\x0e\xa2\x05\x30\x03\x02\x01\x01\xa2\x05\x30\x03\x0c'
+      b'\x01a', 11),
+  (b'\xa5\x08\x31\x06\x02\x01\x02\x02\x01\x01', 7),
+  (b'\xa5\x08\x31\x06\x02\x01\x01\x02\x01\x01', 7),
+  # Bytes and text elements, which the default sort cannot order
+  (b'\xa5\x10\x31\x0e\x04\x03s11\x0c\x03s13\x0c\x02s4', 4),
+])
+def test_invalid(data, offset):
+  from bran import validate
+  from bran.validator import ValidationError
+  from pyasn1.error import PyAsn1Error
+
+  with pytest.raises(ValidationError) as exc:
+    validate(data)
+  assert exc.value.offset == offset
+  assert str(exc.value).endswith('at offset %d' % offset)
+  assert isinstance(exc.value, PyAsn1Error)
+
+
+@pytest.mark.parametrize('limits,value', [
+  ({ 'max_size': 10 }, [u'x' * 10]),
+  ({ 'max_depth': 2 }, [[[1]]]),
+  ({ 'max_depth': 2 }, { 1: { 2: { 3: 4 } } }),
+  ({ 'max_depth': 1 }, [1j]),
+  ({ 'max_items': 3 }, [1, 2, 3, 4]),
+  ({ 'max_items': 3 }, { 1: 2, 3: 4, 5: 6, 7: 8 }),
+  ({ 'max_items': 3 }, set([1, 2, 3, 4])),
+  ({ 'max_length': 10 }, { u'a': u'x' * 11 }),
+  ({ 'max_length': 10 }, [b'x' * 11]),
+])
+def test_limits(limits, value):
+  # Validation enforces the decoding limits, with the same offsets.
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.codec import LimitExceeded
+  from bran.validator import ValidationError
+
+  tc = DERTranscoder(ASN1Transcoder(**limits))
+  data = tc.encode(value)
+  with pytest.raises(ValidationError) as exc:
+    tc.validate(data)
+  with pytest.raises(LimitExceeded) as expected:
+    tc.decode(data)
+  assert exc.value.offset == expected.value.offset
+
+  raised = dict((key, limit + 1) for key, limit in limits.items())
+  if 'max_size' in raised:
+    raised['max_size'] = len(data)
+  DERTranscoder(ASN1Transcoder(**raised)).validate(data)
+
+
+@pytest.mark.parametrize('limits,data,offset', [
+  ({ 'max_items': 2 }, b'\xb4\x0b\x30\x09\x02\x01\x01\x02\x01\x02\x02\x01'
+      b'\x03', 10),
+  ({ 'max_depth': 2 }, b'\xb4\x08\x30\x06\x30\x04\x30\x02\x05\x00', 8),
+  ({ 'max_length': 2 }, b'\xb4\x07\x30\x05\x04\x03abc', 4),
+])
+def test_limits_registry(limits, data, offset):
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.validator import ValidationError
+
+  tc = DERTranscoder(ASN1Transcoder(registry = REGISTRY, **limits))
+  with pytest.raises(ValidationError) as exc:
+    tc.validate(data)
+  assert exc.value.offset == offset
+
+
+@pytest.mark.parametrize('limits', [{}, { 'max_depth': 50 }])
+def test_deep_nesting(limits):
+  # Deeply nested input is rejected rather than exhausting the stack.
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.codec import encode_length
+  from bran.validator import ValidationError, DEFAULT_MAX_DEPTH
+
+  data = b'\x05\x00'
+  for _ in range(3000):
+    content = b'\x30' + encode_length(len(data)) + data
+    data = b'\xa3' + encode_length(len(content)) + content
+  tc = DERTranscoder(ASN1Transcoder(**limits))
+  with pytest.raises(ValidationError):
+    tc.validate(data)
+
+  value = None
+  for _ in range(limits.get('max_depth', DEFAULT_MAX_DEPTH)):
+    value = [value]
+  tc.validate(tc.encode(value))
+  with pytest.raises(ValidationError):
+    tc.validate(tc.encode([value]))
+
+
+def test_random_reals():
+  # Every float the encoder produces passes, however pyasn1 would round it.
+  import random
+  import struct
+  from bran import dumps, validate
+
+  rng = random.Random(0)
+  values = [3.14159, 2.675, -230878.48127250175, 5e-324,
+      1.7976931348623157e308]
+  for _ in range(2000):
+    values.append(rng.uniform(-1e6, 1e6))
+    values.append(struct.unpack('<d', struct.pack('<Q',
+        rng.getrandbits(64)))[0])
+  for value in values:
+    if value != value:
+      continue
+    validate(dumps(value))
+    validate(dumps([value, complex(value, -value)]))
+
+
+@pytest.mark.parametrize('data', [
+  b'\x09\x06\x03 1E+0',
+  b'\x09\x04\x03inf',
+  b'\x09\x06\x031_0E1',
+  b'\x09\x07\x031.0E+0',
+])
+def test_noncanonical_reals(data):
+  from bran import validate
+  from bran.validator import ValidationError
+
+  with pytest.raises(ValidationError) as exc:
+    validate(data)
+  assert exc.value.offset == 2
+
+
+def test_mutations(nested_data):
+  # Corrupted encodings only ever raise ValidationError.
+  import random
+  from bran import dumps, validate
+  from bran.validator import ValidationError
+
+  rng = random.Random(0)
+  samples = [dumps(value) for value in (nested_data,
+      [1.5, -2.25e300, 1e-300], {u'x': (complex(1, 2), [b'y', None])})]
+  for _ in range(3000):
+    data = bytearray(rng.choice(samples))
+    for _ in range(rng.randint(1, 3)):
+      pos = rng.randrange(len(data))
+      if rng.random() < 0.7:
+        data[pos] = rng.randrange(256)
+      else:
+        del data[pos]
+    try:
+      validate(bytes(data))
+    except ValidationError:
+      pass
+
+
+@pytest.mark.parametrize('data,offset', [
+  (b'\x18\x0e20240506070809', 2),
+  (b'\x18\x1120240506070809.0Z', 2),
+  (b'\xa6\x05\x04\x03abc', 4),
+  (b'\xa7\x05\x30\x03\x02\x01\x01', 7),
+  (b'\xa7\x08\x30\x06\x02\x01\x01\x0c\x01a', 7),
+  (b'\xa7\x08\x30\x06\x02\x01\x0a\x02\x01\x00', 4),
+  (b'\xa7\x08\x30\x06\x02\x01\x00\x02\x01\x01', 4),
+  (b'\xa7\x0b\x30\x09\x02\x01\x01\x02\x01\x01\x02\x01\x01', 10),
+  (b'\xa7\x0f\x30\x0d\x02\x01\x01\x02\x08\x0d\xe0\xb6\xb3\xa7\x64\x00\x00', 4),
+  (b'\xa8\x03\x02\x01\x00', 4),
+  (b'\xa8\x04\x02\x02\x00\x01', 4),
+])
+def test_invalid_stdlib_types(data, offset):
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.validator import ValidationError
+
+  tc = DERTranscoder(ASN1Transcoder(stdlib_types = True))
+  with pytest.raises(ValidationError) as exc:
+    tc.validate(data)
+  assert exc.value.offset == offset
+
+  # The tags are unknown without the option
+  with pytest.raises(ValidationError):
+    DERTranscoder().validate(data)
+
+
+def test_custom_sort_errors():
+  from bran import DERTranscoder, ASN1Transcoder
+  from bran.validator import ValidationError
+
+  def bad_sort(values):
+    raise TypeError('unsortable')
+
+  tc = DERTranscoder(ASN1Transcoder(sort = bad_sort))
+  data = DERTranscoder(ASN1Transcoder(sort = False)).encode({ 1: 2 })
+  with pytest.raises(ValidationError) as exc:
+    tc.validate(data)
+  assert exc.value.offset == 8